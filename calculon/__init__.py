@@ -20,6 +20,7 @@ __version__ = '0.1.0'
 # Imports of this module
 from .command_line import CommandLine
 from .io import *
+from .progress import Progress
 from .system import System
 from .util import *
 from .version import Version
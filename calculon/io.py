@@ -17,6 +17,8 @@
 import gzip
 import json
 import numpy as np
+import os
+import pickle
 
 
 class NpEncoder(json.JSONEncoder):
@@ -48,3 +50,16 @@ def read_json_file(filename):
   opener = gzip.open if filename.endswith('.gz') else open
   with opener(filename, 'rb') as fd:
     return json.loads(fd.read().decode('utf-8'))
+
+
+def write_pickle_file(data, filename):
+  # Writes a temporary file first so an interruption leaves the old file intact
+  tmp_filename = filename + '.tmp'
+  with open(tmp_filename, 'wb') as fd:
+    pickle.dump(data, fd)
+  os.replace(tmp_filename, filename)
+
+
+def read_pickle_file(filename):
+  with open(filename, 'rb') as fd:
+    return pickle.load(fd)
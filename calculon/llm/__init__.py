@@ -17,10 +17,15 @@
 
 from .layers import *
 from .llm import *
+from .batch import *
 
 # Command lines
 from .all_executions import AllExecutions
 from .optimal_execution import OptimalExecution
+from .batch_search import BatchSearch
+from .scaling_sweep import ScalingSweep
+from .system_sweep import SystemSweep
+from .local_search import LocalSearch
 from .parameter_calculator import ParameterCalculator
 from .validation import Validation
 from .runner import Runner
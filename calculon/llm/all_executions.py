@@ -17,16 +17,16 @@
 
 import datetime
 import gzip
-import itertools
 import logging
-import math
 import multiprocessing as mp
 import os
 import pandas
+import pickle
 import psutil
-import random
+from queue import Full
 
 import calculon
+from calculon.progress import Progress
 from calculon.util import pick, arg_true_false_all
 from calculon.llm import *
 
@@ -62,6 +62,14 @@ class AllExecutions(calculon.CommandLine):
                     help='Don\'t give failure status when no good execution exists')
     sp.add_argument('-f', '--fused_activation', type=arg_true_false_all,
                     default='true', help='Mode of fused activation')
+    sp.add_argument('--resume', action='store_true',
+                    help='Resume an interrupted search from its checkpoint')
+    sp.add_argument('--progress', type=str, default=None,
+                    help='File path to write the progress as JSON lines')
+    sp.add_argument('-e', '--engine', type=str, default='llm',
+                    choices=['llm', 'batch'],
+                    help='Evaluate executions one at a time with Llm, or in '
+                    'batches with LlmBatch (statistics as floats)')
 
   @staticmethod
   def execution_fields():
@@ -85,10 +93,10 @@ class AllExecutions(calculon.CommandLine):
         last += data_par
 
   @staticmethod
-  def all_executions(app, syst, num_procs, max_batch_size, datatype, fused_activation):
-    has_mem2 = syst.mem2.capacity > 0
-    num_nets = syst.num_networks
-    count = 0
+  def all_units(app, num_procs, max_batch_size):
+    """
+    Yields the outer loop values of the search, see unit_executions().
+    """
     for tp in Llm.get_all_tensor_parallelisms(
         num_procs, app.hidden, app.attn_heads):
       for pp in Llm.get_all_pipeline_parallelisms(
@@ -106,61 +114,186 @@ class AllExecutions(calculon.CommandLine):
                 for seq_par_ag_redo in pick(can_redo, [True, False], [False]):
                   for data_par_overlap in pick(dp>1, [True, False], [False]):
                     for tensor_par_overlap in pick(tp>1, ['none', 'ring', 'pipe'], ['none']):
-                      for weight_offload in pick(has_mem2, [True, False], [False]):
-                        if activation_recompute == 'full' or not has_mem2:
-                          activations_offloads = [False]
-                        else:
-                          activations_offloads = [True, False]
-                        for activations_offload in activations_offloads:
-                          for optimizer_offload in pick(has_mem2, [True, False],
-                                                        [False]):
-                            for fused_act in fused_activation:
-                              for microbatch_size in Llm.get_valid_microbatch_sizes(
-                                  app.seq_size, tp, dp, batch_size, pp):
-                                for tn in pick(tp>1, range(num_nets), [0]):
-                                  for pn in pick(pp>1, range(num_nets), [0]):
-                                    for dn in pick(dp>1, range(num_nets), [0]):
-                                      yield (num_procs, tp, pp, dp, tn, pn, dn,
-                                             batch_size, microbatch_size, datatype,
-                                             fused_act, 'multihead', activation_recompute,
-                                             ppint, optimizer_sharding, tensor_par_comm_type,
-                                             tensor_par_overlap, seq_par_ag_redo,
-                                             data_par_overlap, weight_offload,
-                                             activations_offload, optimizer_offload,
-                                             True)
-                                      count += 1
+                      yield (tp, pp, dp, ppint, batch_size, activation_recompute,
+                             optimizer_sharding, tensor_par_comm_type,
+                             seq_par_ag_redo, data_par_overlap,
+                             tensor_par_overlap)
+
+  @staticmethod
+  def unit_executions(app, syst, num_procs, datatype, fused_activation, unit):
+    """
+    Yields the executions of one unit of all_units().
+    """
+    (tp, pp, dp, ppint, batch_size, activation_recompute, optimizer_sharding,
+     tensor_par_comm_type, seq_par_ag_redo, data_par_overlap,
+     tensor_par_overlap) = unit
+    has_mem2 = syst.mem2.capacity > 0
+    num_nets = syst.num_networks
+    if activation_recompute == 'full' or not has_mem2:
+      activations_offloads = [False]
+    else:
+      activations_offloads = [True, False]
+    # The loops go from the block fields to the network fields, so that
+    # Llm.evaluate() recomputes as few stages as possible between executions
+    for fused_act in fused_activation:
+      for microbatch_size in Llm.get_valid_microbatch_sizes(
+          app.seq_size, tp, dp, batch_size, pp):
+        for tn in pick(tp>1, range(num_nets), [0]):
+          for weight_offload in pick(has_mem2, [True, False], [False]):
+            for activations_offload in activations_offloads:
+              for optimizer_offload in pick(has_mem2, [True, False],
+                                            [False]):
+                for pn in pick(pp>1, range(num_nets), [0]):
+                  for dn in pick(dp>1, range(num_nets), [0]):
+                    yield (num_procs, tp, pp, dp, tn, pn, dn,
+                           batch_size, microbatch_size, datatype,
+                           fused_act, 'multihead', activation_recompute,
+                           ppint, optimizer_sharding, tensor_par_comm_type,
+                           tensor_par_overlap, seq_par_ag_redo,
+                           data_par_overlap, weight_offload,
+                           activations_offload, optimizer_offload,
+                           True)
+
+  @staticmethod
+  def get_unit_size(app, syst, fused_activation, unit):
+    """
+    Returns the number of executions of unit_executions() without enumerating
+    them.
+    """
+    tp, pp, dp, _, batch_size, activation_recompute = unit[:6]
+    has_mem2 = syst.mem2.capacity > 0
+    num_nets = syst.num_networks
+    num_offloads = pick(has_mem2, 2, 1) ** 2 * pick(
+      has_mem2 and activation_recompute != 'full', 2, 1)
+    num_mbs = len(list(Llm.get_valid_microbatch_sizes(
+      app.seq_size, tp, dp, batch_size, pp)))
+    num_net_combos = (pick(tp>1, num_nets, 1) * pick(pp>1, num_nets, 1) *
+                      pick(dp>1, num_nets, 1))
+    return num_offloads * len(fused_activation) * num_mbs * num_net_combos
+
+  @staticmethod
+  def all_executions(app, syst, num_procs, max_batch_size, datatype, fused_activation):
+    for unit in AllExecutions.all_units(app, num_procs, max_batch_size):
+      yield from AllExecutions.unit_executions(
+        app, syst, num_procs, datatype, fused_activation, unit)
 
   @staticmethod
   def run_command(logger, args):
     assert args.output.endswith('.csv') or args.output.endswith('.csv.gz')
 
-    app = Llm.Application(calculon.io.read_json_file(args.application))
-    syst = System(calculon.io.read_json_file(args.system))
+    app_json = calculon.io.read_json_file(args.application)
+    syst_json = calculon.io.read_json_file(args.system)
+    app = Llm.Application(app_json)
+    syst = System(syst_json, memoize=True)
 
-    executions = list(AllExecutions.all_executions(
-      app, syst, args.num_procs, args.max_batch_size, args.datatype,
-      args.fused_activation))
-    random.shuffle(executions)
-    exe_count = len(executions)
-    logger.info(f'Total executions: {exe_count}')
+    # Workers enumerate the executions of each unit themselves, units are
+    # handed out one at a time as workers become free
+    units = list(AllExecutions.all_units(
+      app, args.num_procs, args.max_batch_size))
+    logger.info(f'Total units: {len(units)}')
+    if logger.isEnabledFor(logging.DEBUG):
+      logger.debug(f'Pickled bytes: {len(pickle.dumps((app, syst)))} per '
+                   f'worker, {max(len(pickle.dumps(unit)) for unit in units)} '
+                   'max per unit')
+
+    # The writer periodically saves the completed units and the output size so
+    # an interrupted search can resume
+    checkpoint = args.output + '.ckpt'
+    signature = (app_json, syst_json, args.num_procs, args.max_batch_size,
+                 args.datatype, args.fused_activation)
+    done = {}
+    size = None
+    if args.resume and not args.debug and os.path.exists(checkpoint):
+      saved = calculon.io.read_pickle_file(checkpoint)
+      if saved['signature'] != signature:
+        logger.fatal(f'Checkpoint {checkpoint} is from a different search')
+        return -1
+      done = saved['done']
+      size = saved['size']
+      logger.info(f'Resuming: {len(done)} of {len(units)} units done')
+    todo = [(index, unit) for index, unit in enumerate(units)
+            if index not in done]
+    exe_count = sum(ec for ec, _ in done.values())
+    good_count = sum(gc for _, gc in done.values())
 
-    step = math.ceil(len(executions) / args.cpus)
-    worker_args = []
-    for index in range(0, len(executions), step):
-      worker_args.append((app, syst, executions[index : index + step]))
-    del executions
+    # Good executions are streamed through a bounded queue to a writer process
+    # as they are found
+    if args.debug:
+      queue = None
+    else:
+      logger.info(f'Output: {args.output}')
+      try:
+        open(args.output, 'ab').close()
+      except OSError as error:
+        logger.fatal(f'Can\'t open the output: {error}')
+        return -1
+      queue = mp.Queue(AllExecutions.kQueueSize)
+      writer = mp.Process(target=AllExecutions.write_results,
+                          args=(queue, args.output, checkpoint, signature,
+                                done, size))
+      writer.start()
 
-    # Runs parallel searches
+    # Runs parallel searches, app and syst are sent once per worker
+    progress = Progress(logger, sum(
+      AllExecutions.get_unit_size(app, syst, args.fused_activation, unit)
+      for _, unit in todo), args.progress)
+    progress.start()
     start_time = datetime.datetime.now()
-    with mp.Pool(args.cpus) as pool:
-      goods = pool.starmap(AllExecutions.search, worker_args)
+    run_exe_count = 0
+    finished = False
+    try:
+      with mp.Pool(args.cpus, initializer=AllExecutions.init_worker,
+                   initargs=(app, syst, queue, args.num_procs, args.datatype,
+                             args.fused_activation, progress.queue,
+                             args.engine)) as pool:
+        results = pool.imap_unordered(AllExecutions.search_unit, todo)
+        remaining = len(todo)
+        while remaining > 0:
+          try:
+            ec, gc = results.next(AllExecutions.kWriterPollSeconds)
+          except mp.TimeoutError:
+            # Workers wait forever on the full queue if the writer died, the
+            # pool is terminated instead
+            if queue is not None and not writer.is_alive():
+              break
+            continue
+          remaining -= 1
+          run_exe_count += ec
+          good_count += gc
+        else:
+          # Lets the workers exit normally so their queued messages are sent
+          pool.close()
+          pool.join()
+      finished = True
+    finally:
+      progress.stop()
+      # The writer waits forever for the end of the results if a worker
+      # failed, its last checkpoint is kept to resume the search
+      if queue is not None and not finished:
+        writer.terminate()
+        writer.join()
     end_time = datetime.datetime.now()
-    good_count = sum(len(good) for good in goods)
+    exe_count += run_exe_count
+    if queue is not None:
+      while writer.is_alive():
+        try:
+          queue.put(None, timeout=AllExecutions.kWriterPollSeconds)
+          break
+        except Full:
+          pass
+      writer.join()
+      if writer.exitcode != 0:
+        logger.fatal(f'Writing the output failed (exit code '
+                     f'{writer.exitcode})')
+        return -1
+      if os.path.exists(checkpoint):
+        os.remove(checkpoint)
 
     # Console statistics
+    logger.info(f'Total executions: {exe_count}')
     logger.info(f'Good executions: {good_count}')
     logger.info(f'Bad executions: {exe_count-good_count}')
-    calc_rate = exe_count / (end_time - start_time).total_seconds()
+    calc_rate = run_exe_count / (end_time - start_time).total_seconds()
     logger.info(f'Calculation rate: {calc_rate:.2f} calcs/sec')
 
     # Check if OK
@@ -171,35 +304,178 @@ class AllExecutions(calculon.CommandLine):
       else:
         logger.info('No acceptable configurations found :(')
 
-    if args.debug:
-      return 0
+    return 0
+
+  # Number of good executions per message to the writer, and number of
+  # messages the writer queue holds before workers wait for the writer
+  kBatchSize = 256
+  kQueueSize = 64
+
+  # Minimum number of seconds between checkpoints of a search
+  kCheckpointSeconds = 60
+
+  # Number of seconds between checks that the writer is alive
+  kWriterPollSeconds = 1
 
-    # Writes to CSV
+  @staticmethod
+  def write_results(queue, output, checkpoint, signature, done, size):
+    """
+    Writes the CSV file from the (unit index, good executions, counts)
+    messages received on the queue until it receives None. The counts are set
+    on the last message of a unit, the rows of a unit are only written once it
+    is complete so a checkpoint never holds part of a unit. When resuming, the
+    file is truncated to the size of the checkpoint and appended to.
+    """
     fields = Llm.Execution.fields() + Llm.get_stats_fields()
-    assert len(fields) == len(goods[0][0])
-    logger.info(f'Output: {args.output}')
-    opener = gzip.open if args.output.endswith('.gz') else open
-    with opener(args.output, 'wb') as fd:
+    opener = gzip.open if output.endswith('.gz') else open
+    if size is None:
+      fd = opener(output, 'wb')
       fd.write(bytes(','.join(fields) + '\n', 'utf-8'))
-      for vals in itertools.chain(*goods):
-        fd.write(bytes(','.join(str(v) for v in vals) + '\n', 'utf-8'))
+    else:
+      os.truncate(output, size)
+      fd = opener(output, 'ab')
+    pending = {}
+    saved_time = datetime.datetime.now()
+    while True:
+      message = queue.get()
+      if message is None:
+        break
+      index, goods, counts = message
+      pending.setdefault(index, []).extend(goods)
+      if counts is None:
+        continue
+      for vals in pending.pop(index):
+        assert len(fields) == len(vals)
+        fd.write(bytes(','.join(AllExecutions.format_value(v)
+                                for v in vals) + '\n', 'utf-8'))
+      done[index] = counts
+      now = datetime.datetime.now()
+      if (now - saved_time).total_seconds() >= \
+         AllExecutions.kCheckpointSeconds:
+        # Closing ends the gzip member, so the file is valid at this size
+        fd.close()
+        calculon.io.write_pickle_file(
+          {'signature': signature, 'done': done,
+           'size': os.path.getsize(output)}, checkpoint)
+        fd = opener(output, 'ab')
+        saved_time = now
+    assert not pending, 'Incomplete units at the end of the search'
+    fd.close()
 
-    return 0
+  @staticmethod
+  def format_value(value):
+    """
+    Returns the CSV text of a value. Llm statistics mix ints and integral
+    floats, and LlmBatch only has floats, so integral floats are written as
+    ints for both engines to write the same text.
+    """
+    if isinstance(value, float) and value.is_integer():
+      return str(int(value))
+    return str(value)
+
+  # Search arguments and progress reporter of the worker process, see
+  # init_worker()
+  _app = None
+  _syst = None
+  _queue = None
+  _num_procs = None
+  _datatype = None
+  _fused_activation = None
+  _reporter = None
+  _batch = None
 
   @staticmethod
-  def search(app, syst, executions):
-    good = []
+  def init_worker(app, syst, queue, num_procs, datatype, fused_activation,
+                  progress_queue=None, engine='llm'):
+    AllExecutions._app = app
+    AllExecutions._syst = syst
+    AllExecutions._queue = queue
+    AllExecutions._num_procs = num_procs
+    AllExecutions._datatype = datatype
+    AllExecutions._fused_activation = fused_activation
+    AllExecutions._reporter = None
+    if progress_queue is not None:
+      AllExecutions._reporter = Progress.Reporter(progress_queue)
+    # The batch engine keeps its block statistics across units
+    AllExecutions._batch = None
+    if engine == 'batch':
+      AllExecutions._batch = LlmBatch(app, syst)
+
+  @staticmethod
+  def search_unit(indexed_unit):
+    """
+    Searches the executions of a unit and returns the number of executions and
+    good ones, these are sent to the writer if there is one.
+    """
+    index, unit = indexed_unit
+    executions = list(AllExecutions.unit_executions(
+      AllExecutions._app, AllExecutions._syst, AllExecutions._num_procs,
+      AllExecutions._datatype, AllExecutions._fused_activation, unit))
+    if AllExecutions._queue is None:
+      good_count = len(AllExecutions.search(
+        AllExecutions._app, AllExecutions._syst, executions,
+        batch=AllExecutions._batch))
+    else:
+      good_count = AllExecutions.search(
+        AllExecutions._app, AllExecutions._syst, executions,
+        AllExecutions._queue, index, AllExecutions._batch)
+      AllExecutions._queue.put((index, [], (len(executions), good_count)))
+    if AllExecutions._reporter is not None:
+      AllExecutions._reporter.flush()
+    return len(executions), good_count
+
+  @staticmethod
+  def evaluate(app, syst, executions, batch=None):
+    """
+    Yields each execution with its statistics values, or with None when it is
+    bad. The executions are evaluated together when a LlmBatch is given.
+    """
+    if batch is not None:
+      yield from zip(executions, batch.run(executions))
+      return
+    # Executions share many blocks, see Llm._get_block_key(). A single model
+    # evaluates every execution.
+    model = Llm(app, None, {})
     for execution in executions:
-      try:
-        model = Llm(app, logging.Logger('sub'))
-        model.compile(syst, Llm.Execution(*execution))
-        model.run(syst)
-        statistics = model.get_stats_values()
-        good.append(execution + statistics)
-      except Llm.Error as ex:
-        logger = logging.getLogger()
-        logger.debug(f'ERROR:{ex}\n')
-    return good
+      status = model.evaluate(syst, Llm.Execution(*execution))
+      if status == Llm.kGood:
+        values = model.get_stats_values()
+      else:
+        logging.getLogger().debug('ERROR:%s\n', Llm.kStatusMessages[status])
+        values = None
+      yield execution, values
+
+  # Index of the sample rate in the statistics values
+  kSampleRate = Llm.get_stats_fields().index('sample_rate')
+
+  @staticmethod
+  def search(app, syst, executions, queue=None, index=None, batch=None):
+    """
+    Returns the good executions with their statistics. With a queue, they are
+    put in batches tagged with the unit index on the queue instead and their
+    number is returned.
+    """
+    good = []
+    good_count = 0
+    for execution, values in AllExecutions.evaluate(
+        app, syst, executions, batch):
+      if values is None:
+        if AllExecutions._reporter is not None:
+          AllExecutions._reporter.add(bad=1)
+        continue
+      good_count += 1
+      good.append(execution + values)
+      if AllExecutions._reporter is not None:
+        AllExecutions._reporter.add(
+          good=1, best=values[AllExecutions.kSampleRate])
+      if queue is not None and len(good) == AllExecutions.kBatchSize:
+        queue.put((index, good, None))
+        good = []
+    if queue is None:
+      return good
+    if good:
+      queue.put((index, good, None))
+    return good_count
 
   @staticmethod
   def update_list(current, candidate, quantity):
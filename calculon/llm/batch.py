@@ -0,0 +1,530 @@
+"""
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *  https://www.apache.org/licenses/LICENSE-2.0
+ *
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+"""
+
+import numpy as np
+
+from calculon import *
+from .llm import Llm
+
+
+class LlmBatch:
+  """
+  Evaluates many executions of one application on one system at once. The
+  per block statistics come from the Llm layers, once per block key (see
+  Llm._get_block_key()) and for all the block keys at once as BlockArrays,
+  and everything computed from them per execution is computed with NumPy over
+  the batch of executions. The statistics equal the
+  ones of Llm.get_stats_values(), as floats.
+  """
+
+  def __init__(self, app, sys, block_cache=None):
+    assert isinstance(app, Llm.Application)
+    assert isinstance(sys, System)
+    self.app = app
+    self.sys = sys
+    self._block_cache = pick(block_cache is None, {}, block_cache)
+    # Block statistics and useful flops per block key
+    self._blocks = {}
+    # Network errors per parallelism and network assignment
+    self._networks = {}
+
+  def run(self, executions):
+    """
+    Returns, for each execution given as Llm.Execution values, the values of
+    Llm.get_stats_fields() or None if the execution is invalid (where Llm
+    raises Llm.Error).
+    """
+    if len(executions) == 0:
+      return []
+    fields = Llm.Execution.fields()
+    cols = dict(zip(fields, zip(*executions)))
+    ints = lambda name: np.array(cols[name], dtype=np.int64)
+    bools = lambda name: np.array(cols[name], dtype=bool)
+    tp = ints('tensor_par')
+    pp = ints('pipeline_par')
+    dp = ints('data_par')
+    tn = ints('tensor_par_net')
+    pn = ints('pipeline_par_net')
+    dn = ints('data_par_net')
+    gbs = ints('batch_size')
+    mbs = ints('microbatch_size')
+    ppint = ints('pipeline_interleaving')
+    sharding = bools('optimizer_sharding')
+    dp_overlap = bools('data_par_overlap')
+    wo = bools('weight_offload')
+    ao = bools('activations_offload')
+    oo = bools('optimizer_offload')
+    training = bools('training')
+    full = np.array([r == 'full' for r in cols['activation_recompute']])
+    rs_ag = np.array([c in ['p2p_rs_ag', 'rs_ag']
+                      for c in cols['tensor_par_comm_type']])
+    nmb = gbs // dp // mbs
+
+    # Same as Llm._compile_sizes_status()
+    num_blocks = self.app.num_blocks
+    bpp = -(-num_blocks // pp)
+    brb = np.where(num_blocks % pp != 0, pp - num_blocks % pp, 0)
+    valid = (ppint <= bpp) & (bpp % ppint == 0)
+    valid &= ~((wo | ao | oo) & (bpp <= 2))
+    bpc = bpp // np.where(valid, ppint, 1)
+    cpp = bpp // bpc
+    base = bpc - 1
+    edge = 1
+    bytes_per_element = np.array(
+      [System.TypeSizes[d] for d in cols['datatype']])
+    matrix_flops = np.array(
+      [self.sys.matrix.flops(d) for d in cols['datatype']])
+    activation_size = mbs * self.app.seq_size * self.app.hidden
+    seq_par_activation_size = \
+      mbs * self.app.seq_size // tp * self.app.hidden
+
+    # Same as Llm._assign_networks()
+    for index, exe in enumerate(executions):
+      key = (exe[1], exe[2], exe[3], exe[4], exe[5], exe[6])
+      if key not in self._networks:
+        self._networks[key] = self._check_networks(*key)
+      if not self._networks[key]:
+        valid[index] = False
+
+    # Gathers the block statistics of each execution from its block key
+    groups = {}
+    group = np.zeros(len(executions), dtype=np.int64)
+    for index, exe in enumerate(executions):
+      if valid[index]:
+        key = self._get_block_key(exe)
+        if key not in groups:
+          groups[key] = (len(groups), exe)
+        group[index] = groups[key][0]
+    if not groups:
+      return [None] * len(executions)
+    self._compute_blocks([(key, exe) for key, (_, exe) in groups.items()
+                          if key not in self._blocks])
+    table = np.array([self._blocks[key] for key in groups], dtype=np.float64)
+    table = table[group]
+    b = {name[1:]: table[:, i] for i, name in enumerate(Llm._kBlockStats)}
+    useful_flops = table[:, len(Llm._kBlockStats)]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+      stats = self._compute(
+        b, useful_flops, valid, training, full, sharding, dp_overlap, wo, ao,
+        oo, rs_ag, tp, pp, dp, tn, pn, dn, gbs, nmb, ppint, bpp, brb, bpc,
+        cpp, base, edge, bytes_per_element, matrix_flops, activation_size,
+        seq_par_activation_size)
+    valid = stats.pop()
+    rows = np.stack(stats, axis=1).tolist()
+    return [tuple(row) if ok else None
+            for row, ok in zip(rows, valid.tolist())]
+
+  def _check_networks(self, tensor_par, pipeline_par, data_par,
+                      tensor_par_net, pipeline_par_net, data_par_net):
+    model = Llm(self.app, None)
+    model.sys = self.sys
+    model.exe = Llm.Execution(
+      tensor_par * pipeline_par * data_par, tensor_par, pipeline_par, data_par,
+      tensor_par_net, pipeline_par_net, data_par_net, data_par, 1, 'float16',
+      True, 'multihead', 'none', 1, False, 'ar', 'none', False, False, False,
+      False, False, True)
+    status, _ = model._assign_networks()
+    return status == Llm.kGood
+
+  @staticmethod
+  def _get_block_key(exe):
+    # Same values as Llm._get_block_key() from the Llm.Execution values
+    (_, tp, _, dp, tn, _, _, _, mbs, datatype, fused, attn, recompute, _,
+     sharding, comm_type, tp_overlap, redo, _, _, _, _, training) = exe
+    return (tp, tn, mbs, datatype, fused, attn, recompute, comm_type,
+            tp_overlap, redo, training, pick(sharding, dp, None))
+
+  def _compute_blocks(self, blocks):
+    """
+    Computes the block statistics and useful flops of the (block key,
+    execution) pairs, all the blocks at once.
+    """
+    models = []
+    for _, exe in blocks:
+      model = Llm(self.app, None, self._block_cache)
+      model.compile(self.sys, Llm.Execution(*exe))
+      models.append(model)
+    Llm._run_blocks_stats(models)
+    for (key, _), model in zip(blocks, models):
+      self._blocks[key] = [getattr(model, name) for name in Llm._kBlockStats]
+      self._blocks[key].append(model.get_useful_flops())
+
+  def _compute(self, b, useful_flops, valid, training, full, sharding,
+               dp_overlap, wo, ao, oo, rs_ag, tp, pp, dp, tn, pn, dn, gbs, nmb,
+               ppint, bpp, brb, bpc, cpp, base, edge, bytes_per_element,
+               matrix_flops, activation_size, seq_par_activation_size):
+    """
+    Returns the columns of Llm.get_stats_values() followed by the validity of
+    the executions. This follows Llm._compute_block_comm_sizes(),
+    Llm._compute_batch_stats(), Llm._compute_mem_stats() and the getters.
+    """
+    sys = self.sys
+    nets = sys.networks
+
+    # PP communication sizes
+    block_fw_pp_size = np.where(
+      pp > 1, np.where(rs_ag, seq_par_activation_size, activation_size) *
+      bytes_per_element, 0)
+    block_bw_pp_size = np.where(training, block_fw_pp_size, 0)
+
+    # Totals for compute
+    mult = bpp * nmb
+    fw_time = mult * b['block_fw_time']
+    re_time = mult * b['block_re_time']
+    agrad_time = mult * b['block_agrad_time']
+    wgrad_time = mult * b['block_wgrad_time']
+    optim_time = bpp * b['block_optim_time']
+
+    # TP and PP communication totals
+    chunks = nmb * cpp
+    tp_fw_comm_time = chunks * (
+      (base * b['baseblock_fw_tp_time']) + (edge * b['edgeblock_fw_tp_time']))
+    tp_fw_comm_time_exposed = chunks * (
+      (base * b['baseblock_fw_tp_time_exposed']) +
+      (edge * b['edgeblock_fw_tp_time_exposed']))
+    tp_bw_comm_time = chunks * (
+      base * b['baseblock_agrad_tp_time'] +
+      edge * b['edgeblock_agrad_tp_time'])
+    tp_bw_comm_time_exposed = chunks * (
+      base * b['baseblock_agrad_tp_time_exposed'] +
+      edge * b['edgeblock_agrad_tp_time_exposed'])
+    tp_recomm_time = chunks * (
+      (base * b['baseblock_recomm_time']) + (edge * b['edgeblock_recomm_time']))
+    tp_recomm_time_exposed = chunks * (
+      (base * b['baseblock_recomm_time_exposed']) +
+      (edge * b['edgeblock_recomm_time_exposed']))
+    chunk_fw_pp_time = self._net_times(pn, 'p2p', block_fw_pp_size, 2)
+    chunk_bw_pp_time = self._net_times(pn, 'p2p', block_bw_pp_size, 2)
+    num_fw_pp_p2ps = np.where(pp > 1, cpp, 0)
+    num_bw_pp_p2ps = np.where((pp > 1) & training, cpp, 0)
+    pp_fw_comm_time = nmb * num_fw_pp_p2ps * chunk_fw_pp_time
+    pp_bw_comm_time = nmb * num_bw_pp_p2ps * chunk_bw_pp_time
+    tp_comm_time_link = tp_fw_comm_time + tp_bw_comm_time
+    tp_comm_time_exposed = tp_fw_comm_time_exposed + tp_bw_comm_time_exposed
+    pp_comm_time_link = pp_fw_comm_time + pp_bw_comm_time
+
+    # Offloading
+    act_offload_size = np.where(full, b['block_act_checkpoint_size'],
+                                b['block_act_storage_space'])
+    fw_offload_size = np.maximum(np.where(wo, b['block_weight_space'], 0),
+                                 np.where(ao, act_offload_size, 0))
+    bw_offload_size = np.where(training, (
+      np.where(wo, b['block_weight_space'], 0) +
+      np.where(ao, act_offload_size, 0) +
+      np.where(oo, b['block_optimizer_space'], 0)), 0)
+    fw_offload_time = sys.compute_offload_times(fw_offload_size)
+    bw_offload_time = np.where(
+      training, sys.compute_offload_times(bw_offload_size), 0)
+
+    # Block and chunk times
+    baseblock_fw_time_no_offload = (
+      b['block_fw_time'] + b['baseblock_fw_tp_time_exposed'])
+    edgeblock_fw_time_no_offload = (
+      b['block_fw_time'] + b['edgeblock_fw_tp_time_exposed'] +
+      chunk_fw_pp_time)
+    baseblock_fw_offload_overhead = np.maximum(
+      0, fw_offload_time + b['block_fw_mem_time'] -
+      baseblock_fw_time_no_offload)
+    edgeblock_fw_offload_overhead = np.maximum(
+      0, fw_offload_time + b['block_fw_mem_time'] -
+      edgeblock_fw_time_no_offload)
+    baseblock_fw_time = (
+      baseblock_fw_time_no_offload + baseblock_fw_offload_overhead)
+    edgeblock_fw_time = (
+      edgeblock_fw_time_no_offload + edgeblock_fw_offload_overhead)
+    baseblock_bw_time_no_offload = (
+      b['block_re_time'] + b['baseblock_recomm_time_exposed'] +
+      b['block_agrad_time'] + b['block_wgrad_time'] +
+      b['baseblock_agrad_tp_time_exposed'])
+    edgeblock_bw_time_no_offload = (
+      b['block_re_time'] + b['edgeblock_recomm_time_exposed'] +
+      b['block_agrad_time'] + b['block_wgrad_time'] +
+      b['edgeblock_agrad_tp_time_exposed'] + chunk_bw_pp_time)
+    baseblock_bw_offload_overhead = np.maximum(
+      0, bw_offload_time + b['block_agrad_mem_time'] +
+      b['block_wgrad_mem_time'] - baseblock_bw_time_no_offload)
+    edgeblock_bw_offload_overhead = np.maximum(
+      0, bw_offload_time + b['block_agrad_mem_time'] +
+      b['block_wgrad_mem_time'] - edgeblock_bw_time_no_offload)
+    baseblock_bw_time = (
+      baseblock_bw_time_no_offload + baseblock_bw_offload_overhead)
+    edgeblock_bw_time = (
+      edgeblock_bw_time_no_offload + edgeblock_bw_offload_overhead)
+    chunk_fw_time = (
+      (base * baseblock_fw_time) + (edge * edgeblock_fw_time))
+    chunk_bw_time = (
+      (base * baseblock_bw_time) + (edge * edgeblock_bw_time))
+    block_mem_time = (b['block_agrad_mem_time'] + b['block_wgrad_mem_time'] +
+                      b['block_re_mem_time'])
+    baseblock_dp_overlap_time = baseblock_bw_time - block_mem_time
+    edgeblock_dp_overlap_time = edgeblock_bw_time - block_mem_time
+    block_dp_compute_time = (
+      b['block_agrad_flops_time'] + b['block_wgrad_flops_time'] +
+      b['block_re_flops_time'])
+    optim_overlap_time = b['block_optim_time'] - b['block_optim_mem_time']
+    baseblock_dp_overlap_time = np.where(
+      sharding, baseblock_dp_overlap_time,
+      baseblock_dp_overlap_time + optim_overlap_time)
+    edgeblock_dp_overlap_time = np.where(
+      sharding, edgeblock_dp_overlap_time,
+      edgeblock_dp_overlap_time + optim_overlap_time)
+    block_dp_compute_time = np.where(
+      sharding, block_dp_compute_time,
+      block_dp_compute_time + b['block_optim_flops_time'])
+    baseblock_dp_overlap_time = np.where(
+      dn == tn, baseblock_dp_overlap_time - (
+        b['baseblock_recomm_time'] + b['baseblock_agrad_tp_time']),
+      baseblock_dp_overlap_time)
+    edgeblock_dp_overlap_time = np.where(
+      dn == tn, edgeblock_dp_overlap_time - (
+        b['edgeblock_recomm_time'] + b['edgeblock_agrad_tp_time']),
+      edgeblock_dp_overlap_time)
+    chunk_dp_overlap_time = (
+      base * baseblock_dp_overlap_time + edge * edgeblock_dp_overlap_time)
+    chunk_dp_compute_time = bpc * block_dp_compute_time
+    chunk_time = chunk_fw_time + chunk_bw_time
+
+    # Pipeline bubble
+    bubble_reduction_time = np.where(
+      base > 0,
+      brb * (baseblock_fw_time + edgeblock_fw_time + baseblock_bw_time +
+             edgeblock_bw_time) / 2,
+      brb * (edgeblock_fw_time + edgeblock_bw_time))
+    chunks_in_bubble = pp - 1
+    num_overlappable_chunks = ppint - 1
+    microbatch_shortage = pp - (nmb % pp)
+    extra_interleaving_bubbles = np.where(
+      nmb % pp != 0, num_overlappable_chunks * microbatch_shortage, 0)
+    bubble_time = chunks_in_bubble * chunk_time + (
+      extra_interleaving_bubbles * chunk_time - bubble_reduction_time)
+
+    # DP communication
+    has_dp = (dp > 1) & training
+    block_dp_size = np.where(has_dp, b['block_weight_space'], 0)
+    # Collectives need 2 procs, the times without DP are discarded
+    dp_procs = np.maximum(dp, 2)
+    block_dp_time = np.where(has_dp, np.where(
+      sharding,
+      self._net_times(dn, 'reduce_scatter', block_dp_size, dp_procs) +
+      self._net_times(dn, 'all_gather', block_dp_size, dp_procs),
+      self._net_times(dn, 'all_reduce', block_dp_size, dp_procs)), 0)
+    proc_usage = np.array([net.processor_usage for net in nets])[dn]
+    op_scalar = np.where(
+      sharding,
+      self._net_op_scalars('reduce_scatter')[dn] +
+      self._net_op_scalars('all_gather')[dn],
+      self._net_op_scalars('all_reduce')[dn])
+
+    last_chunk_overlap_size = bpc - 1
+    overlap_window = pp * chunk_dp_overlap_time
+    overlap_compute = pp * chunk_dp_compute_time
+    chunk_dp_time = bpc * block_dp_time
+    num_overlapped_pp = np.where(
+      dn == pn,
+      np.minimum(chunk_dp_time // chunk_bw_time,
+                 np.where(nmb % pp != 0, nmb % pp, pp)), 0)
+    overlap_inflection = chunk_dp_time - (
+      overlap_window - num_overlapped_pp * chunk_bw_pp_time) + \
+      overlap_compute * proc_usage
+    overlappable_chunks_exposed_time = np.where(
+      overlap_inflection > 0, num_overlappable_chunks * overlap_inflection,
+      num_overlappable_chunks * chunk_dp_time * proc_usage)
+    chunk_overlap_time = overlap_window + overlap_compute * proc_usage
+    chunk_overlap_time = np.where(
+      dn == pn, chunk_overlap_time - chunk_bw_pp_time, chunk_overlap_time)
+    chunk_overlap_time = chunk_overlap_time * num_overlappable_chunks
+    dp_bw_overlap_req_chunk = np.where(
+      chunk_overlap_time > 0,
+      bpc * block_dp_size / chunk_overlap_time * op_scalar, 0)
+    last_chunk_window = chunk_dp_overlap_time - chunk_bw_pp_time - (
+      baseblock_bw_time + edgeblock_bw_time) / 2
+    last_chunk_window = np.where(
+      sharding, last_chunk_window, last_chunk_window + optim_overlap_time)
+    last_chunk_window = np.where(base > 0, last_chunk_window, 0)
+    last_chunk_inflection = (
+      last_chunk_overlap_size * block_dp_time) + (
+        block_dp_compute_time * proc_usage - last_chunk_window)
+    last_chunk_exposed_time = np.where(
+      last_chunk_inflection > 0, last_chunk_inflection,
+      last_chunk_overlap_size * block_dp_time * proc_usage)
+    exposed_time = overlappable_chunks_exposed_time + last_chunk_exposed_time
+    tail_overlap_time = last_chunk_window + last_chunk_overlap_size * \
+      block_dp_time * proc_usage
+    dp_bw_overlap_req_tail = np.where(
+      tail_overlap_time > 0,
+      bpc * block_dp_size / tail_overlap_time * op_scalar, 0)
+    overlapped = has_dp & dp_overlap
+    dp_comm_time_exposed = np.where(
+      overlapped, block_dp_time + exposed_time,
+      np.where(has_dp, bpp * block_dp_time, 0))
+    dp_comm_time_link = np.where(has_dp, bpp * block_dp_time, 0)
+    dp_bw_overlap_req_chunk = np.where(overlapped, dp_bw_overlap_req_chunk, 0)
+    dp_bw_overlap_req_tail = np.where(overlapped, dp_bw_overlap_req_tail, 0)
+
+    # Memory
+    weight_space = b['block_weight_space'] * bpp
+    mem_microbatches = np.where(nmb < pp, nmb, pp)
+    pp_microbatch_factor = np.where(
+      ppint > 1,
+      mem_microbatches * (1 + (pp - 1) / (ppint * pp)), mem_microbatches)
+    act_space = np.where(
+      training & ~full, b['block_act_working_space'] +
+      b['block_act_storage_space'] * (bpp * pp_microbatch_factor - 1),
+      b['block_act_working_space'])
+    act_checkpoint_size = np.where(
+      training & full,
+      bpp * b['block_act_checkpoint_size'] * pp_microbatch_factor, 0)
+    act_grad_space = np.where(training, b['block_act_grad_space'], 0)
+    weight_grad_space = np.where(training, np.where(
+      bpp == 1, b['block_weight_grad_space_no_sharding'],
+      b['block_weight_grad_space_no_sharding'] +
+      b['block_weight_grad_space'] * (bpp - 1)), 0)
+    optimizer_space = np.where(
+      training, b['block_optimizer_space'] * bpp, 0)
+    weight_space_min = b['block_weight_space'] * 2
+    act_space_min = np.where(
+      full, b['block_act_working_space'],
+      b['block_act_working_space'] + b['block_act_storage_space'])
+    act_checkpoint_size_min = np.where(
+      full, b['block_act_checkpoint_size'] * 2, 0)
+    weight_grad_space_min = np.where(
+      training, b['block_weight_grad_space_no_sharding'] +
+      b['block_weight_grad_space'], 0)
+    optimizer_space_min = np.where(
+      training, b['block_optimizer_space'] * 2, 0)
+    tier1 = np.where(wo, weight_space_min, weight_space)
+    tier2 = np.where(wo, weight_space, 0)
+    tier1 = np.where(ao, np.where(
+      full, tier1 + act_space_min + act_checkpoint_size_min,
+      tier1 + act_space_min), tier1 + act_space + act_checkpoint_size)
+    tier2 = np.where(
+      ao, tier2 + np.where(full, act_checkpoint_size, act_space), tier2)
+    tier1 = np.where(
+      oo, tier1 + weight_grad_space_min + optimizer_space_min,
+      tier1 + (weight_grad_space + optimizer_space))
+    tier2 = np.where(
+      oo, tier2 + b['block_weight_grad_space'] * bpp + optimizer_space, tier2)
+    tier1 = tier1 + act_grad_space
+    valid = valid & (tier1 <= sys.mem1.capacity) & \
+      (tier2 <= sys.mem2.capacity)
+
+    # Times and rates
+    bw_time = agrad_time + wgrad_time
+    fw_offload_overhead = chunks * (
+      (base * baseblock_fw_offload_overhead) +
+      (edge * edgeblock_fw_offload_overhead))
+    bw_offload_overhead = np.where(training, chunks * (
+      (base * baseblock_bw_offload_overhead) +
+      (edge * edgeblock_bw_offload_overhead)), 0)
+    recomm_link_time = np.where(training, tp_recomm_time, 0)
+    recomm_exposed_time = np.where(training, tp_recomm_time_exposed, 0)
+    dp_comm_link_time = np.where(training, dp_comm_time_link, 0)
+    dp_comm_exposed_time = np.where(training, dp_comm_time_exposed, 0)
+    total_time = fw_time
+    total_time = total_time + bw_time
+    total_time = total_time + optim_time
+    total_time = total_time + fw_offload_overhead
+    total_time = total_time + bw_offload_overhead
+    total_time = total_time + re_time
+    total_time = total_time + recomm_exposed_time
+    total_time = total_time + bubble_time
+    total_time = total_time + tp_comm_time_exposed
+    total_time = total_time + pp_comm_time_link
+    total_time = total_time + dp_comm_exposed_time
+
+    fw_offload_window = np.minimum(
+      baseblock_fw_time_no_offload - b['block_fw_mem_time'],
+      edgeblock_fw_time_no_offload - b['block_fw_mem_time'])
+    bw_offload_window = np.minimum(
+      baseblock_bw_time_no_offload - (
+        b['block_agrad_mem_time'] + b['block_wgrad_mem_time']),
+      edgeblock_bw_time_no_offload - (
+        b['block_agrad_mem_time'] + b['block_wgrad_mem_time']))
+    act_offload_bw_req = act_offload_size / fw_offload_window
+    weight_offload_bw_req = b['block_weight_space'] / fw_offload_window
+    optim_offload_bw_req = np.where(training, (
+      b['block_weight_grad_space'] + b['block_optimizer_space']) /
+      bw_offload_window, 0)
+    offload_mem_bw_req = np.where(
+      training, np.maximum(fw_offload_size / fw_offload_window,
+                           bw_offload_size / bw_offload_window),
+      fw_offload_size / fw_offload_window)
+
+    compute_time = fw_time + bw_time + optim_time
+    perfect_time = bpp * nmb * useful_flops / matrix_flops
+    return [
+      b['block_fw_flops'], b['block_fw_flops_time'],
+      b['block_fw_mem_accessed'], b['block_fw_mem_time'], b['block_fw_time'],
+      b['baseblock_fw_tp_time'], b['edgeblock_fw_tp_time'],
+      b['baseblock_fw_tp_time_exposed'], b['edgeblock_fw_tp_time_exposed'],
+      b['block_re_flops'], b['block_re_flops_time'],
+      b['block_re_mem_accessed'], b['block_re_mem_time'], b['block_re_time'],
+      b['baseblock_recomm_time'], b['edgeblock_recomm_time'],
+      b['baseblock_recomm_time_exposed'], b['edgeblock_recomm_time_exposed'],
+      b['block_agrad_flops'], b['block_agrad_flops_time'],
+      b['block_agrad_mem_accessed'], b['block_agrad_mem_time'],
+      b['block_agrad_time'], b['baseblock_agrad_tp_time'],
+      b['edgeblock_agrad_tp_time'], b['baseblock_agrad_tp_time_exposed'],
+      b['edgeblock_agrad_tp_time_exposed'], b['block_wgrad_flops'],
+      b['block_wgrad_flops_time'], b['block_wgrad_mem_accessed'],
+      b['block_wgrad_mem_time'], b['block_wgrad_time'],
+      b['block_optim_flops'], b['block_optim_flops_time'],
+      b['block_optim_mem_accessed'], b['block_optim_mem_time'],
+      b['block_optim_time'],
+
+      b['baseblock_fw_tp_size'], b['edgeblock_fw_tp_size'],
+      b['baseblock_agrad_tp_size'], b['edgeblock_agrad_tp_size'],
+      b['baseblock_recomm_size'], b['edgeblock_recomm_size'],
+      block_fw_pp_size, block_bw_pp_size, block_dp_size,
+      b['tp_bw_overlap_req'], dp_bw_overlap_req_chunk, dp_bw_overlap_req_tail,
+
+      b['block_weight_space'], b['block_act_working_space'],
+      b['block_act_storage_space'], b['block_act_checkpoint_size'],
+      b['block_weight_grad_space'], b['block_weight_grad_space_no_sharding'],
+      b['block_act_grad_space'], b['block_optimizer_space'],
+
+      weight_space_min, act_space_min, act_checkpoint_size_min,
+      act_grad_space, weight_grad_space_min, optimizer_space_min,
+
+      weight_space, act_space, act_checkpoint_size, act_grad_space,
+      weight_grad_space, optimizer_space,
+
+      fw_time, bw_time, optim_time, re_time, recomm_link_time,
+      recomm_exposed_time, bubble_time, tp_comm_time_link, pp_comm_time_link,
+      dp_comm_link_time, tp_comm_time_exposed, pp_comm_time_link,
+      dp_comm_exposed_time, fw_offload_overhead, bw_offload_overhead,
+      total_time, act_offload_bw_req, weight_offload_bw_req,
+      optim_offload_bw_req, offload_mem_bw_req, tier1, tier2, useful_flops,
+      perfect_time / compute_time, compute_time / total_time,
+      perfect_time / total_time, gbs / total_time,
+      valid]
+
+  def _net_times(self, net_index, op, op_size, comm_size):
+    """
+    Returns Network.time() for arrays of networks, op sizes and comm sizes,
+    calling it once per distinct values.
+    """
+    keys = np.stack(np.broadcast_arrays(net_index, op_size, comm_size), axis=1)
+    unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+    times = np.array([
+      self.sys.get_network(int(net)).time(op, size, int(procs))
+      for net, size, procs in unique.tolist()])
+    return times[inverse.reshape(-1)]
+
+  def _net_op_scalars(self, op):
+    return np.array([net._ops[op].scalar for net in self.sys.networks])
@@ -0,0 +1,260 @@
+"""
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *  https://www.apache.org/licenses/LICENSE-2.0
+ *
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+"""
+
+import datetime
+import multiprocessing as mp
+import psutil
+
+import calculon
+from calculon.progress import Progress
+from calculon.util import arg_true_false_all
+from calculon.llm import *
+
+
+class BatchSearch(calculon.CommandLine):
+  NAME = 'llm-batch-search'
+  ALIASES = ['lbs']
+
+  # Keys of the jobs of the manifest, 'name' is optional
+  kJobKeys = set(['application', 'system', 'num_procs', 'max_batch_size',
+                  'datatype'])
+
+  @staticmethod
+  def create_parser(subparser):
+    sp = subparser.add_parser(
+      BatchSearch.NAME, aliases=BatchSearch.ALIASES,
+      help='run the optimal llm execution searches of a manifest')
+    sp.set_defaults(func=BatchSearch.run_command)
+    sp.add_argument('manifest', type=str,
+                    help='File path to the JSON list of jobs, with '
+                    '\'application\', \'system\', \'num_procs\', '
+                    '\'max_batch_size\', \'datatype\' and optional \'name\'')
+    sp.add_argument('output', type=str,
+                    help='File path to the output file'
+                    " ('*.csv', '*.csv.gz', '*.json', '*.json.gz')")
+    sp.add_argument('-c', '--cpus', type=int, default=psutil.cpu_count(logical=False),
+                    help='CPUs to use for parallelization')
+    sp.add_argument('-n', '--noneok', action='store_true',
+                    help='Don\'t give failure status when no good execution exists')
+    sp.add_argument('-m', '--mbs-break', action='store_true',
+                    help='Search across MBS and break earlier when possible')
+    sp.add_argument('-l', '--layers', action='store_true',
+                    help='Include layers information in output stats file')
+    sp.add_argument('-f', '--fused_activation', type=arg_true_false_all,
+                    default='true', help='Mode of fused activation')
+    sp.add_argument('--no-tp-overlap', action='store_true',
+                    help='Don\'t allow TP overlap')
+    sp.add_argument('--no-dp-overlap', action='store_true',
+                    help='Don\'t allow DP overlap')
+    sp.add_argument('--no-prune', action='store_true',
+                    help='Don\'t skip executions that can\'t be the best')
+    sp.add_argument('--progress', type=str, default=None,
+                    help='File path to write the progress as JSON lines')
+
+  @staticmethod
+  def run_command(logger, args):
+    manifest = calculon.io.read_json_file(args.manifest)
+    assert isinstance(manifest, list) and len(manifest) > 0, \
+      'The manifest must be a non empty list of jobs'
+    names = []
+    for index, job in enumerate(manifest):
+      assert BatchSearch.kJobKeys <= set(job.keys()) <= \
+        BatchSearch.kJobKeys | {'name'}, f'Invalid job keys: {job.keys()}'
+      assert job['datatype'] in System.supported_datatypes(), \
+        f'Unsupported type: {job["datatype"]}'
+      names.append(str(job.get('name', index)))
+    assert len(set(names)) == len(names), 'Job names must be unique'
+
+    # Jobs of the same files share the application and system, and the block
+    # caches of the workers
+    apps = {}
+    systs = {}
+    jobs = []
+    for job in manifest:
+      if job['application'] not in apps:
+        apps[job['application']] = Llm.Application(
+          calculon.io.read_json_file(job['application']))
+      if job['system'] not in systs:
+        systs[job['system']] = System(
+          calculon.io.read_json_file(job['system']), memoize=True)
+      app = apps[job['application']]
+      syst = systs[job['system']]
+      common = BatchSearch.get_common(
+        args, app, syst, job['num_procs'], job['max_batch_size'],
+        job['datatype'])
+      tasks = OptimalExecution.get_tasks(
+        app, syst, job['num_procs'], job['max_batch_size'],
+        args.fused_activation, not args.no_tp_overlap, not args.no_dp_overlap)
+      jobs.append((common, tasks, (job['application'], job['system'])))
+
+    bests = BatchSearch.search_jobs(logger, jobs, args.cpus, args.progress)
+
+    output = {}
+    failed = []
+    for name, (common, _, _), best in zip(names, jobs, bests):
+      if len(best) == 0:
+        logger.info(f'{name}: no acceptable configurations found')
+        failed.append(name)
+        continue
+      sample_rate, execution = best[0]
+      logger.info(f'{name}: best sample rate {sample_rate}')
+      stats = OptimalExecution.get_stats(
+        common['app'], common['syst'], execution, args.layers)
+      OptimalExecution.check_sample_rate(logger, stats, sample_rate)
+      output[name] = {
+        'execution': execution,
+        'stats': stats
+      }
+
+    # The jobs that succeeded are written even if others failed
+    if len(output) > 0:
+      logger.info(f'Output: {args.output}')
+      OptimalExecution.write_output(output, args.output)
+    if len(failed) > 0:
+      message = ('No acceptable configurations found for jobs: ' +
+                 ', '.join(failed))
+      if not args.noneok:
+        logger.fatal(message)
+        return -1
+      logger.info(message)
+    return 0
+
+  @staticmethod
+  def get_common(args, app, syst, num_procs, max_batch_size, datatype):
+    """
+    Returns the arguments of OptimalExecution.search() common to all the tasks
+    of a job, from the command line arguments.
+    """
+    return {
+      'debug': False,
+      'top_n': 1,
+      'num_procs': num_procs,
+      'max_batch_size': max_batch_size,
+      'datatype': datatype,
+      'app': app,
+      'syst': syst,
+      'fused_acts': args.fused_activation,
+      'mbs_break': args.mbs_break,
+      'allow_tp_overlap': not args.no_tp_overlap,
+      'allow_dp_overlap': not args.no_dp_overlap,
+      'prune': not args.no_prune
+    }
+
+  @staticmethod
+  def search_jobs(logger, jobs, cpus, progress_file=None):
+    """
+    Runs the searches of the jobs in one pool and returns the best executions
+    of each job, as OptimalExecution.update_list() lists. The jobs are given
+    as (common search arguments, tasks, cache key) tuples, see get_common()
+    and OptimalExecution.get_tasks(). Jobs with the same cache key must have
+    the same application and system, they share the block caches.
+    """
+    # The parts of all the jobs are balanced together
+    max_size = OptimalExecution.get_max_part_size(
+      [tasks for _, tasks, _ in jobs], cpus)
+    parts = []
+    for index, (_, tasks, _) in enumerate(jobs):
+      for size, key, params in OptimalExecution.split_tasks(tasks, max_size):
+        parts.append((size, (index,) + key, (index,) + params))
+    logger.debug(f'Search parts: {len(parts)} for {len(jobs)} jobs')
+    parts.sort(key=lambda part: part[0], reverse=True)
+    sizes = {key: size for size, key, _ in parts}
+
+    progress = Progress(logger, sum(sizes.values()), progress_file)
+    progress.start()
+    start_time = datetime.datetime.now()
+    run_exe_count = 0
+    done = {}
+    # Each job has its own best sample rate threshold
+    thresholds = [mp.Value('d', 0) for _ in jobs]
+    commons = [common for common, _, _ in jobs]
+    cache_keys = [cache_key for _, _, cache_key in jobs]
+    try:
+      with mp.Pool(cpus, initializer=BatchSearch.init_worker,
+                   initargs=(thresholds, commons, cache_keys,
+                             progress.queue)) as pool:
+        for key, search in pool.imap_unordered(
+            BatchSearch.search_part,
+            [(key, params) for _, key, params in parts]):
+          done[key] = search
+          run_exe_count += search[1]
+          # MBS break skips the rest of a microbatch size loop
+          progress.skip(sizes[key] - search[1])
+        # Lets the workers exit normally so their queued messages are sent
+        pool.close()
+        pool.join()
+    finally:
+      progress.stop()
+    end_time = datetime.datetime.now()
+    calc_rate = run_exe_count / (end_time - start_time).total_seconds()
+    logger.info(f'Calculation rate: {calc_rate:.2f} calcs/sec')
+
+    # Combines the results of each job in the task order, as
+    # llm-optimal-execution does
+    bests = [[] for _ in jobs]
+    for key, search in sorted(done.items()):
+      bests[key[0]] = OptimalExecution.update_list(
+        bests[key[0]], search[0], commons[key[0]]['top_n'])
+    return bests
+
+  # Maximum number of blocks in the block caches of a worker, they are
+  # cleared beyond it
+  kMaxCachedBlocks = 16384
+
+  # Best sample rate thresholds and search arguments per job, and block caches
+  # per cache key of the worker process, see init_worker()
+  _thresholds = []
+  _commons = []
+  _cache_keys = []
+  _block_caches = {}
+
+  @staticmethod
+  def init_worker(thresholds, commons, cache_keys, progress_queue=None):
+    """
+    Same as OptimalExecution.init_worker() with a threshold and search
+    arguments per job. The searches of the jobs sharing a cache key share one
+    block cache, the blocks don't depend on the processor count nor the batch
+    size, see Llm._get_block_key().
+    """
+    OptimalExecution.init_worker(None, None, progress_queue)
+    BatchSearch._thresholds = thresholds
+    BatchSearch._commons = commons
+    BatchSearch._cache_keys = cache_keys
+    BatchSearch._block_caches = {}
+
+  @staticmethod
+  def search_part(part):
+    key, (index, tp, pp, dp, ppint, batch_size, activation_recompute,
+          optimizer_sharding, tensor_par_comm_type, outer_range) = part
+    caches = BatchSearch._block_caches
+    if sum(len(cache) for cache in caches.values()) > \
+       BatchSearch.kMaxCachedBlocks:
+      caches.clear()
+    OptimalExecution._threshold = BatchSearch._thresholds[index]
+    search = OptimalExecution.search(
+      tp=tp, pp=pp, dp=dp, ppint=ppint, batch_size=batch_size,
+      activation_recompute=activation_recompute,
+      optimizer_sharding=optimizer_sharding,
+      tensor_par_comm_type=tensor_par_comm_type, outer_range=outer_range,
+      block_cache=caches.setdefault(BatchSearch._cache_keys[index], {}),
+      **BatchSearch._commons[index])
+    if OptimalExecution._reporter is not None:
+      OptimalExecution._reporter.flush()
+    return key, search
+
+
+calculon.CommandLine.register(BatchSearch)
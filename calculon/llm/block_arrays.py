@@ -0,0 +1,126 @@
+"""
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *  https://www.apache.org/licenses/LICENSE-2.0
+ *
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+"""
+
+import numpy as np
+
+from .layers import Layer
+
+
+class BlockArrays:
+  """
+  Struct of arrays form of blocks. The values of Layer.get_block_row() of the
+  layers are stored as NumPy arrays, one per Layer.kBlockColumns name with a
+  row per block and a column per layer, and the block statistics are
+  reductions over the layers. The flops and memory times of all the layers and
+  stages are computed at once from the flops, bytes and engine arrays. The
+  blocks share the system and its data type.
+
+  The blocks are padded to the same number of layers with zeros, which don't
+  change the statistics. The sums are cumulative sums, which add the layers in
+  the order of the layer loop of Llm._compute_block_stats(), so the statistics
+  equal the ones of the loop as floats.
+  """
+
+  _kStages = ('fw', 'agrad', 'wgrad', 'optim')
+
+  _kColumn = {name: index for index, name in enumerate(Layer.kBlockColumns)}
+
+  def __init__(self, blocks):
+    """
+    The blocks are given as (layers, training) pairs.
+    """
+    self.sys = blocks[0][0][0].sys
+    self.training = np.array([training for _, training in blocks])
+    num_layers = max(len(layers) for layers, _ in blocks)
+    self.values = np.zeros(
+      (len(blocks), num_layers, len(Layer.kBlockColumns)))
+    for index, (layers, training) in enumerate(blocks):
+      assert all(layer.sys is self.sys for layer in layers)
+      self.values[index, :len(layers)] = [
+        layer.get_block_row(training) for layer in layers]
+
+  def __getitem__(self, name):
+    return self.values[:, :, BlockArrays._kColumn[name]]
+
+  def _columns(self, names):
+    return self.values[:, :, [BlockArrays._kColumn[name] for name in names]]
+
+  def _stage_times(self):
+    """
+    Returns the flops, memory and processing times arrays of the layers, with
+    a last axis per stage.
+    """
+    flops = self._columns([s + '_flops' for s in BlockArrays._kStages])
+    mem = self._columns([s + '_mem_accessed' for s in BlockArrays._kStages])
+    # The optimizer step runs on the vector engine
+    matrix = np.zeros(flops.shape, dtype=bool)
+    matrix[:, :, :3] = (self['matrix'] != 0)[:, :, None]
+    flops_time = np.empty(flops.shape)
+    flops_time[matrix] = flops[matrix] / self.sys.get_matrix_throughputs(
+      flops[matrix])
+    flops_time[~matrix] = flops[~matrix] / self.sys.get_vector_throughputs(
+      flops[~matrix])
+    mem_time = mem / self.sys.get_mem1_throughputs(mem)
+    time = np.where(
+      (self['timed'] != 0)[:, :, None],
+      self._columns([s + '_time' for s in BlockArrays._kStages]),
+      self.sys.get_processing_times(flops_time, mem_time))
+    return flops, flops_time, mem, mem_time, time
+
+  def get_stats(self):
+    """
+    Returns the statistics of the blocks in BlockFunction.kStats order, as an
+    array with a row per block.
+    """
+    flops, flops_time, mem, mem_time, time = self._stage_times()
+
+    def stage(index):
+      return [flops[:, :, index], flops_time[:, :, index], mem[:, :, index],
+              mem_time[:, :, index], time[:, :, index]]
+
+    def comm(name):
+      return [self[f'{block}block_{name}{suffix}']
+              for suffix in ('_size', '_time', '_time_exposed')
+              for block in ('base', 'edge')]
+
+    # The loop adds the forward statistics accumulated so far for every layer
+    # to recompute
+    recompute = (self['recompute'] != 0) & self.training[:, None]
+    recompute_fw = [np.where(recompute, np.cumsum(column, axis=1), 0)
+                    for column in stage(0)[:4]]
+    recompute_fw.append(np.where(recompute, time[:, :, 0], 0))
+
+    # Sorted like kStats, without the activation storage space
+    columns = (stage(0) + comm('fw_tp') + [
+      self['weight'], self['act_working']] + recompute_fw +
+      comm('recomm') + stage(1) + comm('agrad_tp') + stage(2) + stage(3) + [
+        self['weight_grad'], self['weight_grad_no_sharding'],
+        self['act_grad'], self['optimizer']])
+    sums = np.cumsum(np.stack(columns, axis=2), axis=1)[:, -1]
+
+    # The storage space adds the activation, then removes the output and the
+    # activation that aren't stored
+    storage = np.stack([self['act_storage'], -self['output_unstored'],
+                        -self['act_unstored']], axis=2)
+    storage = np.cumsum(storage.reshape(len(storage), -1), axis=1)[:, -1]
+
+    bw_req = np.maximum(0, np.max(self._columns([
+      'baseblock_fw_tp_bw_req', 'edgeblock_fw_tp_bw_req',
+      'baseblock_agrad_tp_bw_req', 'edgeblock_agrad_tp_bw_req']),
+      axis=(1, 2)))
+    return np.concatenate(
+      [sums[:, :13], storage[:, None], sums[:, 13:], bw_req[:, None]], axis=1)
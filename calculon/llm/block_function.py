@@ -0,0 +1,332 @@
+"""
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *  https://www.apache.org/licenses/LICENSE-2.0
+ *
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+"""
+
+import ast
+import copy
+import inspect
+import textwrap
+
+from .layers import Layer
+
+
+class BlockFunction:
+  """
+  Generates the block statistics loop of Llm._compute_block_stats() as a flat
+  Python function, specialized for the structure of a block. The structure is
+  the layer types and flags, which only depend on a few execution switches, so
+  a handful of functions serve all the blocks of a search.
+
+  The layers using the Layer time methods have them inlined, the other layers
+  have their methods called in the same order as in the loop. The Layer size
+  getters are inlined as expressions derived from their source, overridden
+  getters are called. The statistics are computed with the same operations in
+  the same order, so they equal the ones of the loop.
+  """
+
+  # Accumulated by the layer loop, in Llm._kBlockStats order
+  kStats = (
+    'block_fw_flops', 'block_fw_flops_time', 'block_fw_mem_accessed',
+    'block_fw_mem_time', 'block_fw_time', 'baseblock_fw_tp_size',
+    'edgeblock_fw_tp_size', 'baseblock_fw_tp_time', 'edgeblock_fw_tp_time',
+    'baseblock_fw_tp_time_exposed', 'edgeblock_fw_tp_time_exposed',
+    'block_weight_space', 'block_act_working_space',
+    'block_act_storage_space', 'block_re_flops', 'block_re_flops_time',
+    'block_re_mem_accessed', 'block_re_mem_time', 'block_re_time',
+    'baseblock_recomm_size', 'edgeblock_recomm_size', 'baseblock_recomm_time',
+    'edgeblock_recomm_time', 'baseblock_recomm_time_exposed',
+    'edgeblock_recomm_time_exposed', 'block_agrad_flops',
+    'block_agrad_flops_time', 'block_agrad_mem_accessed',
+    'block_agrad_mem_time', 'block_agrad_time', 'baseblock_agrad_tp_size',
+    'edgeblock_agrad_tp_size', 'baseblock_agrad_tp_time',
+    'edgeblock_agrad_tp_time', 'baseblock_agrad_tp_time_exposed',
+    'edgeblock_agrad_tp_time_exposed', 'block_wgrad_flops',
+    'block_wgrad_flops_time', 'block_wgrad_mem_accessed',
+    'block_wgrad_mem_time', 'block_wgrad_time', 'block_optim_flops',
+    'block_optim_flops_time', 'block_optim_mem_accessed',
+    'block_optim_mem_time', 'block_optim_time', 'block_weight_grad_space',
+    'block_weight_grad_space_no_sharding', 'block_act_grad_space',
+    'block_optimizer_space', 'tp_bw_overlap_req')
+
+  # Layers overriding any of these are called instead of inlined
+  _kCalledMethods = (
+    'compute_flops_time', '_compute_flops_time', 'compute_mem_time',
+    '_compute_mem_time', 'compute_net_time', '_compute_net_time',
+    'compute_processing_time', '_compute_processing_times',
+    '_compute_processing_time', 'get_comm_bytes', 'get_exposed_net_time',
+    'get_required_bandwidth')
+
+  _kFlopsMethods = {
+    'fw': 'get_fw_flops', 'agrad': 'get_agrad_flops',
+    'wgrad': 'get_wgrad_flops', 'optim': 'get_optim_step_flops'}
+
+  _kMemMethods = {
+    'fw': 'get_fw_mem_accessed', 'agrad': 'get_agrad_mem_accessed',
+    'wgrad': 'get_wgrad_mem_accessed', 'optim': 'get_optim_step_mem_accessed'}
+
+  # Conditions of the Layer getters on the layer, which are part of the block
+  # structure, see _derive()
+  _kConditions = ('self.weight_space == 0', 'self.bytes_per_element < 4')
+  _get_conditions = staticmethod(eval(
+    'lambda self: (' + ', '.join(_kConditions) + ',)'))
+
+  # Generated functions by block structure, see get_signature(), and parsed
+  # Layer getters, see _derive()
+  _functions = {}
+  _definitions = {}
+
+  @staticmethod
+  def get_signature(layers, training):
+    """
+    Returns the block structure the generated code depends on.
+    """
+    return (training, tuple(
+      (type(layer), layer.use_matrix_engine(), layer.get_recompute_flag(),
+       layer.get_recomm_flag(), layer.reuses_activation(),
+       layer.stores_activation(), layer.stores_output(),
+       BlockFunction._get_conditions(layer))
+      for layer in layers))
+
+  @staticmethod
+  def get(layers, training):
+    """
+    Returns the function computing the block statistics of the layers, as a
+    tuple in kStats order. It is called with the layers.
+    """
+    signature = BlockFunction.get_signature(layers, training)
+    function = BlockFunction._functions.get(signature)
+    if function is None:
+      namespace = {}
+      exec(compile(BlockFunction.generate(layers, training),
+                   '<block function>', 'exec'), namespace)
+      function = namespace['block_stats']
+      BlockFunction._functions[signature] = function
+    return function
+
+  @staticmethod
+  def _inlined(layer):
+    return all(getattr(type(layer), name) is getattr(Layer, name)
+               for name in BlockFunction._kCalledMethods)
+
+  @staticmethod
+  def _getter(layer, name, **kwargs):
+    """
+    Returns the expression of a layer getter for layer 'l', derived from the
+    Layer getter when the layer doesn't override it.
+    """
+    if getattr(type(layer), name) is not getattr(Layer, name):
+      args = ''.join(f'{key}={value!r}' for key, value in kwargs.items())
+      return f'l.{name}({args})'
+    return ast.unparse(BlockFunction._derive(layer, name, kwargs))
+
+  @staticmethod
+  def _derive(layer, name, kwargs):
+    """
+    Returns the expression tree of the Layer getter called with the keyword
+    arguments. The local variables of the getter are substituted, its
+    conditions are evaluated on the layer and the getters it calls are
+    derived in turn. Its assertions are left to the layer loop.
+    """
+    function = BlockFunction._get_definition(name)
+    params = [arg.arg for arg in function.args.args]
+    values = dict(zip(params[len(params) - len(function.args.defaults):],
+                      (default.value for default in function.args.defaults)))
+    values.update(kwargs)
+    env = {param: ast.Constant(value) for param, value in values.items()}
+    values[params[0]] = layer
+
+    def substitute(node):
+      # Replaces the locals and calls of the getter in an expression tree
+      if isinstance(node, ast.Name):
+        if node.id == params[0]:
+          return ast.Name('l', ast.Load())
+        return copy.deepcopy(env.get(node.id, node))
+      if isinstance(node, ast.Call) and \
+         isinstance(node.func, ast.Attribute) and \
+         isinstance(node.func.value, ast.Name) and \
+         node.func.value.id == params[0] and not node.args and \
+         getattr(type(layer), node.func.attr) is \
+           getattr(Layer, node.func.attr, None):
+        return BlockFunction._derive(layer, node.func.attr, {
+          keyword.arg: ast.literal_eval(keyword.value)
+          for keyword in node.keywords})
+      for field, value in ast.iter_fields(node):
+        if isinstance(value, ast.AST):
+          setattr(node, field, substitute(value))
+        elif isinstance(value, list):
+          setattr(node, field, [substitute(item) if isinstance(item, ast.AST)
+                                else item for item in value])
+      return node
+
+    def walk(statements):
+      for statement in statements:
+        if isinstance(statement, ast.Return):
+          return substitute(copy.deepcopy(statement.value))
+        if isinstance(statement, ast.If):
+          test = ast.unparse(statement.test)
+          assert test in BlockFunction._kConditions or not any(
+            isinstance(node, ast.Name) and node.id == params[0]
+            for node in ast.walk(statement.test)), \
+            f'Layer.{name}() condition not in the signature: {test}'
+          branch = statement.body if eval(test, {}, values) \
+            else statement.orelse
+          result = walk(branch)
+          if result is not None:
+            return result
+        elif isinstance(statement, ast.Assign):
+          assert len(statement.targets) == 1
+          env[statement.targets[0].id] = substitute(
+            copy.deepcopy(statement.value))
+        elif isinstance(statement, ast.AugAssign):
+          env[statement.target.id] = ast.BinOp(
+            env[statement.target.id], statement.op,
+            substitute(copy.deepcopy(statement.value)))
+        else:
+          assert isinstance(statement, ast.Assert), \
+            f'Layer.{name}() can\'t be derived'
+      return None
+
+    expression = walk(function.body)
+    assert expression is not None, f'Layer.{name}() returns nothing'
+    return expression
+
+  @staticmethod
+  def _get_definition(name):
+    function = BlockFunction._definitions.get(name)
+    if function is None:
+      function = ast.parse(textwrap.dedent(
+        inspect.getsource(getattr(Layer, name)))).body[0]
+      BlockFunction._definitions[name] = function
+    return function
+
+  @staticmethod
+  def generate(layers, training):
+    """
+    Returns the source code of the block statistics function of the layers.
+    """
+    lines = ['def block_stats(layers):',
+             '  sys = layers[0].sys',
+             '  matrix_throughput = sys.get_matrix_throughput',
+             '  vector_throughput = sys.get_vector_throughput',
+             '  mem1_throughput = sys.get_mem1_throughput',
+             '  processing_time = sys.get_processing_time']
+    lines += [f'  {name} = 0' for name in BlockFunction.kStats]
+
+    def emit(line):
+      lines.append('  ' + line)
+
+    def add(name, value):
+      if value is not None:
+        emit(f'{name} += {value}')
+
+    def bandwidth(value):
+      if value is not None:
+        emit(f'tp_bw_overlap_req = max(tp_bw_overlap_req, {value})')
+
+    def stage_times(layer, inlined, stage):
+      # Returns the flops, flops time, memory, memory time and processing
+      # time of the stage
+      flops = BlockFunction._getter(layer, BlockFunction._kFlopsMethods[stage])
+      mem = BlockFunction._getter(layer, BlockFunction._kMemMethods[stage])
+      if not inlined:
+        return (flops, f'l.compute_flops_time({stage!r})', mem,
+                f'l.compute_mem_time({stage!r})',
+                f'l.compute_processing_time({stage!r})')
+      if layer.use_matrix_engine() and stage != 'optim':
+        throughput = 'matrix_throughput'
+      else:
+        throughput = 'vector_throughput'
+      emit(f'{stage}_flops = {flops}')
+      emit(f'{stage}_flops_time = {stage}_flops / {throughput}({stage}_flops)')
+      emit(f'{stage}_mem = {mem}')
+      emit(f'{stage}_mem_time = {stage}_mem / mem1_throughput({stage}_mem)')
+      emit(f'{stage}_time = processing_time({stage}_flops_time, '
+           f'{stage}_mem_time)')
+      return (f'{stage}_flops', f'{stage}_flops_time', f'{stage}_mem',
+              f'{stage}_mem_time', f'{stage}_time')
+
+    def stage_comm(inlined, stage, method, baseblock):
+      # Inlined layers have no communication
+      if inlined:
+        return None
+      return f'l.{method}({stage!r}, baseblock={baseblock})'
+
+    def add_stage(layer, inlined, prefix, stage, block):
+      flops, flops_time, mem, mem_time, time = stage_times(
+        layer, inlined, stage)
+      add(f'block_{prefix}_flops', flops)
+      add(f'block_{prefix}_flops_time', flops_time)
+      add(f'block_{prefix}_mem_accessed', mem)
+      add(f'block_{prefix}_mem_time', mem_time)
+      add(f'block_{prefix}_time', time)
+      if block is None:
+        return time
+      for name, method in ((f'{block}_size', 'get_comm_bytes'),
+                           (f'{block}_time', 'compute_net_time'),
+                           (f'{block}_time_exposed', 'get_exposed_net_time')):
+        add(f'baseblock_{name}', stage_comm(inlined, stage, method, True))
+        add(f'edgeblock_{name}', stage_comm(inlined, stage, method, False))
+      bandwidth(stage_comm(inlined, stage, 'get_required_bandwidth', True))
+      bandwidth(stage_comm(inlined, stage, 'get_required_bandwidth', False))
+      return time
+
+    for index, layer in enumerate(layers):
+      emit(f'# {type(layer).__name__}')
+      emit(f'l = layers[{index}]')
+      inlined = BlockFunction._inlined(layer)
+
+      fw_time = add_stage(layer, inlined, 'fw', 'fw', 'fw_tp')
+      if training:
+        if layer.get_recompute_flag():
+          emit('block_re_flops += block_fw_flops')
+          emit('block_re_flops_time += block_fw_flops_time')
+          emit('block_re_mem_accessed += block_fw_mem_accessed')
+          emit('block_re_mem_time += block_fw_mem_time')
+          add('block_re_time', fw_time)
+        if layer.get_recomm_flag():
+          for name, method in (('recomm_size', 'get_comm_bytes'),
+                               ('recomm_time', 'compute_net_time'),
+                               ('recomm_time_exposed', 'get_exposed_net_time')):
+            add(f'baseblock_{name}',
+                stage_comm(inlined, 'wgrad', method, True))
+            add(f'edgeblock_{name}',
+                stage_comm(inlined, 'wgrad', method, False))
+        add_stage(layer, inlined, 'agrad', 'agrad', 'agrad_tp')
+        add_stage(layer, inlined, 'wgrad', 'wgrad', None)
+        add_stage(layer, inlined, 'optim', 'optim', None)
+
+      activation = BlockFunction._getter(layer, 'get_activation')
+      add('block_weight_space', BlockFunction._getter(layer, 'get_weight'))
+      if not layer.reuses_activation():
+        add('block_act_working_space', activation)
+      add('block_act_storage_space', activation)
+      if training:
+        if not layer.stores_output():
+          emit('block_act_storage_space -= ' +
+               BlockFunction._getter(layer, 'get_output'))
+        if not layer.stores_activation():
+          emit(f'block_act_storage_space -= {activation}')
+        add('block_weight_grad_space',
+            BlockFunction._getter(layer, 'get_weight_grad'))
+        add('block_weight_grad_space_no_sharding',
+            BlockFunction._getter(layer, 'get_weight_grad', sharded=False))
+        add('block_act_grad_space',
+            BlockFunction._getter(layer, 'get_activation_grad'))
+        add('block_optimizer_space',
+            BlockFunction._getter(layer, 'get_optimizer'))
+
+    lines.append('  return (' + ', '.join(BlockFunction.kStats) + ')')
+    return '\n'.join(lines) + '\n'
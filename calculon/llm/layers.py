@@ -25,6 +25,37 @@ class Layer:
   memory access, or network operation.
   """
 
+  # Blocks hold many layers, slots keep them compact
+  __slots__ = (
+    'name', 'sys', 'fw_flops', 'agrad_flops', 'wgrad_flops', 'inputs_size',
+    'output_size', 'activation_space', 'activation_grads', 'weight_space',
+    'weight_grads', 'optim_space', 'optim_sharding_num_proc',
+    'needs_recompute', 'needs_recomm', 'activation_reused',
+    'activation_stored', 'output_stored', 'bytes_per_element',
+    'processing_time', 'net_exposed_time', '_stage_cache')
+
+  # Values of get_block_row()
+  kBlockColumns = (
+    'matrix', 'recompute', 'recomm', 'timed',
+    'fw_flops', 'fw_mem_accessed', 'fw_time',
+    'baseblock_fw_tp_size', 'edgeblock_fw_tp_size',
+    'baseblock_fw_tp_time', 'edgeblock_fw_tp_time',
+    'baseblock_fw_tp_time_exposed', 'edgeblock_fw_tp_time_exposed',
+    'baseblock_fw_tp_bw_req', 'edgeblock_fw_tp_bw_req',
+    'baseblock_recomm_size', 'edgeblock_recomm_size',
+    'baseblock_recomm_time', 'edgeblock_recomm_time',
+    'baseblock_recomm_time_exposed', 'edgeblock_recomm_time_exposed',
+    'agrad_flops', 'agrad_mem_accessed', 'agrad_time',
+    'baseblock_agrad_tp_size', 'edgeblock_agrad_tp_size',
+    'baseblock_agrad_tp_time', 'edgeblock_agrad_tp_time',
+    'baseblock_agrad_tp_time_exposed', 'edgeblock_agrad_tp_time_exposed',
+    'baseblock_agrad_tp_bw_req', 'edgeblock_agrad_tp_bw_req',
+    'wgrad_flops', 'wgrad_mem_accessed', 'wgrad_time',
+    'optim_flops', 'optim_mem_accessed', 'optim_time',
+    'weight', 'act_working', 'act_storage', 'output_unstored',
+    'act_unstored', 'weight_grad', 'weight_grad_no_sharding', 'act_grad',
+    'optimizer')
+
   def __init__(self, name, sys, fw_flops=0, agrad_flops=0, wgrad_flops=0,
                inputs_size=0, output_size=0, activation_space=0,
                activation_grads=0, weight_space=0, weight_grads=0,
@@ -58,6 +89,8 @@ class Layer:
     self.bytes_per_element = 1
     self.processing_time = None
     self.net_exposed_time = None
+    # Stage times are computed once, see _cached()
+    self._stage_cache = {}
 
   def get_stats_json(self):
     return {
@@ -148,10 +181,34 @@ class Layer:
 
   def set_bytes_per_element(self, bytes_per_element):
     self.bytes_per_element = bytes_per_element
+    self._stage_cache.clear()
 
   # Shard (distribute) optimizer and weight grads between data parallel nodes
   def shard_optimizer(self, num_procs):
     self.optim_sharding_num_proc = num_procs
+    self._stage_cache.clear()
+
+  def set_system(self, sys):
+    """
+    Moves the layer to another system. The sizes and flops don't depend on the
+    system, only the stage times are computed again.
+    """
+    self.sys = sys
+    self.processing_time = None
+    self.net_exposed_time = None
+    self._stage_cache.clear()
+
+  def _cached(self, key, compute, *args):
+    """
+    Returns compute(*args), computing it only the first time for the key. The
+    stage times only depend on the layer configuration and the system, which
+    don't change after the layer is compiled.
+    """
+    value = self._stage_cache.get(key)
+    if value is None:
+      value = compute(*args)
+      self._stage_cache[key] = value
+    return value
 
   # getters that will be called from Llm model class, can be rewritten
   def get_fw_flops(self):
@@ -291,6 +348,9 @@ class Layer:
     return self.get_comm_bytes(stage, baseblock)
 
   def compute_flops_time(self, stage):
+    return self._cached(('flops_time', stage), self._compute_flops_time, stage)
+
+  def _compute_flops_time(self, stage):
     if stage == "fw":
       flops = self.get_fw_flops()
     elif stage == "agrad":
@@ -308,6 +368,9 @@ class Layer:
     return flops / throughput
 
   def compute_mem_time(self, stage):
+    return self._cached(('mem_time', stage), self._compute_mem_time, stage)
+
+  def _compute_mem_time(self, stage):
     if stage == "fw":
       mem = self.get_fw_mem_accessed()
     elif stage == "agrad":
@@ -321,6 +384,10 @@ class Layer:
     return mem / self.sys.get_mem1_throughput(mem)
 
   def compute_net_time(self, stage, baseblock=True):
+    return self._cached(('net_time', stage, baseblock), self._compute_net_time,
+                        stage, baseblock)
+
+  def _compute_net_time(self, stage, baseblock=True):
     return 0
 
   def get_exposed_net_time(self, stage, baseblock=True):
@@ -330,15 +397,100 @@ class Layer:
     return 0
 
   def compute_processing_time(self, stage):
+    # The processing and exposed times of the last processed stage are kept in
+    # the layer, they are restored along with the cached time
+    time, self.processing_time, self.net_exposed_time = self._cached(
+      ('processing_time', stage), self._compute_processing_times, stage)
+    return time
+
+  def _compute_processing_times(self, stage):
+    time = self._compute_processing_time(stage)
+    return time, self.processing_time, self.net_exposed_time
+
+  def _compute_processing_time(self, stage):
     self.processing_time =  self.sys.get_processing_time(
       self.compute_flops_time(stage),
       self.compute_mem_time(stage)
     )
     return self.processing_time
 
+  def computes_processing_time(self):
+    """
+    Whether the layer computes its own processing times, instead of the
+    processing time of its flops and memory times.
+    """
+    return (type(self)._compute_processing_time is not
+            Layer._compute_processing_time)
+
+  def communicates(self):
+    """
+    Whether the layer has network communication.
+    """
+    return any(getattr(type(self), name) is not getattr(Layer, name)
+               for name in ('get_comm_bytes', '_compute_net_time',
+                            'get_exposed_net_time', 'get_required_bandwidth'))
+
+  def get_block_row(self, training):
+    """
+    Returns the values of the layer in the block statistics, in kBlockColumns
+    order, see BlockArrays. The methods are called in the same order as in the
+    layer loop of Llm._compute_block_stats(). The flops and memory times are
+    left to BlockArrays, the processing times are only given by the layers
+    computing their own ones.
+    """
+    timed = self.computes_processing_time()
+    communicates = self.communicates()
+    row = [self.use_matrix_engine(), self.get_recompute_flag(),
+           self.get_recomm_flag(), timed]
+
+    def stage_row(stage, flops, mem_accessed, comm):
+      row.extend((flops, mem_accessed,
+                  self.compute_processing_time(stage) if timed else 0))
+      if comm and communicates:
+        for method in (self.get_comm_bytes, self.compute_net_time,
+                       self.get_exposed_net_time,
+                       self.get_required_bandwidth):
+          row.append(method(stage, baseblock=True))
+          row.append(method(stage, baseblock=False))
+      elif comm:
+        row.extend((0,) * 8)
+
+    stage_row('fw', self.get_fw_flops(), self.get_fw_mem_accessed(), True)
+    if training:
+      if self.get_recomm_flag() and communicates:
+        for method in (self.get_comm_bytes, self.compute_net_time,
+                       self.get_exposed_net_time):
+          row.append(method('wgrad', baseblock=True))
+          row.append(method('wgrad', baseblock=False))
+      else:
+        row.extend((0,) * 6)
+      stage_row('agrad', self.get_agrad_flops(),
+                self.get_agrad_mem_accessed(), True)
+      stage_row('wgrad', self.get_wgrad_flops(),
+                self.get_wgrad_mem_accessed(), False)
+      stage_row('optim', self.get_optim_step_flops(),
+                self.get_optim_step_mem_accessed(), False)
+    else:
+      row.extend((0,) * 23)
+
+    activation = self.get_activation()
+    row.extend((self.get_weight(), pick(self.reuses_activation(), 0,
+                                        activation), activation))
+    if training:
+      row.extend((pick(self.stores_output(), 0, self.get_output()),
+                  pick(self.stores_activation(), 0, activation),
+                  self.get_weight_grad(),
+                  self.get_weight_grad(sharded=False),
+                  self.get_activation_grad(), self.get_optimizer()))
+    else:
+      row.extend((0,) * 6)
+    return row
+
 # We can factor all layers peculiarities and layer-wise optimizations by
 # rewriting parent class member functions when needed
 class Linear(Layer):
+  __slots__ = ()
+
   def __init__(self, name, sys, batch_seq, c_in, c_out,
                needs_recompute=False, activation_reused=False,
                activation_stored=True, output_stored=True):
@@ -364,6 +516,10 @@ class Linear(Layer):
     return True
 
 class LinearOverlapped(Layer):
+  __slots__ = ('tensor_par_comm_type', 'num_tiles', 'net_id', 'net',
+               'num_peers', 'conjugate', 'in_network_reduction', 'tp_overlap',
+               '_processed_flag')
+
   def __init__(self, name, sys, batch_seq, c_in, c_out, tensor_par_comm_type,
                num_tiles, net_id, num_peers, conjugate=False,
                in_network_reduction=False, tp_overlap='pipe',
@@ -373,6 +529,7 @@ class LinearOverlapped(Layer):
     m, n, k = batch_seq, c_in, c_out
     self.tensor_par_comm_type = tensor_par_comm_type
     self.num_tiles = num_tiles
+    self.net_id = net_id
     self.net = sys.get_network(net_id)
     self.num_peers = num_peers
     self.conjugate = conjugate
@@ -485,7 +642,7 @@ class LinearOverlapped(Layer):
   def get_comm_tile(self, stage, baseblock=True):
     return self.get_comm_bytes(stage, baseblock) / self.get_num_tiles()
 
-  def compute_net_time(self, stage, baseblock=True):
+  def _compute_net_time(self, stage, baseblock=True):
     if self.num_peers == 1:
       return 0
     split_comm = (self.tensor_par_comm_type == 'rs_ag') or (
@@ -546,7 +703,7 @@ class LinearOverlapped(Layer):
     if stage == 'optim':
       return 0
 
-  def compute_processing_time(self, stage):
+  def _compute_processing_time(self, stage):
     flop_time = self.compute_flops_time(stage)
     flop_time_slowed = flop_time / (1 - self.net.processor_usage)
     mem_time = self.compute_mem_time(stage)
@@ -591,6 +748,11 @@ class LinearOverlapped(Layer):
     self._processed_flag = True
     return self.processing_time
 
+  def set_system(self, sys):
+    super().set_system(sys)
+    self.net = sys.get_network(self.net_id)
+    self._processed_flag = False
+
   def get_exposed_net_time(self, stage, baseblock=True):
     # only use after calling compute_processing_time(), otherwise it's set with None
     assert self._processed_flag
@@ -605,6 +767,8 @@ class LinearOverlapped(Layer):
     return net_tile_size / flop_tile_slowed
 
 class BatchMatMul(Layer):
+  __slots__ = ()
+
   def __init__(self, name, sys, batch, size_a, contraction_size, size_b,
                needs_recompute=False, activation_reused=False,
                activation_stored=True, output_stored=True):
@@ -628,6 +792,8 @@ class BatchMatMul(Layer):
 # https://kratzert.github.io/2016/02/12/understanding-the-gradient-flow-through-the-batch-normalization-layer.html
 # https://cthorey.github.io./blog/2016/backpropagation/
 class LayerNorm(Layer):
+  __slots__ = ()
+
   def __init__(self, name, sys, act_size, hidden,
                needs_recompute=False, activation_reused=False,
                activation_stored=True, output_stored=True):
@@ -650,6 +816,8 @@ class LayerNorm(Layer):
 
 
 class DropOut(Layer):
+  __slots__ = ()
+
   def __init__(self, name, sys, act_size,
                needs_recompute=False, activation_reused=False,
                activation_stored=True, output_stored=True):
@@ -688,6 +856,8 @@ class DropOut(Layer):
 
 # https://mlfromscratch.com/activation-functions-explained/#/
 class GeLU(Layer):
+  __slots__ = ('_fused',)
+
   def __init__(self, name, sys, act_size,
                needs_recompute=False, activation_reused=False,
                activation_stored=True, output_stored=True,
@@ -716,6 +886,8 @@ class GeLU(Layer):
 
 # https://automata88.medium.com/how-to-implement-the-softmax-derivative-independently-from-any-loss-function-ae6d44363a9d
 class SoftMax(Layer):
+  __slots__ = ()
+
   def __init__(self, name, sys, act_size,
                needs_recompute=False, activation_reused=False,
                activation_stored=True, output_stored=True):
@@ -738,6 +910,8 @@ class SoftMax(Layer):
 
 # https://explained.ai/matrix-calculus/#sec:1.4.2
 class ElementWise(Layer):
+  __slots__ = ()
+
   def __init__(self, name, sys, operand1, operand2,
                needs_recompute=False, activation_reused=False,
                activation_stored=True, output_stored=True):
@@ -758,6 +932,8 @@ class ElementWise(Layer):
 
 # Splits activation on the forward pass, sums gradients on the backward
 class Fork(Layer):
+  __slots__ = ('num_users',)
+
   def __init__(self, name, sys, act_size, num_users,
                needs_recompute=False, activation_reused=False,
                activation_stored=True, output_stored=True):
@@ -785,11 +961,14 @@ class Fork(Layer):
 
 
 class TPComm(Layer):
+  __slots__ = ('net_id', 'net', 'num_peers', 'tensor_par_comm_type',
+               'comm_size', 'conjugate')
 
   def __init__(self, name, sys, act_size, net_id, num_peers, tensor_par_comm_type,
                conjugate=False, in_network_reduction=False,
                needs_recomm=False, activation_reused=False,
                activation_stored=True, output_stored=True):
+    self.net_id = net_id
     self.net = sys.get_network(net_id)
     self.num_peers = num_peers
     self.tensor_par_comm_type = tensor_par_comm_type
@@ -832,6 +1011,10 @@ class TPComm(Layer):
                      activation_stored=activation_stored,
                      output_stored=output_stored)
 
+  def set_system(self, sys):
+    super().set_system(sys)
+    self.net = sys.get_network(self.net_id)
+
   def get_activation(self):
     if self.tensor_par_comm_type == 'rs_ag':
       return self.activation_space * self.bytes_per_element / self.num_peers
@@ -887,12 +1070,12 @@ class TPComm(Layer):
         # optim and wgrad stage has no comm if no ag_redo flag for RS_AG
         return 0
 
-  def compute_net_time(self, stage, baseblock=True):
+  def _compute_net_time(self, stage, baseblock=True):
     if self.num_peers == 1:
       return 0
     split_comm = (self.tensor_par_comm_type == 'rs_ag') or (
       (self.tensor_par_comm_type == 'p2p_rs_ag') and not baseblock)
-    net_compute_time = super().compute_processing_time(stage)
+    net_compute_time = super()._compute_processing_time(stage)
     if split_comm:
       if self.conjugate:
         # ReduceScatter case
@@ -936,5 +1119,5 @@ class TPComm(Layer):
     # only use after calling compute_processing_time(), otherwise it's set witth None
     return self.compute_net_time(stage, baseblock)
 
-  def compute_processing_time(self, stage):
+  def _compute_processing_time(self, stage):
     return 0
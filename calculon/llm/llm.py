@@ -15,8 +15,14 @@
  * limitations under the License.
 """
 
+import logging
+import types
+from operator import attrgetter
+
 from calculon import *
 from .layers import *
+from .block_arrays import BlockArrays
+from .block_function import BlockFunction
 
 
 class Llm:
@@ -28,6 +34,69 @@ class Llm:
   3. Run on particular hardware system
   """
 
+  # Values computed by _compute_block_stats(), these are shared between
+  # executions with the same block key, see _get_block_key()
+  _kBlockStats = (
+    '_block_act_checkpoint_size', '_block_fw_flops', '_block_fw_flops_time',
+    '_block_fw_mem_accessed', '_block_fw_mem_time', '_block_fw_time',
+    '_baseblock_fw_tp_size', '_edgeblock_fw_tp_size', '_baseblock_fw_tp_time',
+    '_edgeblock_fw_tp_time', '_baseblock_fw_tp_time_exposed',
+    '_edgeblock_fw_tp_time_exposed', '_block_weight_space',
+    '_block_act_working_space', '_block_act_storage_space', '_block_re_flops',
+    '_block_re_flops_time', '_block_re_mem_accessed', '_block_re_mem_time',
+    '_block_re_time', '_baseblock_recomm_size', '_edgeblock_recomm_size',
+    '_baseblock_recomm_time', '_edgeblock_recomm_time',
+    '_baseblock_recomm_time_exposed', '_edgeblock_recomm_time_exposed',
+    '_block_agrad_flops', '_block_agrad_flops_time',
+    '_block_agrad_mem_accessed', '_block_agrad_mem_time', '_block_agrad_time',
+    '_baseblock_agrad_tp_size', '_edgeblock_agrad_tp_size',
+    '_baseblock_agrad_tp_time', '_edgeblock_agrad_tp_time',
+    '_baseblock_agrad_tp_time_exposed', '_edgeblock_agrad_tp_time_exposed',
+    '_block_wgrad_flops', '_block_wgrad_flops_time',
+    '_block_wgrad_mem_accessed', '_block_wgrad_mem_time', '_block_wgrad_time',
+    '_block_optim_flops', '_block_optim_flops_time',
+    '_block_optim_mem_accessed', '_block_optim_mem_time', '_block_optim_time',
+    '_block_weight_grad_space', '_block_weight_grad_space_no_sharding',
+    '_block_act_grad_space', '_block_optimizer_space', '_tp_bw_overlap_req')
+
+  # Block statistics set by _estimate_block_mem_stats()
+  _kBlockMemStats = (
+    '_block_act_checkpoint_size', '_block_weight_space',
+    '_block_act_working_space', '_block_act_storage_space',
+    '_block_weight_grad_space', '_block_weight_grad_space_no_sharding',
+    '_block_act_grad_space', '_block_optimizer_space')
+
+  # Models are recompiled many times during searches, slots keep them compact
+  __slots__ = _kBlockStats + (
+    'app', 'log', '_block_cache', '_cached_block', '_block_key', '_debug',
+    'exe', 'sys', '_compiled', '_executed', '_llm_block', '_blocks_per_proc',
+    '_bubble_reduction_blocks', '_blocks_per_chunk', '_chunks_per_proc',
+    '_baseblocks_per_chunk', '_edgeblocks_per_chunk', '_bytes_per_element',
+    '_batch_seq', '_batch_seq_par', '_activation_size',
+    '_seq_par_activation_size', '_tp_net', '_pp_net', '_dp_net',
+    '_block_fw_pp_size', '_block_bw_pp_size', '_block_dp_size',
+    '_baseblock_fw_time_no_offload', '_edgeblock_fw_time_no_offload',
+    '_baseblock_bw_time_no_offload', '_edgeblock_bw_time_no_offload',
+    '_baseblock_fw_offload_overhead', '_edgeblock_fw_offload_overhead',
+    '_baseblock_bw_offload_overhead', '_edgeblock_bw_offload_overhead',
+    '_baseblock_fw_time', '_edgeblock_fw_time', '_baseblock_bw_time',
+    '_edgeblock_bw_time', '_block_dp_time', '_dp_bw_overlap_req_chunk',
+    '_dp_bw_overlap_req_tail', '_weight_space', '_act_space',
+    '_act_checkpoint_size', '_weight_grad_space', '_act_grad_space',
+    '_optimizer_space', '_fw_flops', '_fw_flops_time', '_fw_mem_accessed',
+    '_fw_mem_time', '_fw_time', '_re_flops', '_re_flops_time',
+    '_re_mem_accessed', '_re_mem_time', '_re_time', '_agrad_flops',
+    '_agrad_flops_time', '_agrad_mem_accessed', '_agrad_mem_time',
+    '_agrad_time', '_wgrad_flops', '_wgrad_flops_time', '_wgrad_mem_accessed',
+    '_wgrad_mem_time', '_wgrad_time', '_optim_flops', '_optim_flops_time',
+    '_optim_mem_accessed', '_optim_mem_time', '_optim_time',
+    '_tp_comm_time_exposed', '_tp_comm_time_link', '_recomm_time_exposed',
+    '_recomm_time_link', '_pp_comm_time_exposed', '_pp_comm_time_link',
+    '_dp_comm_time_exposed', '_dp_comm_time_link', '_bubble_time',
+    '_chunk_fw_time', '_chunk_bw_time', '_chunk_bw_pp_time',
+    '_chunk_dp_overlap_time', '_chunk_dp_compute_time',
+    '_block_dp_compute_time', '_stage_keys')
+
   class Application:
     """Specifies the application configuration."""
     def __init__(self, cfg):
@@ -202,6 +271,65 @@ class Llm:
   class Error(Exception):
     pass
 
+  # Statuses returned by evaluate() instead of raising Llm.Error
+  kGood = 0
+  kBadInterleavingSize = 1
+  kBadInterleavingFactor = 2
+  kBadOffload = 3
+  kBadNetworkSize = 4
+  kBadNetworkFill = 5
+  kBadMemTier1 = 6
+  kBadMemTier2 = 7
+
+  kStatusMessages = {
+    kGood: 'Good',
+    kBadInterleavingSize: 'Pipeline interleaving must be less than or equal '
+                          'to the number of blocks per processor',
+    kBadInterleavingFactor: 'Pipeline interleaving must be a factor value of '
+                            'the number of blocks per processor',
+    kBadOffload: 'Offloading requires each processor to handle at least 3 '
+                 'blocks',
+    kBadNetworkSize: 'Network tier isn\'t big enough',
+    kBadNetworkFill: 'Network tier isn\'t fully used',
+    kBadMemTier1: 'Mem tier1 capacity is exceeded',
+    kBadMemTier2: 'Mem tier2 capacity is exceeded'
+  }
+
+  # Stages of evaluate() in order, with the execution fields they read directly
+  # or through the stages before them, and whether they also read the block key
+  # fields (see _get_block_key()). A stage is only recomputed when its fields or
+  # the system changed since it last ran, so searches vary the fields of the
+  # last stages fastest.
+  _kStages = (
+    ('networks', attrgetter(
+      'tensor_par', 'pipeline_par', 'data_par', 'tensor_par_net',
+      'pipeline_par_net', 'data_par_net'), False),
+    ('sizes', attrgetter(
+      'tensor_par', 'pipeline_par', 'pipeline_interleaving', 'microbatch_size',
+      'datatype', 'tensor_par_comm_type', 'weight_offload',
+      'activations_offload', 'optimizer_offload'), False),
+    ('block_mem', None, True),
+    ('memory', attrgetter(
+      'pipeline_par', 'pipeline_interleaving', 'global_batch_size', 'data_par',
+      'weight_offload', 'activations_offload', 'optimizer_offload'), True),
+    ('block', None, True),
+    ('batch', attrgetter(
+      'num_procs', 'tensor_par', 'pipeline_par', 'data_par', 'tensor_par_net',
+      'pipeline_par_net', 'data_par_net', 'global_batch_size',
+      'microbatch_size', 'datatype', 'fused_activation', 'attention_type',
+      'activation_recompute', 'pipeline_interleaving', 'optimizer_sharding',
+      'tensor_par_comm_type', 'tensor_par_overlap', 'seq_par_ag_redo',
+      'weight_offload', 'activations_offload', 'optimizer_offload',
+      'training'), False),
+    ('data_par', attrgetter(
+      'num_procs', 'tensor_par', 'pipeline_par', 'data_par', 'tensor_par_net',
+      'pipeline_par_net', 'data_par_net', 'global_batch_size',
+      'microbatch_size', 'datatype', 'fused_activation', 'attention_type',
+      'activation_recompute', 'pipeline_interleaving', 'optimizer_sharding',
+      'tensor_par_comm_type', 'tensor_par_overlap', 'seq_par_ag_redo',
+      'data_par_overlap', 'weight_offload', 'activations_offload',
+      'optimizer_offload', 'training'), False))
+
   @staticmethod
   def _factors(x):
     for cand in range(1, x + 1):
@@ -252,13 +380,81 @@ class Llm:
   def can_redo_ag(tensor_par_comm_type, activation_recompute):
     return tensor_par_comm_type == 'rs_ag' and activation_recompute != 'full'
 
-  def __init__(self, app, log):
+  @staticmethod
+  def _estimate_mem(app, sys, exe):
+    model = Llm(app, None)
+    model.exe = exe
+    model.sys = sys
+    status = model._compile_sizes_status()
+    if status == Llm.kGood:
+      model._estimate_block_mem_stats()
+      model._compute_mem_stats()
+    return model, status
+
+  @staticmethod
+  def get_mem_cap_reqs_estimate(app, sys, exe):
+    """
+    Computes the tier1 and tier2 memory capacity requirements of an execution
+    in closed form, without building the layers or running the model. The
+    values equal get_mem_tier1_cap_req() and get_mem_tier2_cap_req() of the
+    compiled and run model. Raises Llm.Error for the same execution size
+    errors as compile().
+    """
+    model, status = Llm._estimate_mem(app, sys, exe)
+    model._raise_status(status)
+    return model._get_mem_cap_reqs()
+
+  @staticmethod
+  def get_min_dp_comm_link_time_estimate(app, sys, exes):
+    """
+    Computes the minimum get_dp_comm_link_time() of executions which only
+    differ by network assignment in closed form, like
+    get_mem_cap_reqs_estimate(). This is a lower bound of their
+    get_comm_link_time(). Returns None if none of the network assignments is
+    valid. Raises Llm.Error for the same execution size errors as compile().
+    """
+    model, status = Llm._estimate_mem(app, sys, exes[0])
+    model._raise_status(status)
+    min_time = None
+    for exe in exes:
+      model.exe = exe
+      status, _ = model._assign_networks()
+      if status == Llm.kGood:
+        model._compute_block_dp_time()
+        time = model._blocks_per_proc * model._block_dp_time
+        if min_time is None or time < min_time:
+          min_time = time
+    return min_time
+
+  @staticmethod
+  def check_mem_caps_estimate(app, sys, exe):
+    """
+    Raises Llm.Error if the execution doesn't fit in the system memory. This is
+    a cheap filter to use before compile() and run() in searches.
+    """
+    model, status = Llm._estimate_mem(app, sys, exe)
+    model._raise_status(status)
+    model._check_mem_caps()
+
+  def __init__(self, app, log, block_cache=None):
     assert isinstance(app, self.Application)
     self.app = app
     self.log = log
 
+    # Optional dict to reuse the block layers and statistics across models of
+    # the same application, keyed by system and block key. Without it, the
+    # block of the last compile() is reused when the model is recompiled with
+    # the same system and block key.
+    self._block_cache = block_cache
+    self._cached_block = None
+    self._block_key = None
+    # Keys and statuses of the last evaluate() stages, see _kStages
+    self._stage_keys = {}
+
     # Set during compile
     self.exe = None
+    # Whether to log debug statistics, evaluate() never does
+    self._debug = False
 
     # Set during run
     self.sys = None
@@ -345,6 +541,13 @@ class Llm:
     self._tp_bw_overlap_req = None
     self._dp_bw_overlap_req_chunk = None
     self._dp_bw_overlap_req_tail = None
+    # Chunk times used by the DP timing, see _compute_data_par_stats()
+    self._chunk_fw_time = None
+    self._chunk_bw_time = None
+    self._chunk_bw_pp_time = None
+    self._chunk_dp_overlap_time = None
+    self._chunk_dp_compute_time = None
+    self._block_dp_compute_time = None
 
     self._block_weight_space = None
     self._block_act_working_space = None
@@ -1024,16 +1227,369 @@ class Llm:
       activation_stored=False,
       activation_reused=True))
 
+  def _estimate_block_mem_stats(self):
+    """
+    This function computes the per block memory statistics of
+    _compute_block_stats() in closed form, without building the layers. The
+    layer sizes are listed in the same order as _build_attn_block() and
+    _build_mlp_block(), their memory is given by the getters of the layer
+    classes and accumulated the same way, so the values match.
+    """
+    bpe = self._bytes_per_element
+    tp = self.exe.tensor_par
+    shard = pick(self.exe.optimizer_sharding, self.exe.data_par, 1)
+    rs_ag = self.exe.tensor_par_comm_type == 'rs_ag'
+    overlap = self.exe.tensor_par_overlap != 'none'
+    recompute_flag = self.exe.activation_recompute == "full"
+    recompute_attn_flag = self.exe.activation_recompute in \
+      ["full", "attn_only"]
+    attn_ag_flag = recompute_attn_flag or self.exe.seq_par_ag_redo
+    mlp_ag_flag = recompute_flag or self.exe.seq_par_ag_redo
+    act_size = self._activation_size
+    res_size = pick(self.exe._sequence_par, self._seq_par_activation_size,
+                    self._activation_size)
+    batch_seq = self._batch_seq
+    hidden = self.app.hidden
+    heads = self.app.attn_heads
+    attn_size = self.app.attn_size
+    seq_size = self.app.seq_size
+    mbs = self.exe.microbatch_size
+
+    # Each layer is described by the memory getters of its class, which read
+    # the sizes of the layer: (weight, activation, output, activation grad,
+    # weight grad, weight grad without sharding, optimizer, reuses
+    # activation, stores activation, stores output)
+    def layer(cls=Layer, weight_space=0, activation_space=0, output_size=0,
+              activation_grads=0, optim_space=0, reused=False, stored=True,
+              output_stored=True, **attrs):
+      sizes = types.SimpleNamespace(
+        weight_space=weight_space, weight_grads=weight_space,
+        activation_space=activation_space, output_size=output_size,
+        activation_grads=activation_grads, optim_space=optim_space,
+        bytes_per_element=bpe, optim_sharding_num_proc=shard, **attrs)
+      return (cls.get_weight(sizes), cls.get_activation(sizes),
+              cls.get_output(sizes), cls.get_activation_grad(sizes),
+              cls.get_weight_grad(sizes),
+              cls.get_weight_grad(sizes, sharded=False),
+              cls.get_optimizer(sizes), reused, stored, output_stored)
+
+    def fork(size, stored):
+      return layer(Fork, activation_space=size, stored=stored)
+
+    def layer_norm(size):
+      return layer(LayerNorm, 2*hidden, size, size, size, 2*2*hidden,
+                   stored=False, reused=True)
+
+    def linear(m, n, k, stored=True, reused=False):
+      return layer(Linear, n*k, m*n, m*k, m*k, 2*n*k, stored=stored,
+                   reused=reused)
+
+    def linear_overlapped(m, n, k, conjugate):
+      if rs_ag:
+        if not conjugate:
+          k = k // tp
+          act_space = m * n // tp
+          act_grad_space = m * k
+        else:
+          n = n // tp
+          act_space = m * n
+          act_grad_space = m * k // tp + m * k // tp
+      else:
+        if not conjugate:
+          k = k // tp
+          act_space = m * n
+          act_grad_space = 0
+        else:
+          n = n // tp
+          act_space = 0
+          act_grad_space = m * k + m * k
+      return layer(LinearOverlapped, n*k, act_space, m*k, act_grad_space,
+                   2*n*k)
+
+    def tp_comm(conjugate, stored=True):
+      size = pick(tp == 1, 0, act_size)
+      return layer(TPComm, activation_space=size, output_size=size,
+                   activation_grads=size, stored=stored, num_peers=tp,
+                   tensor_par_comm_type=self.exe.tensor_par_comm_type,
+                   conjugate=conjugate)
+
+    def batch_matmul(batch, m, n, k, output_stored=True):
+      return layer(BatchMatMul, activation_space=batch*(m*n+n*k),
+                   output_size=batch*m*k, activation_grads=batch*m*k,
+                   output_stored=output_stored)
+
+    def softmax(size, output_stored):
+      return layer(SoftMax, activation_space=size, output_size=size,
+                   activation_grads=size, output_stored=output_stored)
+
+    def dropout(size, stored=True):
+      return layer(DropOut, activation_space=size, output_size=size,
+                   activation_grads=size, stored=stored)
+
+    def residual(size):
+      return layer(ElementWise, activation_space=size+size,
+                   output_size=size, activation_grads=size, stored=False,
+                   reused=True)
+
+    # Attention block
+    qkv = heads * attn_size // tp
+    kv = pick(self.exe.attention_type == 'multihead', qkv, attn_size)
+    layers = [fork(res_size, True), layer_norm(res_size)]
+    if not overlap:
+      layers.append(tp_comm(False))
+      layers.append(fork(act_size, not attn_ag_flag))
+      layers.append(linear(batch_seq, hidden, qkv, False, True))
+      layers.append(linear(batch_seq, hidden, kv, False, True))
+      layers.append(linear(batch_seq, hidden, kv, False, True))
+    elif self.exe.attention_type == 'multihead':
+      layers.append(linear_overlapped(batch_seq, hidden,
+                                      heads * attn_size * 3, False))
+    else:
+      layers.append(linear_overlapped(batch_seq, hidden, heads * attn_size,
+                                      False))
+      layers.append(fork(act_size, not attn_ag_flag))
+      layers.append(linear(batch_seq, hidden, attn_size, False, True))
+      layers.append(linear(batch_seq, hidden, attn_size, False, True))
+    attn_batch = mbs * heads // tp
+    softmax_size = heads // tp * seq_size**2 * mbs
+    layers.append(batch_matmul(attn_batch, seq_size, attn_size, seq_size,
+                               not recompute_attn_flag))
+    layers.append(softmax(softmax_size, not recompute_attn_flag))
+    layers.append(dropout(softmax_size, not recompute_attn_flag))
+    layers.append(batch_matmul(attn_batch, seq_size, seq_size,
+                               heads * attn_size // heads))
+    if not overlap:
+      layers.append(linear(batch_seq, qkv, hidden))
+      layers.append(tp_comm(True, stored=False))
+    else:
+      layers.append(linear_overlapped(batch_seq, heads * attn_size, hidden,
+                                      True))
+    layers.append(dropout(res_size))
+    layers.append(residual(res_size))
+
+    # MLP block
+    layers.append(fork(res_size, True))
+    layers.append(layer_norm(res_size))
+    if not overlap:
+      layers.append(tp_comm(False))
+      layers.append(linear(batch_seq, hidden, self.app.feedforward // tp,
+                           not mlp_ag_flag))
+    else:
+      layers.append(linear_overlapped(batch_seq, hidden, self.app.feedforward,
+                                      False))
+    gelu_size = self.app.feedforward * batch_seq // tp
+    gelu_act = pick(self.exe.fused_activation, 0, gelu_size)
+    layers.append(layer(GeLU, activation_space=gelu_act,
+                        output_size=gelu_size, activation_grads=gelu_act))
+    if not overlap:
+      layers.append(linear(batch_seq, self.app.feedforward // tp, hidden))
+      layers.append(tp_comm(True, stored=False))
+    else:
+      layers.append(linear_overlapped(batch_seq, self.app.feedforward, hidden,
+                                      True))
+    layers.append(dropout(res_size))
+    layers.append(residual(res_size))
+
+    if self.exe.training and self.exe.activation_recompute == "full":
+      self._block_act_checkpoint_size = \
+        self._activation_size * self._bytes_per_element
+    else:
+      self._block_act_checkpoint_size = 0
+    self._block_weight_space = 0
+    self._block_act_working_space = 0
+    self._block_act_storage_space = 0
+    self._block_weight_grad_space = 0
+    self._block_weight_grad_space_no_sharding = 0
+    self._block_act_grad_space = 0
+    self._block_optimizer_space = 0
+    for (weight, activation, output, activation_grad, weight_grad,
+         weight_grad_no_sharding, optimizer, reused, stored,
+         output_stored) in layers:
+      self._block_weight_space += weight
+      if not reused:
+        self._block_act_working_space += activation
+      self._block_act_storage_space += activation
+      if self.exe.training:
+        if not output_stored:
+          self._block_act_storage_space -= output
+        if not stored:
+          self._block_act_storage_space -= activation
+        self._block_weight_grad_space += weight_grad
+        self._block_weight_grad_space_no_sharding += weight_grad_no_sharding
+        self._block_act_grad_space += activation_grad
+        self._block_optimizer_space += optimizer
+    if self.exe.activation_recompute == 'full':
+      self._block_act_storage_space = 0
+
   def compile(self, sys, exe):
     assert not self._compiled
     assert isinstance(exe, self.Execution)
     self.exe = exe
     assert isinstance(sys, System)
     self.sys = sys
+    self._debug = (self.log is not None and
+                   self.log.isEnabledFor(logging.DEBUG))
+    # The stages of evaluate() are all recomputed after compile() and run()
+    self._stage_keys = {}
     self._check_network_assignments()
 
     self.sys.set_datatype(self.exe.datatype)
+    self._raise_status(self._compile_sizes_status())
+
+    self._build_block()
+    self._compiled = True
+
+  def evaluate(self, sys, exe):
+    """
+    Fast alternative to recompile() and run() for searches. Returns a status
+    instead of raising Llm.Error, and skips the logging and the sanity checks.
+    The statistics equal the ones of run() when the status is kGood. The model
+    doesn't need a logger.
+
+    The model is evaluated in the stages of _kStages, and only the stages
+    whose fields changed since the previous evaluate() are recomputed. The
+    memory capacities are checked before building the block, from its closed
+    form memory statistics.
+    """
+    self.reset()
+    self.exe = exe
+    self.sys = sys
+    self._debug = False
+    self.sys.set_datatype(self.exe.datatype)
+    block_key = self._get_block_key()
+    for name, fields, block_fields in Llm._kStages:
+      key = (sys, None if fields is None else fields(exe),
+             block_key if block_fields else None)
+      last = self._stage_keys.get(name)
+      if last is not None and last[0] == key:
+        status = last[1]
+      else:
+        status = getattr(self, '_evaluate_' + name)()
+        self._stage_keys[name] = (key, status)
+      if status != Llm.kGood:
+        return status
+    self._compiled = True
+    self._executed = True
+    return Llm.kGood
+
+  def _evaluate_networks(self):
+    status, _ = self._assign_networks()
+    return status
+
+  def _evaluate_sizes(self):
+    return self._compile_sizes_status()
+
+  def _evaluate_block_mem(self):
+    # The closed form memory statistics are computed once per block key
+    self._lookup_block()
+    if self._cached_block['mem_stats'] is None:
+      self._estimate_block_mem_stats()
+      self._cached_block['mem_stats'] = {
+        name: getattr(self, name) for name in Llm._kBlockMemStats}
+    else:
+      for name, value in self._cached_block['mem_stats'].items():
+        setattr(self, name, value)
+    return Llm.kGood
+
+  def _evaluate_memory(self):
+    self._compute_mem_stats()
+    return self._get_mem_caps_status()
+
+  def _evaluate_block(self):
+    self._build_block()
+    self._run_block_stats()
+    return Llm.kGood
+
+  def _evaluate_batch(self):
+    self._compute_block_comm_sizes()
+    self._compute_batch_stats()
+    return Llm.kGood
+
+  def _evaluate_data_par(self):
+    self._compute_data_par_stats()
+    return Llm.kGood
+
+  def _lookup_block(self):
+    """
+    Sets the cached block of the system and block key, a new one without
+    layers nor statistics if the block cache doesn't have it. Without a block
+    cache, the layers of the same block key on another system are moved to
+    this system, see Layer.set_system().
+    """
+    block_key = (self.sys, self._get_block_key())
+    if self._block_cache is not None:
+      self._cached_block = self._block_cache.get(block_key)
+    elif (self._block_key is not None and
+          self._block_key[1] == block_key[1] and
+          self._cached_block['layers'] is not None and
+          self._block_key[0].num_networks == self.sys.num_networks):
+      if self._block_key[0] is not self.sys:
+        # The flops, sizes and memory statistics don't depend on the system
+        for layer in self._cached_block['layers']:
+          layer.set_system(self.sys)
+        self._cached_block = {'layers': self._cached_block['layers'],
+                              'stats': None,
+                              'mem_stats': self._cached_block['mem_stats']}
+    elif block_key != self._block_key:
+      self._cached_block = None
+    self._block_key = block_key
+    if self._cached_block is None:
+      self._cached_block = {'layers': None, 'stats': None, 'mem_stats': None}
+      if self._block_cache is not None:
+        self._block_cache[block_key] = self._cached_block
+
+  def _build_block(self):
+    """
+    Builds the block layers, or reuses the ones of the block cache.
+    """
+    self._lookup_block()
+    if self._cached_block['layers'] is not None:
+      self._llm_block = self._cached_block['layers']
+    else:
+      self._llm_block = []
+      self._build_attn_block()
+      self._build_mlp_block()
+      for layer in self._llm_block:
+        layer.set_bytes_per_element(self._bytes_per_element)
+        if self.exe.optimizer_sharding:
+          layer.shard_optimizer(self.exe.data_par)
+      self._cached_block['layers'] = self._llm_block
 
+  def reset(self):
+    """
+    Returns the model to its state before compile(), keeping its layers so
+    that compiling an execution with the same block key reuses them.
+    """
+    self._compiled = False
+    self._executed = False
+    self.exe = None
+    self.sys = None
+
+  def recompile(self, sys, exe):
+    """
+    Same as reset() then compile(), to search many executions with one model.
+    """
+    self.reset()
+    self.compile(sys, exe)
+
+  def _get_block_key(self):
+    """
+    Returns the execution values the block layers and statistics depend on.
+    """
+    return (self.exe.tensor_par, self.exe.tensor_par_net,
+            self.exe.microbatch_size, self.exe.datatype,
+            self.exe.fused_activation, self.exe.attention_type,
+            self.exe.activation_recompute, self.exe.tensor_par_comm_type,
+            self.exe.tensor_par_overlap, self.exe.seq_par_ag_redo,
+            self.exe.training,
+            pick(self.exe.optimizer_sharding, self.exe.data_par, None))
+
+  def _compile_sizes_status(self):
+    """
+    This function computes the block partitioning and activation sizes of the
+    execution. These only depend on the application and the execution. Returns
+    the status of the sizes, the computation stops at the first bad one.
+    """
     # If we have number of blocks not divisible by PP, we can allocate the
     # reminder of the blocks on the first num_block % PP Procs and block
     # "bubbles" on the last PP - (num_block % PP) Procs. To reflect that,
@@ -1047,19 +1603,16 @@ class Llm:
     else:
       self._bubble_reduction_blocks = 0
     if self.exe.pipeline_interleaving > self._blocks_per_proc:
-      raise self.Error('Pipeline interleaving must be less than or equal to '
-                       'the number of blocks per processor')
+      return Llm.kBadInterleavingSize
     if self._blocks_per_proc % self.exe.pipeline_interleaving != 0:
-      raise self.Error('Pipeline interleaving must be a factor value of the '
-                       'number of blocks per processor')
+      return Llm.kBadInterleavingFactor
     self._bytes_per_element = System.TypeSizes[self.exe.datatype]
 
     # Checks that enough blocks per processor exist if offloading is being
     # performed
     if (self.exe.weight_offload or self.exe.activations_offload or
         self.exe.optimizer_offload) and (self._blocks_per_proc <= 2):
-      raise self.Error('Offloading requires each processor to handle at least'
-                       ' 3 blocks')
+      return Llm.kBadOffload
 
     # A chunk is a set of blocks for microbatch before passing to the next
     # processor in the pipeline. Each chunk is modeled as a base
@@ -1075,7 +1628,6 @@ class Llm:
     self._baseblocks_per_chunk = self._blocks_per_chunk - 1
     self._edgeblocks_per_chunk = 1
 
-    # Build model during the compilation step
     self._batch_seq = self.exe.microbatch_size * self.app.seq_size
     self._activation_size = self._batch_seq * self.app.hidden
     self._batch_seq_par = self._batch_seq // self.exe.tensor_par
@@ -1084,15 +1636,31 @@ class Llm:
         f"We should split batch_seq={self._batch_seq} between"
         f" {self.exe.tensor_par} TP partitions evenly")
     self._seq_par_activation_size = self._batch_seq_par * self.app.hidden
-    self._build_attn_block()
-    self._build_mlp_block()
-    for layer in self._llm_block:
-      layer.set_bytes_per_element(self._bytes_per_element)
-      if self.exe.optimizer_sharding:
-        layer.shard_optimizer(self.exe.data_par)
-    self._compiled = True
+    return Llm.kGood
+
+  def _raise_status(self, status):
+    """
+    Raises the Llm.Error of a bad status, with its detailed message.
+    """
+    if status in (Llm.kBadNetworkSize, Llm.kBadNetworkFill):
+      self._check_network_assignments()
+    elif status in (Llm.kBadMemTier1, Llm.kBadMemTier2):
+      self._check_mem_caps()
+    elif status != Llm.kGood:
+      raise self.Error(Llm.kStatusMessages[status])
 
   def _check_network_assignments(self):
+    status, tier = self._assign_networks()
+    if status == Llm.kBadNetworkSize:
+      raise self.Error(f'Network tier{tier} isn\'t big enough')
+    if status == Llm.kBadNetworkFill:
+      raise self.Error(f'Network tier{tier} isn\'t fully used')
+
+  def _assign_networks(self):
+    """
+    Sets the networks of the parallelisms. Returns the status of the network
+    assignments and the network tier it applies to.
+    """
     used = [False] * self.sys.num_networks
     size = [1] * self.sys.num_networks
 
@@ -1119,10 +1687,11 @@ class Llm:
         used, size, range(self.sys.num_networks)):
       if tier_used:
         if tier_size > self.sys.get_network(tier).size:
-          raise self.Error(f'Network tier{tier} isn\'t big enough')
+          return Llm.kBadNetworkSize, tier
         if (self.sys.get_network(tier).must_be_filled and
             self.sys.get_network(tier).size % tier_size != 0):
-          raise self.Error(f'Network tier{tier} isn\'t fully used')
+          return Llm.kBadNetworkFill, tier
+    return Llm.kGood, None
 
   def _compute_block_stats(self):
     """
@@ -1131,6 +1700,13 @@ class Llm:
     tensor and pipeline parallelism cause different communication operations to
     occur at the full batch level, the communication times are computed later.
     """
+    if not self._debug:
+      # Same statistics as the layer loop below, with code generated for the
+      # structure of the block
+      self._set_block_stats(BlockFunction.get(
+        self._llm_block, self.exe.training)(self._llm_block))
+      return
+
     if self.exe.training and self.exe.activation_recompute == "full":
       self._block_act_checkpoint_size = \
         self._activation_size * self._bytes_per_element
@@ -1283,132 +1859,141 @@ class Llm:
         self._block_act_grad_space += layer.get_activation_grad()
         self._block_optimizer_space += layer.get_optimizer()
 
-      self.log.debug("%s %s %s", layer.name, 'Recompute flag:',
-                     str(layer.get_recompute_flag()))
-      self.log.debug("%s %s %s", layer.name, 'Recomm flag:',
-                     str(layer.get_recomm_flag()))
-      self.log.debug("%s %s %s", layer.name, 'Stores activation:',
-                     str(layer.stores_activation()))
-      self.log.debug("%s %s %s", layer.name, 'Reuses activation:',
-                     str(layer.reuses_activation()))
-      self.log.debug("%s %s %s", layer.name, 'Stores output:',
-                     str(layer.stores_output()))
-      self.log.debug("%s %s %s", layer.name, 'FW flops:',
-                     human_format(layer.get_fw_flops(), 'flops'))
-      self.log.debug("%s %s %s", layer.name, 'FW num inputs:',
-                     human_format(layer.inputs_size, 'base2'))
-      self.log.debug("%s %s %s", layer.name, 'FW num output:',
-                     human_format(layer.output_size, 'base2'))
-      self.log.debug("%s %s %s", layer.name, 'FW num weights:',
-                     human_format(layer.weight_space, 'base2'))
-      self.log.debug("%s %s %s", layer.name, 'FW mem:',
-                     human_format(layer.get_fw_mem_accessed(), 'bytes'))
-      self.log.debug("%s %s %s", layer.name, 'FW baseblock comm tile size:',
-                     human_format(layer.get_comm_tile("fw", baseblock=True),
-                     'bytes'))
-      self.log.debug("%s %s %s", layer.name, 'FW edgeblock comm tile size:',
-                     human_format(layer.get_comm_tile("fw", baseblock=False),
-                     'bytes'))
-      self.log.debug("%s %s %s", layer.name, 'FW baseblock comm size:',
-                     human_format(layer.get_comm_bytes("fw", baseblock=True),
-                     'bytes'))
-      self.log.debug("%s %s %s", layer.name, 'FW edgeblock comm size:',
-                     human_format(layer.get_comm_bytes("fw", baseblock=False),
-                     'bytes'))
-      self.log.debug("%s %s %.3e", layer.name, 'FW net link time:',
-                     layer.compute_net_time("fw"))
-      self.log.debug("%s %s %.3e", layer.name, 'FW net exposed time:',
-                     layer.get_exposed_net_time("fw"))
-      self.log.debug("%s %s %.3e", layer.name, 'FW time:',
-                     layer.compute_processing_time("fw"))
-      self.log.debug("%s %s %s", layer.name, 'BW flops:',
-                     human_format(
-                      layer.get_agrad_flops() + layer.get_wgrad_flops(),
-                      'flops'))
-      self.log.debug("%s %s %s", layer.name, 'BW num Wgrads:',
-                     human_format(layer.weight_grads, 'base2'))
-      self.log.debug("%s %s %s", layer.name, 'BW num Agrads:',
-                     human_format(layer.activation_grads, 'base2'))
-      self.log.debug("%s %s %s", layer.name, 'BW num Igrads:',
-                     human_format(layer.inputs_size, 'base2'))
-      self.log.debug("%s %s %s", layer.name, 'BW mem:',
-                     human_format(
-                      layer.get_agrad_mem_accessed() +
-                      layer.get_wgrad_mem_accessed(), 'bytes'))
-      self.log.debug("%s %s %s", layer.name, 'BW baseblock comm tile size:',
-                     human_format(layer.get_comm_tile("agrad", baseblock=True),
-                     'bytes'))
-      self.log.debug("%s %s %s", layer.name, 'BW edgeblock comm tile size:',
-                     human_format(layer.get_comm_tile("agrad", baseblock=False),
-                     'bytes'))
-      self.log.debug("%s %s %s", layer.name, 'BW baseblock comm size:',
-                     human_format(layer.get_comm_bytes("agrad", baseblock=True),
-                     'bytes'))
-      self.log.debug("%s %s %s", layer.name, 'BW edgeblock comm size:',
-                     human_format(layer.get_comm_bytes("agrad", baseblock=False),
-                     'bytes'))
-      self.log.debug("%s %s %.3e", layer.name, 'BW net link time:',
-                     layer.compute_net_time("agrad"))
-      self.log.debug("%s %s %.3e", layer.name, 'BW net exposed time:',
-                     layer.get_exposed_net_time("agrad"))
-      self.log.debug("%s %s %.3e", layer.name, 'BW time:',
-                     layer.compute_processing_time("agrad") +
-                     layer.compute_processing_time("wgrad"))
-      self.log.debug("%s %s %s", layer.name, 'Recomm baseblock comm tile size:',
-                     human_format(layer.get_comm_tile("wgrad", baseblock=True),
-                     'bytes'))
-      self.log.debug("%s %s %s", layer.name, 'Recomm edgeblock comm tile size:',
-                     human_format(layer.get_comm_tile("wgrad", baseblock=False),
-                     'bytes'))
-      self.log.debug("%s %s %s", layer.name, 'Recomm baseblock comm size:',
-                     human_format(layer.get_comm_bytes("wgrad", baseblock=True),
-                     'bytes'))
-      self.log.debug("%s %s %s", layer.name, 'Recomm edgeblock comm size:',
-                     human_format(layer.get_comm_bytes("wgrad", baseblock=False),
-                     'bytes'))
-      self.log.debug("%s %s %.3e", layer.name, 'Recomm net link time:',
-                     layer.compute_net_time("wgrad"))
-      self.log.debug("%s %s %.3e", layer.name, 'Recomm net exposed time:',
-                     layer.get_exposed_net_time("wgrad"))
-      self.log.debug("%s %s %s", layer.name, 'Optim flops:',
-                     human_format(layer.get_optim_step_flops(), 'flops'))
-      self.log.debug("%s %s %s", layer.name, 'BW Optimizer size:',
-                     human_format(layer.get_optimizer(), 'bytes'))
-      self.log.debug("%s %s %s", layer.name, 'Optim mem:',
-                     human_format(layer.get_optim_step_mem_accessed(), 'bytes'))
-      self.log.debug("%s %s %.3e", layer.name, 'Optim time:',
-                     layer.compute_processing_time("optim"))
-      self.log.debug("%s %s %.3e", layer.name, 'Recompute:',
-                     layer.get_recompute_flag())
-      self.log.debug("%s %s %s", layer.name, 'Recompute mem saving:',
-                     human_format(layer.stores_output() * \
-                       layer.get_output(), 'bytes'))
-      self.log.debug("%s %s %s", layer.name, 'Weight:',
-                     human_format(layer.get_weight(), 'bytes'))
-      self.log.debug("%s %s %s", layer.name, 'Act:',
-                     human_format(layer.get_activation(), 'bytes'))
-      self.log.debug("%s %s %s", layer.name, 'Weight grad:',
-                     human_format(layer.get_weight_grad(), 'bytes'))
-      self.log.debug("%s %s %s", layer.name, 'Act grad:',
-                     human_format(layer.get_activation_grad(), 'bytes'))
-      self.log.debug("%s %s %s", layer.name, 'Optim:',
-                     human_format(layer.get_optimizer(), 'bytes'))
-      self.log.debug("%s %s %s", layer.name, 'Incremental Weight:',
-                     human_format(self._block_weight_space, 'bytes'))
-      self.log.debug("%s %s %s", layer.name, 'Incremental Act Working space:',
-                     human_format(self._block_act_working_space, 'bytes'))
-      self.log.debug("%s %s %s", layer.name, 'Incremental Act Storage space:',
-                     human_format(self._block_act_storage_space, 'bytes'))
-      self.log.debug("%s %s %s", layer.name, 'Incremental Weight grad:',
-                     human_format(self._block_weight_grad_space, 'bytes'))
-      self.log.debug("%s %s %s", layer.name, 'Incremental Act grad:',
-                     human_format(self._block_act_grad_space, 'bytes'))
-      self.log.debug("%s %s %s", layer.name, 'Incremental Optim:',
-                     human_format(self._block_optimizer_space, 'bytes'))
+      if self._debug:
+        self._log_layer_stats(layer)
       prev_layer_recompute = layer.get_recompute_flag()
     if self.exe.activation_recompute == 'full':
       self._block_act_storage_space = 0
 
+  def _log_layer_stats(self, layer):
+    """
+    Logs the statistics of a block layer, with the block totals accumulated
+    so far. Only called when debug logging is enabled.
+    """
+    self.log.debug("%s %s %s", layer.name, 'Recompute flag:',
+                   str(layer.get_recompute_flag()))
+    self.log.debug("%s %s %s", layer.name, 'Recomm flag:',
+                   str(layer.get_recomm_flag()))
+    self.log.debug("%s %s %s", layer.name, 'Stores activation:',
+                   str(layer.stores_activation()))
+    self.log.debug("%s %s %s", layer.name, 'Reuses activation:',
+                   str(layer.reuses_activation()))
+    self.log.debug("%s %s %s", layer.name, 'Stores output:',
+                   str(layer.stores_output()))
+    self.log.debug("%s %s %s", layer.name, 'FW flops:',
+                   human_format(layer.get_fw_flops(), 'flops'))
+    self.log.debug("%s %s %s", layer.name, 'FW num inputs:',
+                   human_format(layer.inputs_size, 'base2'))
+    self.log.debug("%s %s %s", layer.name, 'FW num output:',
+                   human_format(layer.output_size, 'base2'))
+    self.log.debug("%s %s %s", layer.name, 'FW num weights:',
+                   human_format(layer.weight_space, 'base2'))
+    self.log.debug("%s %s %s", layer.name, 'FW mem:',
+                   human_format(layer.get_fw_mem_accessed(), 'bytes'))
+    self.log.debug("%s %s %s", layer.name, 'FW baseblock comm tile size:',
+                   human_format(layer.get_comm_tile("fw", baseblock=True),
+                   'bytes'))
+    self.log.debug("%s %s %s", layer.name, 'FW edgeblock comm tile size:',
+                   human_format(layer.get_comm_tile("fw", baseblock=False),
+                   'bytes'))
+    self.log.debug("%s %s %s", layer.name, 'FW baseblock comm size:',
+                   human_format(layer.get_comm_bytes("fw", baseblock=True),
+                   'bytes'))
+    self.log.debug("%s %s %s", layer.name, 'FW edgeblock comm size:',
+                   human_format(layer.get_comm_bytes("fw", baseblock=False),
+                   'bytes'))
+    self.log.debug("%s %s %.3e", layer.name, 'FW net link time:',
+                   layer.compute_net_time("fw"))
+    self.log.debug("%s %s %.3e", layer.name, 'FW net exposed time:',
+                   layer.get_exposed_net_time("fw"))
+    self.log.debug("%s %s %.3e", layer.name, 'FW time:',
+                   layer.compute_processing_time("fw"))
+    self.log.debug("%s %s %s", layer.name, 'BW flops:',
+                   human_format(
+                    layer.get_agrad_flops() + layer.get_wgrad_flops(),
+                    'flops'))
+    self.log.debug("%s %s %s", layer.name, 'BW num Wgrads:',
+                   human_format(layer.weight_grads, 'base2'))
+    self.log.debug("%s %s %s", layer.name, 'BW num Agrads:',
+                   human_format(layer.activation_grads, 'base2'))
+    self.log.debug("%s %s %s", layer.name, 'BW num Igrads:',
+                   human_format(layer.inputs_size, 'base2'))
+    self.log.debug("%s %s %s", layer.name, 'BW mem:',
+                   human_format(
+                    layer.get_agrad_mem_accessed() +
+                    layer.get_wgrad_mem_accessed(), 'bytes'))
+    self.log.debug("%s %s %s", layer.name, 'BW baseblock comm tile size:',
+                   human_format(layer.get_comm_tile("agrad", baseblock=True),
+                   'bytes'))
+    self.log.debug("%s %s %s", layer.name, 'BW edgeblock comm tile size:',
+                   human_format(layer.get_comm_tile("agrad", baseblock=False),
+                   'bytes'))
+    self.log.debug("%s %s %s", layer.name, 'BW baseblock comm size:',
+                   human_format(layer.get_comm_bytes("agrad", baseblock=True),
+                   'bytes'))
+    self.log.debug("%s %s %s", layer.name, 'BW edgeblock comm size:',
+                   human_format(layer.get_comm_bytes("agrad", baseblock=False),
+                   'bytes'))
+    self.log.debug("%s %s %.3e", layer.name, 'BW net link time:',
+                   layer.compute_net_time("agrad"))
+    self.log.debug("%s %s %.3e", layer.name, 'BW net exposed time:',
+                   layer.get_exposed_net_time("agrad"))
+    self.log.debug("%s %s %.3e", layer.name, 'BW time:',
+                   layer.compute_processing_time("agrad") +
+                   layer.compute_processing_time("wgrad"))
+    self.log.debug("%s %s %s", layer.name, 'Recomm baseblock comm tile size:',
+                   human_format(layer.get_comm_tile("wgrad", baseblock=True),
+                   'bytes'))
+    self.log.debug("%s %s %s", layer.name, 'Recomm edgeblock comm tile size:',
+                   human_format(layer.get_comm_tile("wgrad", baseblock=False),
+                   'bytes'))
+    self.log.debug("%s %s %s", layer.name, 'Recomm baseblock comm size:',
+                   human_format(layer.get_comm_bytes("wgrad", baseblock=True),
+                   'bytes'))
+    self.log.debug("%s %s %s", layer.name, 'Recomm edgeblock comm size:',
+                   human_format(layer.get_comm_bytes("wgrad", baseblock=False),
+                   'bytes'))
+    self.log.debug("%s %s %.3e", layer.name, 'Recomm net link time:',
+                   layer.compute_net_time("wgrad"))
+    self.log.debug("%s %s %.3e", layer.name, 'Recomm net exposed time:',
+                   layer.get_exposed_net_time("wgrad"))
+    self.log.debug("%s %s %s", layer.name, 'Optim flops:',
+                   human_format(layer.get_optim_step_flops(), 'flops'))
+    self.log.debug("%s %s %s", layer.name, 'BW Optimizer size:',
+                   human_format(layer.get_optimizer(), 'bytes'))
+    self.log.debug("%s %s %s", layer.name, 'Optim mem:',
+                   human_format(layer.get_optim_step_mem_accessed(), 'bytes'))
+    self.log.debug("%s %s %.3e", layer.name, 'Optim time:',
+                   layer.compute_processing_time("optim"))
+    self.log.debug("%s %s %.3e", layer.name, 'Recompute:',
+                   layer.get_recompute_flag())
+    self.log.debug("%s %s %s", layer.name, 'Recompute mem saving:',
+                   human_format(layer.stores_output() * \
+                     layer.get_output(), 'bytes'))
+    self.log.debug("%s %s %s", layer.name, 'Weight:',
+                   human_format(layer.get_weight(), 'bytes'))
+    self.log.debug("%s %s %s", layer.name, 'Act:',
+                   human_format(layer.get_activation(), 'bytes'))
+    self.log.debug("%s %s %s", layer.name, 'Weight grad:',
+                   human_format(layer.get_weight_grad(), 'bytes'))
+    self.log.debug("%s %s %s", layer.name, 'Act grad:',
+                   human_format(layer.get_activation_grad(), 'bytes'))
+    self.log.debug("%s %s %s", layer.name, 'Optim:',
+                   human_format(layer.get_optimizer(), 'bytes'))
+    self.log.debug("%s %s %s", layer.name, 'Incremental Weight:',
+                   human_format(self._block_weight_space, 'bytes'))
+    self.log.debug("%s %s %s", layer.name, 'Incremental Act Working space:',
+                   human_format(self._block_act_working_space, 'bytes'))
+    self.log.debug("%s %s %s", layer.name, 'Incremental Act Storage space:',
+                   human_format(self._block_act_storage_space, 'bytes'))
+    self.log.debug("%s %s %s", layer.name, 'Incremental Weight grad:',
+                   human_format(self._block_weight_grad_space, 'bytes'))
+    self.log.debug("%s %s %s", layer.name, 'Incremental Act grad:',
+                   human_format(self._block_act_grad_space, 'bytes'))
+    self.log.debug("%s %s %s", layer.name, 'Incremental Optim:',
+                   human_format(self._block_optimizer_space, 'bytes'))
+
+  def _compute_block_comm_sizes(self):
     # Sets the PP communication operation size
     if self.exe.pipeline_par > 1:
       if self.exe._pipeline_par_rs_ag:
@@ -1426,24 +2011,25 @@ class Llm:
     else:
       self._block_bw_pp_size = 0
 
-    self.log.debug("%s %s", 'TP comm FW baseblock size:',
-                   human_format(self._baseblock_fw_tp_size, 'bytes'))
-    self.log.debug("%s %s", 'TP comm FW edgeblock size:',
-                   human_format(self._edgeblock_fw_tp_size, 'bytes'))
-    self.log.debug("%s %s", 'PP comm FW size:',
-                   human_format(self._block_fw_pp_size, 'bytes'))
-    self.log.debug("%s %s", 'TP comm BW baseblock size:',
-                   human_format(self._baseblock_agrad_tp_size, 'bytes'))
-    self.log.debug("%s %s", 'TP comm BW edgeblock size:',
-                   human_format(self._edgeblock_agrad_tp_size, 'bytes'))
-    self.log.debug("%s %s", 'PP comm BW size:',
-                   human_format(self._block_bw_pp_size, 'bytes'))
-    self.log.debug("%s %s", 'TP recomm baseblock size:',
-                   human_format(self._baseblock_recomm_size, 'bytes'))
-    self.log.debug("%s %s", 'TP recomm edgeblock size:',
-                   human_format(self._edgeblock_recomm_size, 'bytes'))
-    self.log.debug("%s %s", 'TP comm required bandwidth for tiled overlap:',
-                   human_format(self._tp_bw_overlap_req, 'bandwidth'))
+    if self._debug:
+      self.log.debug("%s %s", 'TP comm FW baseblock size:',
+                     human_format(self._baseblock_fw_tp_size, 'bytes'))
+      self.log.debug("%s %s", 'TP comm FW edgeblock size:',
+                     human_format(self._edgeblock_fw_tp_size, 'bytes'))
+      self.log.debug("%s %s", 'PP comm FW size:',
+                     human_format(self._block_fw_pp_size, 'bytes'))
+      self.log.debug("%s %s", 'TP comm BW baseblock size:',
+                     human_format(self._baseblock_agrad_tp_size, 'bytes'))
+      self.log.debug("%s %s", 'TP comm BW edgeblock size:',
+                     human_format(self._edgeblock_agrad_tp_size, 'bytes'))
+      self.log.debug("%s %s", 'PP comm BW size:',
+                     human_format(self._block_bw_pp_size, 'bytes'))
+      self.log.debug("%s %s", 'TP recomm baseblock size:',
+                     human_format(self._baseblock_recomm_size, 'bytes'))
+      self.log.debug("%s %s", 'TP recomm edgeblock size:',
+                     human_format(self._edgeblock_recomm_size, 'bytes'))
+      self.log.debug("%s %s", 'TP comm required bandwidth for tiled overlap:',
+                     human_format(self._tp_bw_overlap_req, 'bandwidth'))
 
   def _compute_batch_stats(self):
     """
@@ -1532,31 +2118,33 @@ class Llm:
     self._pp_comm_time_link = pp_fw_comm_time + pp_bw_comm_time
     self._pp_comm_time_exposed = self._pp_comm_time_link
 
-    self.log.debug("%s %s", 'TP comm baseblock FW time:',
-      self._baseblock_fw_tp_time)
-    self.log.debug("%s %s", 'TP comm edgeblock FW time:',
-      self._edgeblock_fw_tp_time)
-    self.log.debug("%s %s", 'TP comm FW time:', tp_fw_comm_time)
-    self.log.debug("%s %s", 'TP comm baseblock FW exposed time:',
-      self._baseblock_fw_tp_time_exposed)
-    self.log.debug("%s %s", 'TP comm edgeblock FW exposed time:',
-      self._edgeblock_fw_tp_time_exposed)
-    self.log.debug("%s %s", 'TP comm FW exposed time:', tp_fw_comm_time_exposed)
-    self.log.debug("%s %s", 'TP comm baseblock BW time:',
-      self._baseblock_agrad_tp_time)
-    self.log.debug("%s %s", 'TP comm edgeblock BW time:',
-      self._edgeblock_agrad_tp_time)
-    self.log.debug("%s %s", 'TP comm BW time:', tp_bw_comm_time)
-    self.log.debug("%s %s", 'TP comm baseblock BW exposed time:',
-      self._baseblock_agrad_tp_time_exposed)
-    self.log.debug("%s %s", 'TP comm edgeblock BW exposed time:',
-      self._edgeblock_agrad_tp_time_exposed)
-    self.log.debug("%s %s", 'TP comm BW exposed time:',
-      tp_bw_comm_time_exposed)
-    self.log.debug("%s %s", 'PP comm chunk FW time:', chunk_fw_pp_time)
-    self.log.debug("%s %s", 'PP comm chunk BW time:', chunk_bw_pp_time)
-    self.log.debug("%s %s", 'PP comm FW time:', pp_fw_comm_time)
-    self.log.debug("%s %s", 'PP comm BW time:', pp_bw_comm_time)
+    if self._debug:
+      self.log.debug("%s %s", 'TP comm baseblock FW time:',
+        self._baseblock_fw_tp_time)
+      self.log.debug("%s %s", 'TP comm edgeblock FW time:',
+        self._edgeblock_fw_tp_time)
+      self.log.debug("%s %s", 'TP comm FW time:', tp_fw_comm_time)
+      self.log.debug("%s %s", 'TP comm baseblock FW exposed time:',
+        self._baseblock_fw_tp_time_exposed)
+      self.log.debug("%s %s", 'TP comm edgeblock FW exposed time:',
+        self._edgeblock_fw_tp_time_exposed)
+      self.log.debug("%s %s", 'TP comm FW exposed time:',
+        tp_fw_comm_time_exposed)
+      self.log.debug("%s %s", 'TP comm baseblock BW time:',
+        self._baseblock_agrad_tp_time)
+      self.log.debug("%s %s", 'TP comm edgeblock BW time:',
+        self._edgeblock_agrad_tp_time)
+      self.log.debug("%s %s", 'TP comm BW time:', tp_bw_comm_time)
+      self.log.debug("%s %s", 'TP comm baseblock BW exposed time:',
+        self._baseblock_agrad_tp_time_exposed)
+      self.log.debug("%s %s", 'TP comm edgeblock BW exposed time:',
+        self._edgeblock_agrad_tp_time_exposed)
+      self.log.debug("%s %s", 'TP comm BW exposed time:',
+        tp_bw_comm_time_exposed)
+      self.log.debug("%s %s", 'PP comm chunk FW time:', chunk_fw_pp_time)
+      self.log.debug("%s %s", 'PP comm chunk BW time:', chunk_bw_pp_time)
+      self.log.debug("%s %s", 'PP comm FW time:', pp_fw_comm_time)
+      self.log.debug("%s %s", 'PP comm BW time:', pp_bw_comm_time)
 
     # Bubble forms between i-th microbatch FW and BW passes on the 1st GPU.
     # With no interleaving between blocks, it includes
@@ -1668,30 +2256,42 @@ class Llm:
     self._bubble_time = chunks_in_bubble * chunk_time + (
       extra_interleaving_bubbles * chunk_time - bubble_reduction_time)
 
-    self.log.debug("%s %s", 'Block FW time:', self._block_fw_time)
-    self.log.debug("%s %s", 'Baseblock FW time:', self._baseblock_fw_time)
-    self.log.debug("%s %s", 'With FW offload overhead time:',
-      self._baseblock_fw_offload_overhead)
-    self.log.debug("%s %s", 'Edgeblock FW time:', self._edgeblock_fw_time)
-    self.log.debug("%s %s", 'With FW offload overhead time:',
-      self._edgeblock_fw_offload_overhead)
-    self.log.debug("%s %s", 'Baseblock REcomm exposed time:',
-      self._baseblock_recomm_time_exposed)
-    self.log.debug("%s %s", 'Edgeblock REcomm exposed time:',
-      self._edgeblock_recomm_time_exposed)
-    self.log.debug("%s %s", 'Block RE time:', self._block_re_time)
-    self.log.debug("%s %s", 'Block BW Agrad time:', self._block_agrad_time)
-    self.log.debug("%s %s", 'Block BW Wgrad time:', self._block_wgrad_time)
-    self.log.debug("%s %s", 'Block optim time:', self._block_optim_time)
-    self.log.debug("%s %s", 'Baseblock BW time:', self._baseblock_bw_time)
-    self.log.debug("%s %s", 'With BW offload overhead time:',
-      self._baseblock_bw_offload_overhead)
-    self.log.debug("%s %s", 'Edgeblock BW time:', self._edgeblock_bw_time)
-    self.log.debug("%s %s", 'With BW offload overhead time:',
-      self._edgeblock_bw_offload_overhead)
-
-    # Determines how long it takes to perform the DP per block
-    # This assumes no DP communication overlap (will be adjusted later).
+    if self._debug:
+      self.log.debug("%s %s", 'Block FW time:', self._block_fw_time)
+      self.log.debug("%s %s", 'Baseblock FW time:', self._baseblock_fw_time)
+      self.log.debug("%s %s", 'With FW offload overhead time:',
+        self._baseblock_fw_offload_overhead)
+      self.log.debug("%s %s", 'Edgeblock FW time:', self._edgeblock_fw_time)
+      self.log.debug("%s %s", 'With FW offload overhead time:',
+        self._edgeblock_fw_offload_overhead)
+      self.log.debug("%s %s", 'Baseblock REcomm exposed time:',
+        self._baseblock_recomm_time_exposed)
+      self.log.debug("%s %s", 'Edgeblock REcomm exposed time:',
+        self._edgeblock_recomm_time_exposed)
+      self.log.debug("%s %s", 'Block RE time:', self._block_re_time)
+      self.log.debug("%s %s", 'Block BW Agrad time:', self._block_agrad_time)
+      self.log.debug("%s %s", 'Block BW Wgrad time:', self._block_wgrad_time)
+      self.log.debug("%s %s", 'Block optim time:', self._block_optim_time)
+      self.log.debug("%s %s", 'Baseblock BW time:', self._baseblock_bw_time)
+      self.log.debug("%s %s", 'With BW offload overhead time:',
+        self._baseblock_bw_offload_overhead)
+      self.log.debug("%s %s", 'Edgeblock BW time:', self._edgeblock_bw_time)
+      self.log.debug("%s %s", 'With BW offload overhead time:',
+        self._edgeblock_bw_offload_overhead)
+
+    # Used by the DP timing, see _compute_data_par_stats()
+    self._chunk_fw_time = chunk_fw_time
+    self._chunk_bw_time = chunk_bw_time
+    self._chunk_bw_pp_time = chunk_bw_pp_time
+    self._chunk_dp_overlap_time = chunk_dp_overlap_time
+    self._chunk_dp_compute_time = chunk_dp_compute_time
+    self._block_dp_compute_time = block_dp_compute_time
+
+  def _compute_block_dp_time(self):
+    """
+    Determines how long it takes to perform the DP per block. This assumes no
+    DP communication overlap (will be adjusted later).
+    """
     if self.exe.data_par > 1 and self.exe.training:
       self._block_dp_size = self._block_weight_space
       if self.exe.optimizer_sharding:
@@ -1710,10 +2310,25 @@ class Llm:
     else:
       self._block_dp_size = 0
       self._block_dp_time = 0
-    self.log.debug('DP block comm size: %s',
-                   human_format(self._block_dp_size, 'bytes'))
-    self.log.debug('DP block comm time (no overlap): %.3e',
-                   self._block_dp_time)
+
+  def _compute_data_par_stats(self):
+    """
+    This function computes the DP communication times for a full batch, using
+    the chunk times of _compute_batch_stats().
+    """
+    chunk_fw_time = self._chunk_fw_time
+    chunk_bw_time = self._chunk_bw_time
+    chunk_bw_pp_time = self._chunk_bw_pp_time
+    chunk_dp_overlap_time = self._chunk_dp_overlap_time
+    chunk_dp_compute_time = self._chunk_dp_compute_time
+    block_dp_compute_time = self._block_dp_compute_time
+
+    self._compute_block_dp_time()
+    if self._debug:
+      self.log.debug('DP block comm size: %s',
+                     human_format(self._block_dp_size, 'bytes'))
+      self.log.debug('DP block comm time (no overlap): %.3e',
+                     self._block_dp_time)
 
     # DP overlap happens if DP time for a previous block(s) is lower than
     # microbatch BW pass time for next pack of consecutive blocks
@@ -1831,13 +2446,15 @@ class Llm:
           self._dp_bw_overlap_req_tail = 0
         self._dp_comm_time_exposed = self._block_dp_time + exposed_time
         self._dp_comm_time_link = self._blocks_per_proc * self._block_dp_time
-        self.log.debug('Blocks per chunk: %d', self._blocks_per_chunk)
-        self.log.debug('Num overlappable chunks: %d', num_overlappable_chunks)
-        self.log.debug('Last chunk size: %d', last_chunk_overlap_size)
-        self.log.debug('Chunk exposed time: %.3e', max(0, \
-          chunk_dp_time + num_overlapped_pp * chunk_bw_pp_time - \
-          overlap_window))
-        self.log.debug('Last chunk exposed time: %.3e', last_chunk_exposed_time)
+        if self._debug:
+          self.log.debug('Blocks per chunk: %d', self._blocks_per_chunk)
+          self.log.debug('Num overlappable chunks: %d', num_overlappable_chunks)
+          self.log.debug('Last chunk size: %d', last_chunk_overlap_size)
+          self.log.debug('Chunk exposed time: %.3e', max(0, \
+            chunk_dp_time + num_overlapped_pp * chunk_bw_pp_time - \
+            overlap_window))
+          self.log.debug('Last chunk exposed time: %.3e',
+                         last_chunk_exposed_time)
       else:
         self._dp_comm_time_exposed = self._blocks_per_proc * self._block_dp_time
         self._dp_comm_time_link = self._dp_comm_time_exposed
@@ -1848,18 +2465,24 @@ class Llm:
       self._dp_comm_time_link = 0
       self._dp_bw_overlap_req_chunk = 0
       self._dp_bw_overlap_req_tail = 0
-    self.log.debug('Chunk FW time: %.3e', chunk_fw_time)
-    self.log.debug('Chunk BW time: %.3e', chunk_bw_time)
-    self.log.debug('Chunk BW time for DP overlap: %.3e', chunk_dp_overlap_time)
-    self.log.debug('DP comm time exposed: %.3e', self._dp_comm_time_exposed)
-    self.log.debug('DP comm time on the link: %.3e',
-                   self._dp_comm_time_link)
-    self.log.debug('DP comm required bandwidth for overlapped chunks: %s',
-                   human_format(self._dp_bw_overlap_req_chunk, "bandwidth"))
-    self.log.debug('DP comm required bandwidth for the last chunk: %s',
-                   human_format(self._dp_bw_overlap_req_tail, "bandwidth"))
-
-    # memory capacity stats
+    if self._debug:
+      self.log.debug('Chunk FW time: %.3e', chunk_fw_time)
+      self.log.debug('Chunk BW time: %.3e', chunk_bw_time)
+      self.log.debug('Chunk BW time for DP overlap: %.3e',
+                     chunk_dp_overlap_time)
+      self.log.debug('DP comm time exposed: %.3e', self._dp_comm_time_exposed)
+      self.log.debug('DP comm time on the link: %.3e',
+                     self._dp_comm_time_link)
+      self.log.debug('DP comm required bandwidth for overlapped chunks: %s',
+                     human_format(self._dp_bw_overlap_req_chunk, "bandwidth"))
+      self.log.debug('DP comm required bandwidth for the last chunk: %s',
+                     human_format(self._dp_bw_overlap_req_tail, "bandwidth"))
+
+  def _compute_mem_stats(self):
+    """
+    This function computes the memory capacity statistics for a full batch from
+    the per block memory statistics.
+    """
     self._weight_space = self._block_weight_space * self._blocks_per_proc
     # account for activation recomputation
     # for full recompute we keep single block's activations
@@ -1927,13 +2550,22 @@ class Llm:
       self._weight_grad_space = 0
       self._optimizer_space = 0
 
+  def _get_mem_caps_status(self):
+    tier1, tier2 = self._get_mem_cap_reqs()
+    if tier1 > self.sys.mem1.capacity:
+      return Llm.kBadMemTier1
+    if tier2 > self.sys.mem2.capacity:
+      return Llm.kBadMemTier2
+    return Llm.kGood
+
   def _check_mem_caps(self):
-    if self.get_mem_tier1_cap_req() > self.sys.mem1.capacity:
+    status = self._get_mem_caps_status()
+    if status == Llm.kBadMemTier1:
       raise self.Error(f'Mem tier1 needs '
                        f'{human_format(self.get_mem_tier1_cap_req(), "bytes")} '
                        f'but only has '
                        f'{human_format(self.sys.mem1.capacity, "bytes")}')
-    if self.get_mem_tier2_cap_req() > self.sys.mem2.capacity:
+    if status == Llm.kBadMemTier2:
       raise self.Error(f'Mem tier2 needs '
                        f'{human_format(self.get_mem_tier2_cap_req(), "bytes")} '
                        f'but only has '
@@ -2012,12 +2644,60 @@ class Llm:
     assert self._compiled, "You must first call self.compile()"
     assert not self._executed
     assert isinstance(sys, System)
-    self._compute_block_stats()
+    self._run_block_stats()
+    self._compute_block_comm_sizes()
     self._compute_batch_stats()
+    self._compute_data_par_stats()
+    self._compute_mem_stats()
     self._check_mem_caps()
     self._misc_sanity_checks()
     self._executed = True
 
+  def _set_block_stats(self, values):
+    """
+    Sets the block statistics from the values accumulated by the layer loop of
+    _compute_block_stats(), in BlockFunction.kStats order.
+    """
+    if self.exe.training and self.exe.activation_recompute == "full":
+      self._block_act_checkpoint_size = \
+        self._activation_size * self._bytes_per_element
+    else:
+      self._block_act_checkpoint_size = 0
+    for name, value in zip(Llm._kBlockStats[1:], values):
+      setattr(self, name, value)
+    if self.exe.activation_recompute == 'full':
+      self._block_act_storage_space = 0
+
+  @staticmethod
+  def _run_blocks_stats(models):
+    """
+    Same as _run_block_stats() for compiled models sharing a system. The
+    blocks not in the block cache are computed at once as BlockArrays.
+    """
+    computed = [model for model in models
+                if model._cached_block['stats'] is None]
+    if computed:
+      stats = BlockArrays([(model._llm_block, model.exe.training)
+                           for model in computed]).get_stats()
+      for model, values in zip(computed, stats.tolist()):
+        model._set_block_stats(values)
+        model._cached_block['stats'] = {
+          name: getattr(model, name) for name in Llm._kBlockStats}
+    for model in models:
+      model._run_block_stats()
+
+  def _run_block_stats(self):
+    """
+    Computes the block statistics, or restores them from the block cache.
+    """
+    if self._cached_block['stats'] is not None:
+      for name, value in self._cached_block['stats'].items():
+        setattr(self, name, value)
+    else:
+      self._compute_block_stats()
+      self._cached_block['stats'] = {
+        name: getattr(self, name) for name in Llm._kBlockStats}
+
   def _get_fw_offload_size(self):
     if self.exe.weight_offload:
       weight_offload_size = self._block_weight_space
@@ -2121,6 +2801,14 @@ class Llm:
     else:
       return 0
 
+  def get_comm_link_time(self):
+    """
+    Returns the total time the TP, PP and DP communication and the
+    recommunication spend on the network links, exposed or not.
+    """
+    return (self.get_tp_comm_link_time() + self.get_recomm_link_time() +
+            self.get_pp_comm_link_time() + self.get_dp_comm_link_time())
+
   def get_dp_comm_net_time(self):
     if self.exe.training:
       return self._blocks_per_proc * self._block_dp_time
@@ -2141,6 +2829,70 @@ class Llm:
     time += self.get_dp_comm_exposed_time()
     return time
 
+  def get_min_total_time(self):
+    """
+    Returns a lower bound of get_total_time() which only needs compile(). It
+    ignores all communication time, so it doesn't depend on the network
+    assignment or DP overlap of the execution.
+    """
+    assert self._compiled, "You must compile the Llm first"
+    # Offload sizes need the block memory stats
+    self._estimate_block_mem_stats()
+
+    # Overlapped layers are never faster than their compute, TP comm is ignored
+    fw_time = 0
+    fw_mem_time = 0
+    bw_time = 0
+    bw_mem_time = 0
+    optim_time = 0
+    for layer in self._llm_block:
+      fw_mem_time += layer.compute_mem_time('fw')
+      if self.exe.training:
+        bw_mem_time += layer.compute_mem_time('agrad')
+        bw_mem_time += layer.compute_mem_time('wgrad')
+      if isinstance(layer, TPComm):
+        continue
+      fw_time += self.sys.get_processing_time(
+        layer.compute_flops_time('fw'), layer.compute_mem_time('fw'))
+      if self.exe.training:
+        if layer.get_recompute_flag():
+          bw_time += self.sys.get_processing_time(
+            layer.compute_flops_time('fw'), layer.compute_mem_time('fw'))
+        for stage in ['agrad', 'wgrad']:
+          bw_time += self.sys.get_processing_time(
+            layer.compute_flops_time(stage), layer.compute_mem_time(stage))
+        optim_time += self.sys.get_processing_time(
+          layer.compute_flops_time('optim'), layer.compute_mem_time('optim'))
+
+    # Blocks can't be faster than their offloading, edge blocks without PP
+    # don't account the PP comm they overlap with offloading
+    baseblock_time = (
+      max(fw_time, self.get_fw_offload_time() + fw_mem_time) +
+      max(bw_time, self.get_bw_offload_time() + bw_mem_time))
+    edgeblock_time = pick(self.exe.pipeline_par > 1, baseblock_time,
+                          fw_time + bw_time)
+    chunk_time = (self._baseblocks_per_chunk * baseblock_time +
+                  self._edgeblocks_per_chunk * edgeblock_time)
+
+    # Same bubble as in _compute_batch_stats(), it only grows with block times
+    if self._baseblocks_per_chunk > 0:
+      bubble_reduction_time = self._bubble_reduction_blocks * (
+        baseblock_time + edgeblock_time) / 2
+    else:
+      bubble_reduction_time = self._bubble_reduction_blocks * edgeblock_time
+    chunks_in_bubble = self.exe.pipeline_par - 1
+    if self.exe._num_microbatches % self.exe.pipeline_par != 0:
+      extra_interleaving_bubbles = (self.exe.pipeline_interleaving - 1) * (
+        self.exe.pipeline_par -
+        (self.exe._num_microbatches % self.exe.pipeline_par))
+    else:
+      extra_interleaving_bubbles = 0
+    bubble_time = (chunks_in_bubble + extra_interleaving_bubbles) * \
+      chunk_time - bubble_reduction_time
+
+    return (self.exe._num_microbatches * self._chunks_per_proc * chunk_time +
+            bubble_time + self._blocks_per_proc * optim_time)
+
   def get_useful_flops(self):
     total_flops = sum(
       [block.get_fw_flops() for block in self._llm_block])
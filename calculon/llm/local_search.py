@@ -0,0 +1,408 @@
+"""
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *  https://www.apache.org/licenses/LICENSE-2.0
+ *
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+"""
+
+import datetime
+import math
+import multiprocessing as mp
+import random
+
+import calculon
+from calculon.util import pick, arg_true_false_all
+from calculon.llm import *
+
+
+class LocalSearch(calculon.CommandLine):
+  NAME = 'llm-local-search'
+  ALIASES = ['lls']
+
+  @staticmethod
+  def create_parser(subparser):
+    sp = subparser.add_parser(
+      LocalSearch.NAME, aliases=LocalSearch.ALIASES,
+      help='run a heuristic search to find a good llm execution')
+    sp.set_defaults(func=LocalSearch.run_command)
+    sp.add_argument('application', type=str,
+                    help='File path to application configuration')
+    sp.add_argument('num_procs', type=int,
+                    help='Number of processors in execution')
+    sp.add_argument('max_batch_size', type=int,
+                    help='Maximum batch size, will be largest multiple of DP')
+    sp.add_argument('datatype', type=str, choices=System.supported_datatypes(),
+                    help='The datatype to use')
+    sp.add_argument('system', type=str,
+                    help='File path to system configuration')
+    sp.add_argument('output', type=str,
+                    help='File path to the output file'
+                    " ('*.csv', '*.csv.gz', '*.json', '*.json.gz')")
+    sp.add_argument('-t', '--top-n', type=int, default=1,
+                    help='Number of best outputs')
+    sp.add_argument('-e', '--evals', type=int, default=5000,
+                    help='Maximum number of executions evaluated')
+    sp.add_argument('-s', '--seconds', type=float, default=None,
+                    help='Maximum number of seconds of the search')
+    sp.add_argument('-r', '--restarts', type=int, default=8,
+                    help='Number of annealing runs from random executions')
+    sp.add_argument('--seed', type=int, default=0,
+                    help='Seed of the random moves')
+    sp.add_argument('-n', '--noneok', action='store_true',
+                    help='Don\'t give failure status when no good execution exists')
+    sp.add_argument('-l', '--layers', action='store_true',
+                    help='Include layers information in output stats file')
+    sp.add_argument('-f', '--fused_activation', type=arg_true_false_all,
+                    default='true', help='Mode of fused activation')
+    sp.add_argument('--no-tp-overlap', action='store_true',
+                    help='Don\'t allow TP overlap')
+    sp.add_argument('--no-dp-overlap', action='store_true',
+                    help='Don\'t allow DP overlap')
+    sp.add_argument('--exhaustive', action='store_true',
+                    help='Also run the exhaustive search on one CPU and report '
+                    'the gap to its best, for small cases')
+
+  @staticmethod
+  def run_command(logger, args):
+    assert args.top_n > 0, 'top-n must be > 0'
+    assert args.evals > 0, 'evals must be > 0'
+    assert args.restarts > 0, 'restarts must be > 0'
+
+    app_json = calculon.io.read_json_file(args.application)
+    syst_json = calculon.io.read_json_file(args.system)
+    app = Llm.Application(app_json)
+    syst = System(syst_json, memoize=True)
+
+    space = LocalSearch.Space(
+      app, syst, args.num_procs, args.max_batch_size, args.datatype,
+      args.fused_activation, not args.no_tp_overlap, not args.no_dp_overlap)
+    start_time = datetime.datetime.now()
+    best, steps, exe_count, good_exe_count = LocalSearch.search(
+      space, args.top_n, args.evals, args.seconds, args.restarts, args.seed)
+    end_time = datetime.datetime.now()
+
+    logger.info(f'Moves: {steps}')
+    logger.info(f'Total executions: {exe_count}')
+    logger.info(f'Good executions: {good_exe_count}')
+    calc_rate = exe_count / (end_time - start_time).total_seconds()
+    logger.info(f'Calculation rate: {calc_rate:.2f} calcs/sec')
+
+    if len(best) == 0:
+      if not args.noneok:
+        logger.fatal('No acceptable configurations found :(')
+        return -1
+      logger.info('No acceptable configurations found :(')
+    else:
+      logger.info(f'Best sample rate: {best[0][0]}')
+
+    if args.exhaustive:
+      exhaustive = LocalSearch.exhaustive_search(space)
+      if len(exhaustive) == 0:
+        logger.info('Exhaustive search: no acceptable configurations')
+      else:
+        gap = 1 - pick(len(best) > 0, best[0][0], 0) / exhaustive[0][0]
+        logger.info(f'Exhaustive best sample rate: {exhaustive[0][0]}')
+        logger.info(f'Gap to exhaustive best: {100 * gap:.2f}%')
+
+    output = {}
+    for index, (sample_rate, execution) in enumerate(best):
+      stats = OptimalExecution.get_stats(app, syst, execution, args.layers)
+      OptimalExecution.check_sample_rate(logger, stats, sample_rate)
+      output[index] = {
+        'execution': execution,
+        'stats': stats
+      }
+
+    logger.info(f'Output: {args.output}')
+    OptimalExecution.write_output(output, args.output)
+    return 0
+
+  class Space:
+    """
+    The executions searched by llm-optimal-execution, as execution JSONs with
+    the valid values of each field given the others.
+    """
+
+    # Fields chosen after the parallelism, in dependency order, see repair()
+    kFields = (
+      'pipeline_interleaving', 'microbatch_size', 'activation_recompute',
+      'optimizer_sharding', 'tensor_par_comm_type', 'seq_par_ag_redo',
+      'data_par_overlap', 'tensor_par_overlap', 'weight_offload',
+      'activations_offload', 'optimizer_offload', 'fused_activation',
+      'tensor_par_net', 'pipeline_par_net', 'data_par_net')
+
+    # Fields with ordered values, their moves go to a neighbouring value
+    kOrderedFields = ('pipeline_interleaving', 'microbatch_size')
+
+    def __init__(self, app, syst, num_procs, max_batch_size, datatype,
+                 fused_acts, allow_tp_overlap, allow_dp_overlap):
+      self.app = app
+      self.syst = syst
+      self.num_procs = num_procs
+      self.max_batch_size = max_batch_size
+      self.datatype = datatype
+      self.fused_acts = fused_acts
+      self.allow_tp_overlap = allow_tp_overlap
+      self.allow_dp_overlap = allow_dp_overlap
+      self.has_mem2 = syst.mem2.capacity > 0
+      self.parallelisms = []
+      for tp, pp in OptimalExecution.get_parallelisms(app, num_procs):
+        dp = Llm.get_data_parallelism(num_procs, tp, pp)
+        if OptimalExecution.get_batch_size(dp, max_batch_size) is not None:
+          self.parallelisms.append((tp, pp))
+
+    def get_choices(self, exe_json, field):
+      """
+      Returns the valid values of the field given the fields it depends on.
+      """
+      tp = exe_json['tensor_par']
+      pp = exe_json['pipeline_par']
+      dp = exe_json['data_par']
+      if field == 'pipeline_interleaving':
+        return list(Llm.get_valid_pipeline_interleavings(
+          self.app.num_blocks, pp))
+      if field == 'microbatch_size':
+        return list(Llm.get_valid_microbatch_sizes(
+          self.app.seq_size, tp, dp, exe_json['batch_size'], pp))
+      if field == 'activation_recompute':
+        return ['full', 'attn_only', 'none']
+      if field == 'optimizer_sharding':
+        return pick(dp>1, [True, False], [False])
+      if field == 'tensor_par_comm_type':
+        return ['ar', 'p2p_rs_ag', 'rs_ag']
+      if field == 'seq_par_ag_redo':
+        return pick(Llm.can_redo_ag(exe_json['tensor_par_comm_type'],
+                                    exe_json['activation_recompute']),
+                    [True, False], [False])
+      if field == 'data_par_overlap':
+        return pick(dp>1 and self.allow_dp_overlap, [True, False], [False])
+      if field == 'tensor_par_overlap':
+        return pick(tp>1 and self.allow_tp_overlap, ['none', 'ring', 'pipe'],
+                    ['none'])
+      if field in ['weight_offload', 'optimizer_offload']:
+        return pick(self.has_mem2, [True, False], [False])
+      if field == 'activations_offload':
+        return pick(self.has_mem2 and
+                    exe_json['activation_recompute'] != 'full',
+                    [True, False], [False])
+      if field == 'fused_activation':
+        return list(self.fused_acts)
+      par = {'tensor_par_net': tp, 'pipeline_par_net': pp,
+             'data_par_net': dp}[field]
+      return list(pick(par>1, range(self.syst.num_networks), [0]))
+
+    def set_parallelism(self, exe_json, tp, pp):
+      dp = Llm.get_data_parallelism(self.num_procs, tp, pp)
+      exe_json['tensor_par'] = tp
+      exe_json['pipeline_par'] = pp
+      exe_json['data_par'] = dp
+      exe_json['batch_size'] = OptimalExecution.get_batch_size(
+        dp, self.max_batch_size)
+
+    def repair(self, exe_json):
+      """
+      Changes the fields which are invalid given the fields they depend on,
+      ordered fields go to their closest valid value.
+      """
+      for field in LocalSearch.Space.kFields:
+        choices = self.get_choices(exe_json, field)
+        if exe_json[field] in choices:
+          continue
+        if field in LocalSearch.Space.kOrderedFields:
+          exe_json[field] = min(
+            choices, key=lambda choice, value=exe_json[field]:
+            abs(choice - value))
+        else:
+          exe_json[field] = choices[0]
+      return exe_json
+
+    def get_random(self, rng):
+      """
+      Returns a random execution, None if the space is empty.
+      """
+      if len(self.parallelisms) == 0:
+        return None
+      exe_json = {
+        'num_procs': self.num_procs,
+        'datatype': self.datatype,
+        'attention_type': 'multihead',
+        'training': True
+      }
+      self.set_parallelism(exe_json, *rng.choice(self.parallelisms))
+      for field in LocalSearch.Space.kFields:
+        exe_json[field] = rng.choice(self.get_choices(exe_json, field))
+      return exe_json
+
+    def get_neighbour(self, exe_json, rng):
+      """
+      Returns a random neighbour of the execution, which changes the TP or PP
+      to a neighbouring valid value, moves an ordered field to a neighbouring
+      value or changes another field. The dependent fields are repaired.
+      """
+      tp = exe_json['tensor_par']
+      pp = exe_json['pipeline_par']
+      moves = []
+      tps = sorted(t for t, p in self.parallelisms if p == pp)
+      if len(tps) > 1:
+        moves.append('tensor_par')
+      pps = sorted(p for t, p in self.parallelisms if t == tp)
+      if len(pps) > 1:
+        moves.append('pipeline_par')
+      for field in LocalSearch.Space.kFields:
+        if len(self.get_choices(exe_json, field)) > 1:
+          moves.append(field)
+      neighbour = dict(exe_json)
+      if len(moves) == 0:
+        return neighbour
+
+      move = rng.choice(moves)
+      if move in ['tensor_par', 'pipeline_par']:
+        values = pick(move == 'tensor_par', tps, pps)
+        index = values.index(exe_json[move])
+        value = values[LocalSearch.Space._step(index, len(values), rng)]
+        self.set_parallelism(neighbour, *pick(move == 'tensor_par',
+                                              (value, pp), (tp, value)))
+      elif move in LocalSearch.Space.kOrderedFields:
+        values = self.get_choices(exe_json, move)
+        index = values.index(exe_json[move])
+        neighbour[move] = values[LocalSearch.Space._step(
+          index, len(values), rng)]
+      else:
+        neighbour[move] = rng.choice(
+          [value for value in self.get_choices(exe_json, move)
+           if value != exe_json[move]])
+      return self.repair(neighbour)
+
+    @staticmethod
+    def _step(index, size, rng):
+      if index == 0:
+        return 1
+      if index == size - 1:
+        return index - 1
+      return index + rng.choice([-1, 1])
+
+  # Annealing temperatures of the start and end of a run, in relative sample
+  # rate: a 10% slower move is first accepted with probability 1/e
+  kStartTemperature = 0.1
+  kEndTemperature = 0.001
+
+  # Maximum number of moves per evaluation of a run, the moves to visited
+  # executions are not evaluated again
+  kMaxStepsPerEval = 10
+
+  @staticmethod
+  def search(space, top_n, max_evals, max_seconds=None, restarts=1, seed=0,
+             block_cache=None):
+    """
+    Simulated annealing over the space from random executions. The budget of
+    evaluations is split between the restarts, the time budget stops the
+    search early. Returns the best executions as
+    OptimalExecution.update_list(), the number of moves and the numbers of
+    evaluated and good executions.
+    """
+    rng = random.Random(seed)
+    if block_cache is None:
+      block_cache = {}
+    model = Llm(space.app, None, block_cache)
+    sample_rates = {}
+    best = []
+    steps = 0
+    good_exe_count = 0
+    start_time = datetime.datetime.now()
+    evals_per_run = max(1, max_evals // restarts)
+    max_steps = LocalSearch.kMaxStepsPerEval * evals_per_run
+
+    for _ in range(restarts):
+      current = space.get_random(rng)
+      if current is None:
+        break
+      current_rate = None
+      run_evals = 0
+      run_steps = 0
+      while run_evals < evals_per_run and run_steps < max_steps:
+        if max_seconds is not None and (
+            datetime.datetime.now() - start_time).total_seconds() > max_seconds:
+          break
+        if current_rate is None:
+          candidate = current
+        else:
+          candidate = space.get_neighbour(current, rng)
+        steps += 1
+        run_steps += 1
+
+        key = tuple(sorted(candidate.items()))
+        if key not in sample_rates:
+          status = model.evaluate(space.syst,
+                                  Llm.Execution.from_json(candidate))
+          run_evals += 1
+          sample_rate = 0
+          if status == Llm.kGood:
+            sample_rate = model.get_sample_rate()
+            good_exe_count += 1
+            best = OptimalExecution.update_list(
+              best, (sample_rate, candidate), top_n)
+          sample_rates[key] = sample_rate
+        sample_rate = sample_rates[key]
+
+        # Walks freely until a good execution is found, then never goes to a
+        # bad one and goes to slower ones with the Metropolis probability
+        progress = max(run_evals / evals_per_run, run_steps / max_steps)
+        temperature = LocalSearch.kStartTemperature * (
+          LocalSearch.kEndTemperature / LocalSearch.kStartTemperature) ** \
+          progress
+        if current_rate is None or current_rate == 0 or \
+           sample_rate >= current_rate:
+          accept = True
+        elif sample_rate == 0:
+          accept = False
+        else:
+          accept = rng.random() < math.exp(
+            math.log(sample_rate / current_rate) / temperature)
+        if accept:
+          current = candidate
+          current_rate = sample_rate
+    return best, steps, len(sample_rates), good_exe_count
+
+  @staticmethod
+  def exhaustive_search(space, block_cache=None):
+    """
+    Returns the best execution of the space as llm-optimal-execution finds it,
+    searched sequentially.
+    """
+    if block_cache is None:
+      block_cache = {}
+    best = []
+    tasks = OptimalExecution.get_tasks(
+      space.app, space.syst, space.num_procs, space.max_batch_size,
+      space.fused_acts, space.allow_tp_overlap, space.allow_dp_overlap)
+    OptimalExecution.init_worker(mp.Value('d', 0.0))
+    try:
+      for (tp, pp, dp, ppint, batch_size, activation_recompute,
+           optimizer_sharding, tensor_par_comm_type), _, _ in tasks:
+        search = OptimalExecution.search(
+          debug=False, top_n=1, num_procs=space.num_procs,
+          max_batch_size=space.max_batch_size, datatype=space.datatype,
+          app=space.app, syst=space.syst, tp=tp, pp=pp, dp=dp, ppint=ppint,
+          batch_size=batch_size, activation_recompute=activation_recompute,
+          optimizer_sharding=optimizer_sharding,
+          tensor_par_comm_type=tensor_par_comm_type,
+          fused_acts=space.fused_acts, mbs_break=False,
+          allow_tp_overlap=space.allow_tp_overlap,
+          allow_dp_overlap=space.allow_dp_overlap, block_cache=block_cache)
+        best = OptimalExecution.update_list(best, search[0], 1)
+    finally:
+      OptimalExecution.init_worker(None)
+    return best
+
+
+calculon.CommandLine.register(LocalSearch)
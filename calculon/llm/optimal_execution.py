@@ -18,11 +18,14 @@
 import datetime
 import gzip
 import logging
+import math
 import multiprocessing as mp
+import pickle
 import psutil
 import os
 
 import calculon
+from calculon.progress import Progress
 from calculon.util import pick, arg_true_false_all
 from calculon.llm import *
 
@@ -68,55 +71,141 @@ class OptimalExecution(calculon.CommandLine):
                     help='Don\'t allow TP overlap')
     sp.add_argument('--no-dp-overlap', action='store_true',
                     help='Don\'t allow DP overlap')
+    sp.add_argument('--no-prune', action='store_true',
+                    help='Don\'t skip executions that can\'t reach the top-n')
+    sp.add_argument('--pareto', action='store_true',
+                    help='Output the executions not dominated in sample rate, '
+                    'mem tier1 and tier2 capacity and comm link time, '
+                    'instead of the top-n (not with --mbs-break)')
+    sp.add_argument('--resume', action='store_true',
+                    help='Resume an interrupted search from its checkpoint')
+    sp.add_argument('--progress', type=str, default=None,
+                    help='File path to write the progress as JSON lines')
 
   @staticmethod
   def run_command(logger, args):
     assert args.top_n > 0, 'top-n must be > 0'
+    # MBS break skips larger microbatch sizes which can still be in the Pareto
+    # front with other memory and time tradeoffs
+    if args.pareto and args.mbs_break:
+      logger.fatal('--pareto can\'t be used with --mbs-break')
+      return -1
 
-    app = Llm.Application(calculon.io.read_json_file(args.application))
-    syst = System(calculon.io.read_json_file(args.system))
+    app_json = calculon.io.read_json_file(args.application)
+    syst_json = calculon.io.read_json_file(args.system)
+    app = Llm.Application(app_json)
+    syst = System(syst_json, memoize=True)
 
-    params = []
-    for tp in Llm.get_all_tensor_parallelisms(
-        args.num_procs, app.hidden, app.attn_heads):
-      for pp in Llm.get_all_pipeline_parallelisms(
-          args.num_procs, tp, app.num_blocks):
-        dp = Llm.get_data_parallelism(args.num_procs, tp, pp)
-        for ppint in Llm.get_valid_pipeline_interleavings(app.num_blocks, pp):
-          batch_size = OptimalExecution.get_batch_size(dp, args.max_batch_size)
-          if batch_size is None:
-            continue
-          for activation_recompute in ['full', 'attn_only', 'none']:
-            for optimizer_sharding in pick(dp>1, [True, False], [False]):
-              for tensor_par_comm_type in ['ar', 'p2p_rs_ag', 'rs_ag']:
-                params.append(
-                  (args.debug, args.top_n, args.layers, args.num_procs,
-                   args.max_batch_size, args.datatype, app, syst, tp, pp, dp,
-                   ppint, batch_size, activation_recompute, optimizer_sharding,
-                   tensor_par_comm_type, args.fused_activation, args.mbs_break,
-                   not args.no_tp_overlap, not args.no_dp_overlap))
-
-    # Runs parallel searches
+    # Search arguments common to all tasks, see init_worker()
+    common = {
+      'debug': args.debug,
+      'top_n': args.top_n,
+      'num_procs': args.num_procs,
+      'max_batch_size': args.max_batch_size,
+      'datatype': args.datatype,
+      'app': app,
+      'syst': syst,
+      'fused_acts': args.fused_activation,
+      'mbs_break': args.mbs_break,
+      'allow_tp_overlap': not args.no_tp_overlap,
+      'allow_dp_overlap': not args.no_dp_overlap,
+      'prune': not args.no_prune,
+      'pareto': args.pareto
+    }
+
+    tasks = OptimalExecution.get_tasks(
+      app, syst, args.num_procs, args.max_batch_size, args.fused_activation,
+      not args.no_tp_overlap, not args.no_dp_overlap)
+    parts = OptimalExecution.split_tasks(
+      tasks, OptimalExecution.get_max_part_size([tasks], args.cpus))
+    logger.debug(f'Search parts: {len(parts)} from {len(tasks)} tasks')
+
+    parts.sort(key=lambda part: part[0], reverse=True)
+
+    # Completed parts are periodically saved so an interrupted search can
+    # resume, the parts are saved too as they depend on the number of CPUs
+    checkpoint = args.output + '.ckpt'
+    signature = (app_json, syst_json, args.num_procs, args.max_batch_size,
+                 args.datatype, args.top_n, args.fused_activation,
+                 args.mbs_break, args.no_tp_overlap, args.no_dp_overlap,
+                 args.no_prune, args.pareto)
+    done = {}
+    if args.resume and os.path.exists(checkpoint):
+      saved = calculon.io.read_pickle_file(checkpoint)
+      if saved['signature'] != signature:
+        logger.fatal(f'Checkpoint {checkpoint} is from a different search')
+        return -1
+      parts = saved['parts']
+      done = saved['done']
+      logger.info(f'Resuming: {len(done)} of {len(parts)} parts done')
+    todo = [(key, params) for _, key, params in parts if key not in done]
+    sizes = {key: size for size, key, _ in parts}
+
+    # Runs parallel searches largest first, the searches share the top-n
+    # threshold which starts from the results of resumed parts
+    best = []
+    for _, search in sorted(done.items()):
+      best = OptimalExecution.update_best(best, search[0], args.top_n,
+                                          args.pareto)
+    # Pickling all the parts takes a while, only for debug logs
+    if logger.isEnabledFor(logging.DEBUG):
+      part_bytes = [len(pickle.dumps(part)) for part in todo]
+      logger.debug(f'Pickled bytes: {len(pickle.dumps(common))} per worker, '
+                   f'{max(part_bytes, default=0)} max and '
+                   f'{sum(part_bytes) / max(len(todo), 1):.1f} mean per part')
+    progress = Progress(logger, sum(sizes[key] for key, _ in todo),
+                        args.progress, best[0][0] if best else None)
+    progress.start()
     start_time = datetime.datetime.now()
-    with mp.Pool(args.cpus) as pool:
-      searches = pool.starmap(OptimalExecution.search, params)
+    saved_time = start_time
+    run_exe_count = 0
+    threshold = mp.Value('d', pick(
+      args.pareto, 0, OptimalExecution.get_threshold(best, args.top_n)))
+    # The progress thread is stopped even if the search is interrupted
+    try:
+      with mp.Pool(args.cpus, initializer=OptimalExecution.init_worker,
+                   initargs=(threshold, common, progress.queue)) as pool:
+        for key, search in pool.imap_unordered(OptimalExecution.search_part,
+                                               todo):
+          done[key] = search
+          run_exe_count += search[1]
+          # MBS break skips the rest of a microbatch size loop
+          progress.skip(sizes[key] - search[1])
+          now = datetime.datetime.now()
+          if not args.debug and (now - saved_time).total_seconds() >= \
+             OptimalExecution.kCheckpointSeconds:
+            calculon.io.write_pickle_file(
+              {'signature': signature, 'parts': parts, 'done': done},
+              checkpoint)
+            saved_time = now
+        # Lets the workers exit normally so their queued messages are sent
+        pool.close()
+        pool.join()
+    finally:
+      progress.stop()
     end_time = datetime.datetime.now()
 
-    # Combines parallel search result into one data structure
+    # Combines parallel search result into one data structure, in the task
+    # order to break ties as a sequential search would
+    searches = sorted(done.items())
     best = []
     exe_count = 0
     good_exe_count = 0
     bad_exe_count = 0
-    for cbest, ec, gec, bec, tp, pp in searches:
-      best = OptimalExecution.update_list(best, cbest, args.top_n)
+    pruned_exe_count = 0
+    for _, (cbest, ec, gec, bec, pec, *_) in searches:
+      best = OptimalExecution.update_best(best, cbest, args.top_n,
+                                          args.pareto)
       exe_count += ec
       good_exe_count += gec
       bad_exe_count += bec
+      pruned_exe_count += pec
 
     logger.info(f'Total executions: {exe_count}')
     logger.info(f'Good executions: {good_exe_count}')
     logger.info(f'Bad executions: {bad_exe_count}')
-    calc_rate = exe_count / (end_time - start_time).total_seconds()
+    logger.info(f'Pruned executions: {pruned_exe_count}')
+    calc_rate = run_exe_count / (end_time - start_time).total_seconds()
     logger.info(f'Calculation rate: {calc_rate:.2f} calcs/sec')
     if args.debug:
       return 0
@@ -129,24 +218,41 @@ class OptimalExecution(calculon.CommandLine):
         logger.info('No acceptable configurations found :(')
     else:
       logger.info(f'Best sample rate: {best[0][0]}')
+      if args.pareto:
+        logger.info(f'Pareto executions: {len(best)}')
 
+    # The searches only keep the sample rates, the statistics of the best
+    # executions are computed again
     output = {}
-    for index, run in enumerate(best):
-      _, execution, stats = run
+    for index, (sample_rate, execution, *_) in enumerate(best):
+      stats = OptimalExecution.get_stats(app, syst, execution, args.layers)
+      OptimalExecution.check_sample_rate(logger, stats, sample_rate)
       output[index] = {
         'execution': execution,
         'stats': stats
       }
 
-    if calculon.io.is_json_extension(args.output):
-      logger.info(f'Output: {args.output}')
-      calculon.io.write_json_file(output, args.output)
-    elif args.output.endswith('.csv') or args.output.endswith('.csv.gz'):
-      logger.info(f'Output: {args.output}')
-      exe_keys = list(output[0]['execution'].keys())
-      stats_keys = list(output[0]['stats'].keys())
-      opener = gzip.open if args.output.endswith('.gz') else open
-      with opener(args.output, 'wb') as fd:
+    logger.info(f'Output: {args.output}')
+    OptimalExecution.write_output(output, args.output)
+
+    if os.path.exists(checkpoint):
+      os.remove(checkpoint)
+
+    return 0
+
+  @staticmethod
+  def write_output(output, filename):
+    """
+    Writes the executions and statistics of the output, indexed by their keys,
+    to a JSON or CSV file.
+    """
+    if calculon.io.is_json_extension(filename):
+      calculon.io.write_json_file(output, filename)
+    elif filename.endswith('.csv') or filename.endswith('.csv.gz'):
+      exe_keys = list(output[next(iter(output))]['execution'].keys())
+      stats_keys = list(output[next(iter(output))]['stats'].keys())
+      opener = gzip.open if filename.endswith('.gz') else open
+      with opener(filename, 'wb') as fd:
         fd.write(bytes(f',{",".join(exe_keys)},{",".join(stats_keys)}\n',
                        'utf-8'))
         for index in sorted(output.keys()):
@@ -157,9 +263,77 @@ class OptimalExecution(calculon.CommandLine):
             fd.write(bytes(f',{output[index]["stats"][stats_key]}', 'utf-8'))
           fd.write(bytes('\n', 'utf-8'))
     else:
-      assert False, f'Unknown file type: {args.output}'
+      assert False, f'Unknown file type: {filename}'
 
-    return 0
+  @staticmethod
+  def get_parallelisms(app, num_procs):
+    """
+    Returns the (tensor_par, pipeline_par) pairs of the search.
+    """
+    for tp in Llm.get_all_tensor_parallelisms(
+        num_procs, app.hidden, app.attn_heads):
+      for pp in Llm.get_all_pipeline_parallelisms(
+          num_procs, tp, app.num_blocks):
+        yield tp, pp
+
+  @staticmethod
+  def get_tasks(app, syst, num_procs, max_batch_size, fused_acts,
+                allow_tp_overlap, allow_dp_overlap, parallelisms=None):
+    """
+    Returns the tasks of the search as (params, number of outer loops, inner
+    size) tuples, see search_part(). The parallelisms default to
+    get_parallelisms().
+    """
+    if parallelisms is None:
+      parallelisms = OptimalExecution.get_parallelisms(app, num_procs)
+    tasks = []
+    for tp, pp in parallelisms:
+      dp = Llm.get_data_parallelism(num_procs, tp, pp)
+      for ppint in Llm.get_valid_pipeline_interleavings(app.num_blocks, pp):
+        batch_size = OptimalExecution.get_batch_size(dp, max_batch_size)
+        if batch_size is None:
+          continue
+        for activation_recompute in ['full', 'attn_only', 'none']:
+          for optimizer_sharding in pick(dp>1, [True, False], [False]):
+            for tensor_par_comm_type in ['ar', 'p2p_rs_ag', 'rs_ag']:
+              params = (tp, pp, dp, ppint, batch_size, activation_recompute,
+                        optimizer_sharding, tensor_par_comm_type)
+              num_outer = len(OptimalExecution.get_outer_loops(
+                tp, dp, activation_recompute, tensor_par_comm_type,
+                allow_tp_overlap, allow_dp_overlap))
+              inner_size = OptimalExecution.get_inner_size(
+                app, syst, tp, pp, dp, batch_size, activation_recompute,
+                fused_acts)
+              tasks.append((params, num_outer, inner_size))
+    return tasks
+
+  @staticmethod
+  def get_max_part_size(task_lists, cpus):
+    """
+    Returns the size of a fair share of a CPU's work for the lists of tasks
+    run in one pool.
+    """
+    total_size = sum(num_outer * inner_size for tasks in task_lists
+                     for _, num_outer, inner_size in tasks)
+    return max(1, total_size // (cpus * OptimalExecution.kPartsPerCpu))
+
+  @staticmethod
+  def split_tasks(tasks, max_size):
+    """
+    Splits large tasks into contiguous parts of their outer loops, so no part
+    is much larger than max_size. Returns (size, (task index, start), params)
+    tuples, the params end with the outer range of the part.
+    """
+    parts = []
+    for index, (params, num_outer, inner_size) in enumerate(tasks):
+      num_parts = max(1, min(num_outer, math.ceil(
+        num_outer * inner_size / max_size)))
+      step = math.ceil(num_outer / num_parts)
+      for start in range(0, num_outer, step):
+        stop = min(start + step, num_outer)
+        parts.append(((stop - start) * inner_size, (index, start),
+                      params + ((start, stop),)))
+    return parts
 
   @staticmethod
   def get_batch_size(data_par, max_batch_size):
@@ -172,89 +346,373 @@ class OptimalExecution(calculon.CommandLine):
       else:
         last += data_par
 
+  # Best top-n threshold shared between the worker processes, see
+  # init_worker()
+  _threshold = None
+
+  # Number of search parts to aim for per CPU to balance the load
+  kPartsPerCpu = 4
+
+  # Minimum number of seconds between checkpoints of a search
+  kCheckpointSeconds = 60
+
+  # Search arguments common to all tasks and progress reporter of the worker
+  # process, see init_worker()
+  _common = None
+  _reporter = None
+
+  # Pareto archive of the searches of the worker process, see update_pareto()
+  _archive = []
+
+  @staticmethod
+  def init_worker(threshold, common=None, progress_queue=None):
+    """
+    Installs the shared top-n threshold, the arguments common to all tasks and
+    the progress reporter once per worker process, so tasks only carry their
+    own loop values.
+    """
+    OptimalExecution._threshold = threshold
+    OptimalExecution._common = common
+    OptimalExecution._archive = []
+    OptimalExecution._reporter = None
+    if progress_queue is not None:
+      OptimalExecution._reporter = Progress.Reporter(progress_queue)
+
+  @staticmethod
+  def report(**counts):
+    if OptimalExecution._reporter is not None:
+      OptimalExecution._reporter.add(**counts)
+
+  @staticmethod
+  def get_threshold(best, top_n):
+    """
+    Returns the sample rate an execution must exceed to enter the top-n.
+    """
+    threshold = best[-1][0] if len(best) == top_n else 0
+    if OptimalExecution._threshold is not None:
+      threshold = max(threshold, OptimalExecution._threshold.value)
+    return threshold
+
+  @staticmethod
+  def share_threshold(best, top_n):
+    if OptimalExecution._threshold is None or len(best) < top_n:
+      return
+    with OptimalExecution._threshold.get_lock():
+      if OptimalExecution._threshold.value < best[-1][0]:
+        OptimalExecution._threshold.value = best[-1][0]
+
   @staticmethod
-  def search(debug, top_n, layers, num_procs, max_batch_size, datatype,
+  def get_max_sample_rate(model, syst, exe_jsons):
+    """
+    Returns an upper bound of the sample rate of the given executions, which
+    must only differ by network assignment and DP overlap. Returns None if none
+    of the executions compiles. The model is recompiled for each execution.
+    """
+    for exe_json in exe_jsons:
+      try:
+        model.recompile(syst, Llm.Execution.from_json(exe_json))
+      except Llm.Error:
+        continue
+      return model.exe.global_batch_size / model.get_min_total_time()
+    return None
+
+  @staticmethod
+  def search_part(part):
+    key, (tp, pp, dp, ppint, batch_size, activation_recompute,
+          optimizer_sharding, tensor_par_comm_type, outer_range) = part
+    search = OptimalExecution.search(
+      tp=tp, pp=pp, dp=dp, ppint=ppint, batch_size=batch_size,
+      activation_recompute=activation_recompute,
+      optimizer_sharding=optimizer_sharding,
+      tensor_par_comm_type=tensor_par_comm_type, outer_range=outer_range,
+      **OptimalExecution._common)
+    if OptimalExecution._reporter is not None:
+      OptimalExecution._reporter.flush()
+    return key, search
+
+  @staticmethod
+  def get_outer_loops(tp, dp, activation_recompute, tensor_par_comm_type,
+                      allow_tp_overlap, allow_dp_overlap):
+    """
+    Returns the outermost search loops of a task in the order of search().
+    """
+    can_redo = Llm.can_redo_ag(tensor_par_comm_type,
+                               activation_recompute)
+    outer_loops = []
+    for seq_par_ag_redo in pick(can_redo, [True, False], [False]):
+      for data_par_overlap in pick(dp>1 and allow_dp_overlap, [True, False],
+                                   [False]):
+        for tensor_par_overlap in pick(tp>1 and allow_tp_overlap,
+                                       ['none', 'ring', 'pipe'], ['none']):
+          outer_loops.append(
+            (seq_par_ag_redo, data_par_overlap, tensor_par_overlap))
+    return outer_loops
+
+  @staticmethod
+  def get_inner_size(app, syst, tp, pp, dp, batch_size, activation_recompute,
+                     fused_acts):
+    """
+    Returns the number of executions for each of the outer loops of a task.
+    """
+    has_mem2 = syst.mem2.capacity > 0
+    num_offloads = pick(has_mem2, 4, 1)
+    if activation_recompute != 'full' and has_mem2:
+      num_offloads *= 2
+    num_mbs = len(list(Llm.get_valid_microbatch_sizes(
+      app.seq_size, tp, dp, batch_size, pp)))
+    num_nets = 1
+    for par in [tp, pp, dp]:
+      num_nets *= pick(par>1, syst.num_networks, 1)
+    return num_offloads * len(fused_acts) * num_mbs * num_nets
+
+  @staticmethod
+  def get_stats(app, syst, exe_json, layers):
+    """
+    Returns the statistics JSON of a good execution found by search().
+    """
+    model = Llm(app, logging.Logger('sub'))
+    model.compile(syst, Llm.Execution.from_json(exe_json))
+    model.run(syst)
+    return model.get_stats_json(layers)
+
+  @staticmethod
+  def check_sample_rate(logger, stats, sample_rate):
+    """
+    Warns when the statistics of get_stats() don't have the sample rate the
+    search found for the execution.
+    """
+    if not math.isclose(stats['sample_rate'], sample_rate, rel_tol=1e-9):
+      logger.warning(f'Sample rate {stats["sample_rate"]} of the statistics '
+                     f'differs from {sample_rate} found by the search')
+
+  @staticmethod
+  def search(debug, top_n, num_procs, max_batch_size, datatype,
              app, syst, tp, pp, dp, ppint, batch_size, activation_recompute,
              optimizer_sharding, tensor_par_comm_type, fused_acts, mbs_break,
-             allow_tp_overlap, allow_dp_overlap):
+             allow_tp_overlap, allow_dp_overlap, prune=True, outer_range=None,
+             pareto=False, block_cache=None):
+    """
+    Searches the executions of one task, outer_range optionally restricts the
+    search to a slice of get_outer_loops(). Only the sample rates of the
+    best executions are kept, see get_stats(). With pareto, the best
+    executions are the Pareto archive of update_pareto() instead of the
+    top-n. The block cache of the search can be given to share it with other
+    searches of the same application and system.
+    """
     num_nets = syst.num_networks
 
     best = []
     exe_count = 0
     good_exe_count = 0
     bad_exe_count = 0
+    pruned_exe_count = 0
 
     has_mem2 = syst.mem2.capacity > 0
 
-    can_redo = Llm.can_redo_ag(tensor_par_comm_type,
-                               activation_recompute)
-    for seq_par_ag_redo in pick(can_redo, [True, False], [False]):
-      for data_par_overlap in pick(dp>1 and allow_dp_overlap, [True, False],
-                                   [False]):
-        for tensor_par_overlap in pick(tp>1 and allow_tp_overlap,
-                                       ['none', 'ring', 'pipe'], ['none']):
-          for weight_offload in pick(has_mem2, [True, False], [False]):
-            if activation_recompute == 'full' or not has_mem2:
-              activations_offloads = [False]
-            else:
-              activations_offloads = [True, False]
-            for activations_offload in activations_offloads:
-              for optimizer_offload in pick(has_mem2, [True, False],
-                                            [False]):
-                for fused_act in fused_acts:
-                  for microbatch_size in Llm.get_valid_microbatch_sizes(
-                      app.seq_size, tp, dp, batch_size, pp):
-                    mbs_break_good = good_exe_count
-                    for tn in pick(tp>1, range(num_nets), [0]):
-                      for pn in pick(pp>1, range(num_nets), [0]):
-                        for dn in pick(dp>1, range(num_nets), [0]):
-                          exe_count += 1
-                          exe_json = {
-                            'num_procs': num_procs,
-                            'tensor_par': tp,
-                            'pipeline_par': pp,
-                            'data_par': dp,
-                            'tensor_par_net': tn,
-                            'pipeline_par_net': pn,
-                            'data_par_net': dn,
-                            'batch_size': batch_size,
-                            'microbatch_size': microbatch_size,
-                            'datatype': datatype,
-                            'fused_activation': fused_act,
-                            'attention_type': 'multihead',
-                            'activation_recompute': activation_recompute,
-                            'pipeline_interleaving': ppint,
-                            'optimizer_sharding': optimizer_sharding,
-                            'tensor_par_comm_type': tensor_par_comm_type,
-                            'tensor_par_overlap': tensor_par_overlap,
-                            'seq_par_ag_redo': seq_par_ag_redo,
-                            'data_par_overlap': data_par_overlap,
-                            'weight_offload': weight_offload,
-                            'activations_offload': activations_offload,
-                            'optimizer_offload': optimizer_offload,
-                            'training': True
-                          }
-
-                          if not debug:
-                            try:
-                              logger = logging.Logger('sub')
-                              model = Llm(app, logger)
-                              model.compile(
-                                syst,
-                                Llm.Execution.from_json(exe_json))
-                              model.run(syst)
-                              stats = model.get_stats_json(layers)
-                              good_exe_count += 1
-                              curr = (stats['sample_rate'], exe_json, stats)
-                              best = OptimalExecution.update_list(best, curr,
-                                                                  top_n)
-                            except Llm.Error as ex:
-                              logger = logging.getLogger()
-                              logger.debug(f'JSON:{exe_json}\nERROR:{ex}\n')
-                              bad_exe_count += 1
-                    if mbs_break and good_exe_count == mbs_break_good:
-                      break
-    return (best, exe_count, good_exe_count, bad_exe_count, tp, pp)
+    # The sample rate bound only depends on these loops, see
+    # get_max_sample_rate(), and so do the cost bounds, see get_min_costs()
+    max_sample_rates = {}
+    min_costs = {}
+
+    # Executions of this search share many blocks, see Llm._get_block_key().
+    # A single model evaluates every execution.
+    if block_cache is None:
+      block_cache = {}
+    model = Llm(app, None, block_cache)
+
+    outer_loops = OptimalExecution.get_outer_loops(
+      tp, dp, activation_recompute, tensor_par_comm_type, allow_tp_overlap,
+      allow_dp_overlap)
+    if outer_range is not None:
+      outer_loops = outer_loops[outer_range[0]:outer_range[1]]
+    for seq_par_ag_redo, data_par_overlap, tensor_par_overlap in outer_loops:
+      for weight_offload in pick(has_mem2, [True, False], [False]):
+        if activation_recompute == 'full' or not has_mem2:
+          activations_offloads = [False]
+        else:
+          activations_offloads = [True, False]
+        for activations_offload in activations_offloads:
+          for optimizer_offload in pick(has_mem2, [True, False],
+                                        [False]):
+            for fused_act in fused_acts:
+              for microbatch_size in Llm.get_valid_microbatch_sizes(
+                  app.seq_size, tp, dp, batch_size, pp):
+                mbs_break_good = good_exe_count
+                exe_jsons = []
+                for tn in pick(tp>1, range(num_nets), [0]):
+                  for pn in pick(pp>1, range(num_nets), [0]):
+                    for dn in pick(dp>1, range(num_nets), [0]):
+                      exe_jsons.append({
+                        'num_procs': num_procs,
+                        'tensor_par': tp,
+                        'pipeline_par': pp,
+                        'data_par': dp,
+                        'tensor_par_net': tn,
+                        'pipeline_par_net': pn,
+                        'data_par_net': dn,
+                        'batch_size': batch_size,
+                        'microbatch_size': microbatch_size,
+                        'datatype': datatype,
+                        'fused_activation': fused_act,
+                        'attention_type': 'multihead',
+                        'activation_recompute': activation_recompute,
+                        'pipeline_interleaving': ppint,
+                        'optimizer_sharding': optimizer_sharding,
+                        'tensor_par_comm_type': tensor_par_comm_type,
+                        'tensor_par_overlap': tensor_par_overlap,
+                        'seq_par_ag_redo': seq_par_ag_redo,
+                        'data_par_overlap': data_par_overlap,
+                        'weight_offload': weight_offload,
+                        'activations_offload': activations_offload,
+                        'optimizer_offload': optimizer_offload,
+                        'training': True
+                      })
+
+                # Skips the executions when they can't beat the current
+                # top-n. With MBS break, we still run them until a good
+                # one is found to know whether to break.
+                prunable = False
+                if prune and not debug:
+                  # In Pareto searches, the bound is only needed when some
+                  # archived execution is at least as good in the other
+                  # objectives
+                  key = (seq_par_ag_redo, tensor_par_overlap,
+                         weight_offload, activations_offload,
+                         optimizer_offload, fused_act, microbatch_size)
+                  archive = []
+                  if pareto:
+                    if key not in min_costs:
+                      min_costs[key] = OptimalExecution.get_min_costs(
+                        app, syst, exe_jsons)
+                    costs = min_costs[key]
+                    archive = [curr for curr in best + OptimalExecution._archive
+                               if costs is not None and
+                               OptimalExecution.dominates(
+                                 curr[0], curr[2], 0, costs)]
+                  if pareto and not archive:
+                    max_sample_rate = None
+                  elif key not in max_sample_rates:
+                    max_sample_rate = OptimalExecution.get_max_sample_rate(
+                      model, syst, exe_jsons)
+                    if max_sample_rate is None:
+                      # Nothing compiles, lets the executions fail as usual
+                      max_sample_rate = float('inf')
+                    else:
+                      max_sample_rates[key] = max_sample_rate
+                  else:
+                    max_sample_rate = max_sample_rates[key]
+                  if pareto and max_sample_rate is not None:
+                    # Only strictly dominated executions are pruned, they
+                    # can't be in the Pareto front whichever the search order
+                    prunable = any(OptimalExecution.dominates(
+                      curr[0], curr[2], max_sample_rate * (1 + 1e-9), costs)
+                                   for curr in archive)
+                  elif not pareto:
+                    threshold = OptimalExecution.get_threshold(best, top_n)
+                    prunable = max_sample_rate * (1 + 1e-9) < threshold
+
+                for exe_json in exe_jsons:
+                  exe_count += 1
+                  if prunable and (not mbs_break or
+                                   good_exe_count > mbs_break_good):
+                    pruned_exe_count += 1
+                    OptimalExecution.report(pruned=1)
+                    continue
+
+                  if debug:
+                    OptimalExecution.report()
+                  else:
+                    # Neighbouring executions only differ in the networks,
+                    # evaluate() reuses the stages they don't affect
+                    exe = Llm.Execution.from_json(exe_json)
+                    status = model.evaluate(syst, exe)
+                    if status == Llm.kGood:
+                      sample_rate = model.get_sample_rate()
+                      good_exe_count += 1
+                      if pareto:
+                        curr = (sample_rate, exe_json,
+                                OptimalExecution.get_costs(model))
+                        best = OptimalExecution.update_pareto(best, curr)
+                      else:
+                        curr = (sample_rate, exe_json)
+                        best = OptimalExecution.update_list(best, curr,
+                                                            top_n)
+                        OptimalExecution.share_threshold(best, top_n)
+                      OptimalExecution.report(good=1, best=sample_rate)
+                    else:
+                      logging.getLogger().debug(
+                        'JSON:%s\nERROR:%s\n', exe_json,
+                        Llm.kStatusMessages[status])
+                      bad_exe_count += 1
+                      OptimalExecution.report(bad=1)
+                if mbs_break and good_exe_count == mbs_break_good:
+                  break
+    if pareto:
+      OptimalExecution._archive = OptimalExecution.update_pareto(
+        OptimalExecution._archive, best)
+    return (best, exe_count, good_exe_count, bad_exe_count, pruned_exe_count,
+            tp, pp)
+
+  @staticmethod
+  def update_best(current, candidate, quantity, pareto):
+    if pareto:
+      return OptimalExecution.update_pareto(current, candidate)
+    return OptimalExecution.update_list(current, candidate, quantity)
+
+  @staticmethod
+  def get_costs(model):
+    """
+    Returns the objectives of a good execution to minimize in Pareto searches.
+    """
+    return (model.get_mem_tier1_cap_req(), model.get_mem_tier2_cap_req(),
+            model.get_comm_link_time())
+
+  @staticmethod
+  def dominates(sample_rate, costs, other_sample_rate, other_costs):
+    """
+    Whether an execution is at least as good as the other one in every
+    objective. Equal executions dominate each other, so the first one found is
+    kept.
+    """
+    return (sample_rate >= other_sample_rate and
+            costs[0] <= other_costs[0] and costs[1] <= other_costs[1] and
+            costs[2] <= other_costs[2])
+
+  @staticmethod
+  def update_pareto(current, candidate):
+    """
+    Adds the (sample rate, execution, costs) candidates to the Pareto archive,
+    the executions not dominated by another one of the archive. The archive is
+    sorted by decreasing sample rate.
+    """
+    if not isinstance(candidate, list):
+      candidate = [candidate]
+    for curr in candidate:
+      if any(OptimalExecution.dominates(best[0], best[2], curr[0], curr[2])
+             for best in current):
+        continue
+      current = [best for best in current if not OptimalExecution.dominates(
+        curr[0], curr[2], best[0], best[2])]
+      current.append(curr)
+    current.sort(reverse=True, key=lambda x: x[0])
+    return current
+
+  @staticmethod
+  def get_min_costs(app, syst, exe_jsons):
+    """
+    Returns lower bounds of get_costs() for the executions, which must only
+    differ by network assignment, or None if none of them compiles. They share
+    their memory requirements, and their comm link time is bounded by their
+    DP comm link time.
+    """
+    exes = [Llm.Execution.from_json(exe_json) for exe_json in exe_jsons]
+    try:
+      dp_time = Llm.get_min_dp_comm_link_time_estimate(app, syst, exes)
+      if dp_time is None:
+        return None
+      return Llm.get_mem_cap_reqs_estimate(app, syst, exes[0]) + (dp_time,)
+    except Llm.Error:
+      return None
 
   @staticmethod
   def update_list(current, candidate, quantity):
@@ -0,0 +1,141 @@
+"""
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *  https://www.apache.org/licenses/LICENSE-2.0
+ *
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+"""
+
+import math
+import psutil
+
+import calculon
+from calculon.util import arg_int_list, arg_true_false_all
+from calculon.llm import *
+
+
+class ScalingSweep(calculon.CommandLine):
+  NAME = 'llm-scaling-sweep'
+  ALIASES = ['lss']
+
+  @staticmethod
+  def create_parser(subparser):
+    sp = subparser.add_parser(
+      ScalingSweep.NAME, aliases=ScalingSweep.ALIASES,
+      help='run optimal llm execution searches across processor counts')
+    sp.set_defaults(func=ScalingSweep.run_command)
+    sp.add_argument('application', type=str,
+                    help='File path to application configuration')
+    sp.add_argument('num_procs', type=arg_int_list,
+                    help='Numbers of processors, as comma separated values '
+                    'and ranges (\'start:stop\' doubles, \'start:stop:step\' '
+                    'adds)')
+    sp.add_argument('max_batch_size', type=int,
+                    help='Maximum batch size, will be largest multiple of DP')
+    sp.add_argument('datatype', type=str, choices=System.supported_datatypes(),
+                    help='The datatype to use')
+    sp.add_argument('system', type=str,
+                    help='File path to system configuration')
+    sp.add_argument('output', type=str,
+                    help='File path to the output file'
+                    " ('*.csv', '*.csv.gz', '*.json', '*.json.gz')")
+    sp.add_argument('-c', '--cpus', type=int, default=psutil.cpu_count(logical=False),
+                    help='CPUs to use for parallelization')
+    sp.add_argument('-n', '--noneok', action='store_true',
+                    help='Don\'t give failure status when no good execution exists')
+    sp.add_argument('-m', '--mbs-break', action='store_true',
+                    help='Search across MBS and break earlier when possible')
+    sp.add_argument('-l', '--layers', action='store_true',
+                    help='Include layers information in output stats file')
+    sp.add_argument('-f', '--fused_activation', type=arg_true_false_all,
+                    default='true', help='Mode of fused activation')
+    sp.add_argument('--no-tp-overlap', action='store_true',
+                    help='Don\'t allow TP overlap')
+    sp.add_argument('--no-dp-overlap', action='store_true',
+                    help='Don\'t allow DP overlap')
+    sp.add_argument('--no-prune', action='store_true',
+                    help='Don\'t skip executions that can\'t be the best')
+    sp.add_argument('--progress', type=str, default=None,
+                    help='File path to write the progress as JSON lines')
+
+  @staticmethod
+  def run_command(logger, args):
+    app_json = calculon.io.read_json_file(args.application)
+    syst_json = calculon.io.read_json_file(args.system)
+    app = Llm.Application(app_json)
+    syst = System(syst_json, memoize=True)
+    num_procs_list = sorted(set(args.num_procs))
+    assert num_procs_list[0] > 0, 'num_procs must be > 0'
+
+    # The searches of all the processor counts share the block caches
+    cache_key = (args.application, args.system)
+    jobs = [(BatchSearch.get_common(args, app, syst, num_procs,
+                                    args.max_batch_size, args.datatype),
+             OptimalExecution.get_tasks(
+               app, syst, num_procs, args.max_batch_size,
+               args.fused_activation, not args.no_tp_overlap,
+               not args.no_dp_overlap,
+               ScalingSweep.get_parallelisms(app, num_procs)),
+             cache_key)
+            for num_procs in num_procs_list]
+    bests = BatchSearch.search_jobs(logger, jobs, args.cpus, args.progress)
+
+    output = {}
+    for num_procs, best in zip(num_procs_list, bests):
+      if len(best) == 0:
+        logger.info(f'{num_procs} procs: no acceptable configurations found')
+        continue
+      sample_rate, execution = best[0]
+      logger.info(f'{num_procs} procs: best sample rate {sample_rate}')
+      stats = OptimalExecution.get_stats(app, syst, execution, args.layers)
+      OptimalExecution.check_sample_rate(logger, stats, sample_rate)
+      output[num_procs] = {
+        'execution': execution,
+        'stats': stats
+      }
+
+    if len(output) == 0:
+      if not args.noneok:
+        logger.fatal('No acceptable configurations found :(')
+        return -1
+      logger.info('No acceptable configurations found :(')
+      return 0
+
+    logger.info(f'Output: {args.output}')
+    OptimalExecution.write_output(output, args.output)
+    return 0
+
+  @staticmethod
+  def get_parallelisms(app, num_procs):
+    """
+    Returns the same (tensor_par, pipeline_par) pairs as
+    OptimalExecution.get_parallelisms(), from factorizations of the application
+    shared by all processor counts instead of factorizations of num_procs.
+    """
+    for tp in ScalingSweep._get_factors(math.gcd(app.hidden, app.attn_heads)):
+      if num_procs % tp != 0:
+        continue
+      for pp in ScalingSweep._get_factors(app.num_blocks):
+        if pp <= num_procs // tp and num_procs % (tp * pp) == 0:
+          yield tp, pp
+
+  # Factors of the application sizes, see get_parallelisms()
+  _factors = {}
+
+  @staticmethod
+  def _get_factors(value):
+    if value not in ScalingSweep._factors:
+      ScalingSweep._factors[value] = list(Llm._factors(value))
+    return ScalingSweep._factors[value]
+
+
+calculon.CommandLine.register(ScalingSweep)
@@ -0,0 +1,150 @@
+"""
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *  https://www.apache.org/licenses/LICENSE-2.0
+ *
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+"""
+
+import copy
+import gzip
+import itertools
+
+import calculon
+from calculon.util import arg_float_list
+from calculon.llm import *
+
+
+class SystemSweep(calculon.CommandLine):
+  NAME = 'llm-system-sweep'
+  ALIASES = ['lsw']
+
+  # Swept system parameters, see get_variant()
+  kParams = ('mem1_GBps', 'mem2_GiB', 'net_bandwidth', 'net_latency',
+             'tflops')
+
+  @staticmethod
+  def create_parser(subparser):
+    sp = subparser.add_parser(
+      SystemSweep.NAME, aliases=SystemSweep.ALIASES,
+      help='run llm executions on a grid of system variants')
+    sp.set_defaults(func=SystemSweep.run_command)
+    sp.add_argument('application', type=str,
+                    help='File path to application configuration')
+    sp.add_argument('system', type=str,
+                    help='File path to the base system configuration')
+    sp.add_argument('output', type=str,
+                    help='File path to the output file (\'*.csv\', '
+                    '\'*.csv.gz\')')
+    sp.add_argument('executions', type=str, nargs='+',
+                    help='File paths to execution configurations')
+    sp.add_argument('--mem1-GBps', type=arg_float_list, default=[None],
+                    help='Mem tier1 bandwidths')
+    sp.add_argument('--mem2-GiB', type=arg_float_list, default=[None],
+                    help='Mem tier2 capacities')
+    sp.add_argument('--net-bandwidth', type=arg_float_list, default=[None],
+                    help='Network bandwidths in GB/s')
+    sp.add_argument('--net-latency', type=arg_float_list, default=[None],
+                    help='Network latencies in seconds')
+    sp.add_argument('--network', type=int, default=0,
+                    help='Network the bandwidths and latencies apply to')
+    sp.add_argument('--tflops', type=arg_float_list, default=[None],
+                    help='Matrix engine TFLOPS of all the datatypes')
+
+  @staticmethod
+  def run_command(logger, args):
+    app = Llm.Application(calculon.io.read_json_file(args.application))
+    syst_json = calculon.io.read_json_file(args.system)
+    assert 0 <= args.network < len(syst_json['networks']), \
+      f'Invalid network: {args.network}'
+    exes = [Llm.Execution.from_json(calculon.io.read_json_file(filename))
+            for filename in args.executions]
+    grid = list(itertools.product(
+      args.mem1_GBps, args.mem2_GiB, args.net_bandwidth, args.net_latency,
+      args.tflops))
+    logger.info(f'System variants: {len(grid)}')
+
+    rows = SystemSweep.sweep(app, syst_json, exes, grid, args.network)
+
+    logger.info(f'Good runs: {sum(row[-1] == "" for row in rows)} of '
+                f'{len(rows)}')
+    logger.info(f'Output: {args.output}')
+    SystemSweep.write_rows(rows, args.output)
+    return 0
+
+  @staticmethod
+  def get_variant(syst_json, network, mem1_GBps, mem2_GiB, net_bandwidth,
+                  net_latency, tflops):
+    """
+    Returns the system configuration with the given parameters, None keeps the
+    base value.
+    """
+    cfg = copy.deepcopy(syst_json)
+    if mem1_GBps is not None:
+      cfg['mem1']['GBps'] = mem1_GBps
+    if mem2_GiB is not None:
+      cfg['mem2']['GiB'] = mem2_GiB
+    if net_bandwidth is not None:
+      cfg['networks'][network]['bandwidth'] = net_bandwidth
+    if net_latency is not None:
+      cfg['networks'][network]['latency'] = net_latency
+    if tflops is not None:
+      for datatype in cfg['matrix']:
+        cfg['matrix'][datatype]['tflops'] = tflops
+    return cfg
+
+  @staticmethod
+  def sweep(app, syst_json, exes, grid, network):
+    """
+    Returns a row per system variant of the grid and execution: the variant
+    parameters, the execution index, the execution values, the statistics
+    values and the error message, empty for good executions. Each execution
+    has its own model, which moves its block layers from variant to variant so
+    only their times are computed again, see Llm._lookup_block().
+    """
+    models = [Llm(app, None) for _ in exes]
+    num_stats = len(Llm.get_stats_fields())
+    rows = []
+    for params in grid:
+      syst = System(SystemSweep.get_variant(syst_json, network, *params),
+                    memoize=True)
+      for index, (model, exe) in enumerate(zip(models, exes)):
+        row = [pick(value is None, '', value) for value in params]
+        row.append(index)
+        row.extend(exe.get_json().values())
+        status = model.evaluate(syst, exe)
+        if status == Llm.kGood:
+          row.extend(model.get_stats_values())
+          row.append('')
+        else:
+          row.extend([''] * num_stats)
+          row.append(Llm.kStatusMessages[status])
+        rows.append(row)
+    return rows
+
+  @staticmethod
+  def get_fields():
+    return (SystemSweep.kParams + ('execution',) + Llm.Execution.fields() +
+            Llm.get_stats_fields() + ('error',))
+
+  @staticmethod
+  def write_rows(rows, filename):
+    assert filename.endswith('.csv') or filename.endswith('.csv.gz'), \
+      f'Unknown file type: {filename}'
+    opener = gzip.open if filename.endswith('.gz') else open
+    with opener(filename, 'wb') as fd:
+      fd.write(bytes(','.join(SystemSweep.get_fields()) + '\n', 'utf-8'))
+      for row in rows:
+        fd.write(bytes(','.join(str(value) for value in row) + '\n', 'utf-8'))
+
+
+calculon.CommandLine.register(SystemSweep)
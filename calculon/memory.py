@@ -15,6 +15,10 @@
  * limitations under the License.
 """
 
+import bisect
+import numpy as np
+
+
 class Memory:
   """Configuration for a memory."""
 
@@ -22,10 +26,17 @@ class Memory:
     self._capacity = cfg['GiB'] * 1024**3
     self._bandwidth = cfg['GBps'] * 1e9
     self._efficiency = []
+    last = None
     for mbytes, eff in cfg['MB_efficiency']:
       bytes = mbytes * 1e6
       assert 0 < eff <= 1.0
+      if last:
+        assert bytes < last, 'Efficiency bytes must be decreasing'
+      last = bytes
       self._efficiency.append((bytes, eff))
+    # The efficiency curve in increasing bytes order for bisect lookups
+    self._eff_bytes = [bytes for bytes, _ in reversed(self._efficiency)]
+    self._eff_values = [eff for _, eff in reversed(self._efficiency)]
 
   @property
   def capacity(self):
@@ -36,10 +47,17 @@ class Memory:
     return self._bandwidth
 
   def efficiency(self, op_bytes):
-    for bytes, eff in self._efficiency:
-      if op_bytes >= bytes:
-        return eff
-    assert False, f'OP bytes {op_bytes} wasn\'t covered'
+    index = bisect.bisect_right(self._eff_bytes, op_bytes) - 1
+    assert index >= 0, f'OP bytes {op_bytes} wasn\'t covered'
+    return self._eff_values[index]
 
   def throughput(self, op_bytes):
     return self._bandwidth * self.efficiency(op_bytes)
+
+  def throughputs(self, op_bytes):
+    """
+    Returns throughput() for an array of op bytes.
+    """
+    index = np.searchsorted(self._eff_bytes, op_bytes, side='right') - 1
+    assert np.all(index >= 0), f'OP bytes {np.min(op_bytes)} wasn\'t covered'
+    return self._bandwidth * np.array(self._eff_values)[index]
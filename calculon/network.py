@@ -24,6 +24,9 @@ class Network:
   kNetOps = set(['p2p', 'reduce_scatter', 'all_gather', 'all_reduce'])
   kCollectives = set(['reduce_scatter', 'all_gather', 'all_reduce'])
 
+  # Maximum number of memoized times per network, see time()
+  kMemoSize = 65536
+
   class Op:
     def __init__(self, scalar, offset):
       self.scalar = scalar
@@ -58,6 +61,10 @@ class Network:
     self._proc_usage = cfg['processor_usage']
     assert self._proc_usage >= 0.0 and self._proc_usage < 1.0
 
+    # Effective bandwidth and memoized times of time()
+    self._eff_bw = self._bw * self._eff
+    self._times = {}
+
   @property
   def size(self):
     return self._size
@@ -81,6 +88,17 @@ class Network:
     Returns:
       time (float)    : time needed for operation
     """
+    key = (op, op_size, comm_size)
+    time = self._times.get(key)
+    if time is None:
+      time = self._compute_time(op, op_size, comm_size)
+      if len(self._times) >= Network.kMemoSize:
+        self._times.clear()
+      self._times[key] = time
+    return time
+
+  def _compute_time(self, op, op_size, comm_size):
+    # Arguments are only validated when the time isn't memoized
     if op not in Network.kCollectives:
       assert comm_size == 2
     else:
@@ -88,12 +106,14 @@ class Network:
     assert op in Network.kNetOps
     assert op_size >= 0
 
+    net_op = self._ops[op]
+
     # Scales the op_size by the scalar
-    op_size *= self._ops[op].scalar
+    op_size *= net_op.scalar
 
     # Scales the op_size by the op offset
     chunk_size = 1 / comm_size * op_size
-    op_size += chunk_size * self._ops[op].offset
+    op_size += chunk_size * net_op.offset
 
     # Calculates time based on raw bandwidth,  bandwidth efficiency, and latency
-    return self._latency + op_size / (self._bw * self._eff)
+    return self._latency + op_size / self._eff_bw
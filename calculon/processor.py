@@ -14,6 +14,9 @@
  * See the License for the specific language governing permissions and
  * limitations under the License.
 """
+import bisect
+import numpy as np
+
 
 class Processor:
   """Configuration for a processing engine."""
@@ -33,16 +36,34 @@ class Processor:
           assert flops < last
         last = flops
         self._datatypes[datatype]['efficiency'].append((flops, eff))
+      # The efficiency curve in increasing flops order for bisect lookups
+      curve = self._datatypes[datatype]['efficiency']
+      self._datatypes[datatype]['eff_flops'] = [
+        flops for flops, _ in reversed(curve)]
+      self._datatypes[datatype]['eff_values'] = [
+        eff for _, eff in reversed(curve)]
 
   def flops(self, datatype):
     return self._datatypes[datatype]['flops']
 
   def efficiency(self, datatype, op_flops):
-    for flops, eff in self._datatypes[datatype]['efficiency']:
-      if op_flops >= flops:
-        return eff
-    assert False, f'{op_flops} wasn\'t covered in {datatype} efficiency curve'
+    curve = self._datatypes[datatype]
+    index = bisect.bisect_right(curve['eff_flops'], op_flops) - 1
+    assert index >= 0, \
+      f'{op_flops} wasn\'t covered in {datatype} efficiency curve'
+    return curve['eff_values'][index]
 
   def throughput(self, datatype, op_flops):
     assert datatype in self._datatypes, f'Unsupported type: {datatype}'
     return self.flops(datatype) * self.efficiency(datatype, op_flops)
+
+  def throughputs(self, datatype, op_flops):
+    """
+    Returns throughput() for an array of op flops.
+    """
+    assert datatype in self._datatypes, f'Unsupported type: {datatype}'
+    curve = self._datatypes[datatype]
+    index = np.searchsorted(curve['eff_flops'], op_flops, side='right') - 1
+    assert np.all(index >= 0), \
+      f'{np.min(op_flops)} wasn\'t covered in {datatype} efficiency curve'
+    return self.flops(datatype) * np.array(curve['eff_values'])[index]
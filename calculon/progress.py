@@ -0,0 +1,178 @@
+"""
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *  https://www.apache.org/licenses/LICENSE-2.0
+ *
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+"""
+
+import datetime
+import json
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+
+
+class Progress:
+  """
+  Reports the progress of a parallel search. Workers count their executions
+  with a Progress.Reporter which sends them on the queue, a thread of the
+  parent process periodically logs the counts, throughput and ETA, and
+  optionally writes them as JSON lines to a file.
+  """
+
+  class Reporter:
+    """Counts the executions of a worker, see Progress."""
+
+    # Minimum number of seconds between messages of a worker
+    kSeconds = 1.0
+
+    def __init__(self, progress_queue):
+      self._queue = progress_queue
+      self._pid = os.getpid()
+      self._executions = 0
+      self._good = 0
+      self._bad = 0
+      self._pruned = 0
+      self._best = None
+      self._sent_time = time.monotonic()
+
+    def add(self, good=0, bad=0, pruned=0, best=None):
+      """Counts one execution."""
+      self._executions += 1
+      self._good += good
+      self._bad += bad
+      self._pruned += pruned
+      if best is not None and (self._best is None or best > self._best):
+        self._best = best
+      if time.monotonic() - self._sent_time >= Progress.Reporter.kSeconds:
+        self.flush()
+
+    def flush(self):
+      if self._executions > 0:
+        self._queue.put(('count', self._pid, self._executions, self._good,
+                         self._bad, self._pruned, self._best))
+        self._executions = 0
+        self._good = 0
+        self._bad = 0
+        self._pruned = 0
+      self._sent_time = time.monotonic()
+
+  # Number of seconds between reports
+  kSeconds = 10
+
+  def __init__(self, logger, total, filename=None, best=None):
+    self._logger = logger
+    self._total = total
+    self._filename = filename
+    self._executions = 0
+    self._good = 0
+    self._bad = 0
+    self._pruned = 0
+    self._best = best
+    # Executions of each worker, in total and at the last report
+    self._workers = {}
+    self._start_time = None
+    self._report_time = None
+    self._fd = None
+    self._thread = None
+    self.queue = mp.Queue()
+
+  def start(self):
+    self._start_time = time.monotonic()
+    self._report_time = self._start_time
+    if self._filename:
+      self._fd = open(self._filename, 'w', encoding='utf-8')
+    self._thread = threading.Thread(target=self._run, daemon=True)
+    self._thread.start()
+
+  def skip(self, count):
+    """Removes executions that won't run from the total."""
+    self.queue.put(('skip', count))
+
+  def stop(self):
+    """Stops after the messages sent so far, with a last report."""
+    self.queue.put(None)
+    self._thread.join()
+    self._report()
+    if self._fd is not None:
+      self._fd.close()
+
+  def _run(self):
+    while True:
+      timeout = self._report_time + Progress.kSeconds - time.monotonic()
+      try:
+        message = self.queue.get(timeout=max(timeout, 0))
+      except queue.Empty:
+        message = ()
+      if message is None:
+        break
+      if message and message[0] == 'skip':
+        self._total -= message[1]
+      elif message:
+        _, pid, executions, good, bad, pruned, best = message
+        self._workers.setdefault(pid, [0, 0])[0] += executions
+        self._executions += executions
+        self._good += good
+        self._bad += bad
+        self._pruned += pruned
+        if best is not None and (self._best is None or best > self._best):
+          self._best = best
+      if time.monotonic() - self._report_time >= Progress.kSeconds:
+        self._report()
+
+  def _report(self):
+    now = time.monotonic()
+    elapsed = now - self._start_time
+    interval = now - self._report_time
+    self._report_time = now
+    calc_rate = self._executions / elapsed if elapsed > 0 else 0.0
+    worker_rates = {}
+    for pid, counts in self._workers.items():
+      worker_rates[pid] = (counts[0] - counts[1]) / interval \
+        if interval > 0 else 0.0
+      counts[1] = counts[0]
+    remaining = max(self._total - self._executions, 0)
+    eta = remaining / calc_rate if calc_rate > 0 else None
+    percent = 100 * self._executions / self._total if self._total > 0 \
+      else 100.0
+
+    line = (f'Progress: {self._executions}/{self._total} ({percent:.1f}%) '
+            f'good {self._good} bad {self._bad}')
+    if self._pruned > 0:
+      line += f' pruned {self._pruned}'
+    if self._best is not None:
+      line += f' best {self._best:.2f}'
+    line += f' {calc_rate:.2f} calcs/sec'
+    if worker_rates:
+      line += (f' (workers {min(worker_rates.values()):.2f} to '
+               f'{max(worker_rates.values()):.2f})')
+    if eta is not None:
+      line += f' ETA {datetime.timedelta(seconds=round(eta))}'
+    self._logger.info(line)
+
+    if self._fd is not None:
+      self._fd.write(json.dumps({
+        'elapsed': elapsed,
+        'executions': self._executions,
+        'total': self._total,
+        'good': self._good,
+        'bad': self._bad,
+        'pruned': self._pruned,
+        'best_sample_rate': self._best,
+        'calc_rate': calc_rate,
+        'worker_calc_rates': worker_rates,
+        'eta': eta
+      }) + '\n')
+      self._fd.flush()
@@ -15,6 +15,8 @@
  * limitations under the License.
 """
 
+import numpy as np
+
 from .memory import *
 from .network import *
 from .processor import *
@@ -29,11 +31,14 @@ class System:
     'bfloat16' : 2
   }
 
+  # Maximum number of memoized throughputs, see _memo_throughput()
+  kMemoSize = 65536
+
   @staticmethod
   def supported_datatypes():
     return list(System.TypeSizes.keys())
 
-  def __init__(self, cfg):
+  def __init__(self, cfg, memoize=False):
     self.cfg = cfg
     self.matrix = Processor(cfg['matrix'])
     self.vector = Processor(cfg['vector'])
@@ -47,6 +52,10 @@ class System:
 
     self.networks = [Network(n) for n in cfg['networks']]
 
+    # Optional memo of the throughputs keyed by (engine, datatype, size),
+    # searches evaluate the same layer sizes many times
+    self._throughputs = {} if memoize else None
+
   @property
   def num_networks(self):
     return len(self.networks)
@@ -59,23 +68,67 @@ class System:
     assert datatype in System.TypeSizes, f'Unsupported data type: {datatype}'
     self.datatype = datatype
 
+  def _get_throughput(self, engine, datatype, size):
+    if engine == 'matrix':
+      return self.matrix.throughput(datatype, size)
+    elif engine == 'vector':
+      return self.vector.throughput(datatype, size)
+    elif engine == 'mem1':
+      return self.mem1.throughput(size)
+    elif engine == 'mem2':
+      return self.mem2.throughput(size)
+    assert False, f'Bad engine: {engine}'
+
+  def _memo_throughput(self, engine, datatype, size):
+    if self._throughputs is None:
+      return self._get_throughput(engine, datatype, size)
+    key = (engine, datatype, size)
+    throughput = self._throughputs.get(key)
+    if throughput is None:
+      throughput = self._get_throughput(engine, datatype, size)
+      if len(self._throughputs) >= System.kMemoSize:
+        self._throughputs.clear()
+      self._throughputs[key] = throughput
+    return throughput
+
   def get_matrix_throughput(self, flops):
-    return self.matrix.throughput(self.datatype, flops)
+    return self._memo_throughput('matrix', self.datatype, flops)
 
   def get_vector_throughput(self, flops):
-    return self.vector.throughput(self.datatype, flops)
+    return self._memo_throughput('vector', self.datatype, flops)
 
   def get_mem1_throughput(self, size):
-    return self.mem1.throughput(size)
+    return self._memo_throughput('mem1', None, size)
 
   def get_mem2_throughput(self, size):
-    return self.mem2.throughput(size)
+    return self._memo_throughput('mem2', None, size)
+
+  def get_matrix_throughputs(self, flops):
+    return self.matrix.throughputs(self.datatype, flops)
+
+  def get_vector_throughputs(self, flops):
+    return self.vector.throughputs(self.datatype, flops)
+
+  def get_mem1_throughputs(self, sizes):
+    return self.mem1.throughputs(sizes)
 
   def compute_offload_time(self, size):
-    return size / self.mem2.throughput(size)
+    return size / self.get_mem2_throughput(size)
+
+  def compute_offload_times(self, sizes):
+    return sizes / self.mem2.throughputs(sizes)
 
   def get_processing_time(self, flops_time, mem_time):
     if self.proc_mode == 'roofline':
       return max(flops_time, mem_time)
     elif self.proc_mode == 'no_overlap':
       return flops_time + mem_time
+
+  def get_processing_times(self, flops_times, mem_times):
+    """
+    Returns get_processing_time() for arrays of times.
+    """
+    if self.proc_mode == 'roofline':
+      return np.maximum(flops_times, mem_times)
+    elif self.proc_mode == 'no_overlap':
+      return flops_times + mem_times
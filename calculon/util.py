@@ -81,3 +81,34 @@ def arg_true_false_all(arg):
     return [False, True]
   else:
     raise argparse.ArgumentTypeError(f'Invalid true/false/all: {arg}')
+
+
+def arg_int_list(arg):
+  """
+  Parses comma separated integers and ranges, 'start:stop' doubles from start
+  to stop and 'start:stop:step' adds step, both include stop.
+  """
+  values = []
+  try:
+    for item in arg.split(','):
+      bounds = [int(value) for value in item.split(':')]
+      if len(bounds) == 1:
+        values.append(bounds[0])
+        continue
+      if len(bounds) > 3 or bounds[0] <= 0 or (
+          len(bounds) == 3 and bounds[2] <= 0):
+        raise ValueError(item)
+      value = bounds[0]
+      while value <= bounds[1]:
+        values.append(value)
+        value = value + bounds[2] if len(bounds) == 3 else value * 2
+  except ValueError as exc:
+    raise argparse.ArgumentTypeError(f'Invalid integer list: {arg}') from exc
+  return values
+
+
+def arg_float_list(arg):
+  try:
+    return [float(value) for value in arg.split(',')]
+  except ValueError as exc:
+    raise argparse.ArgumentTypeError(f'Invalid number list: {arg}') from exc
@@ -49,8 +49,40 @@ echo -e "### Testing llm-optimal-execution (float8) (using -m)"
 ./bin/calculon loe models/turing-530B.json 5128 2520 float8 systems/h100_80g_nvl8.json /tmp/calculon_530B_fp8.csv.gz -t 10 -m
 echo -e "\n\n"
 
+# Llm scaling sweep
+echo -e "### Testing llm-scaling-sweep"
+./bin/calculon lss models/megatron-126M.json 8:32 32 float16 systems/a100_80e.json /tmp/calculon_126M_scaling.csv -m
+echo -e "\n\n"
+
+# Llm local search
+echo -e "### Testing llm-local-search"
+./bin/calculon lls models/megatron-126M.json 32 64 float16 systems/a100_80e.json /tmp/calculon_126M_local.json -e 1000 --exhaustive
+echo -e "\n\n"
+
+# Llm batch search
+echo -e "### Testing llm-batch-search"
+cat > /tmp/calculon_manifest.json << EOF
+[
+  {"name": "126M_a100_16", "application": "models/megatron-126M.json", "system": "systems/a100_80e.json",
+   "num_procs": 16, "max_batch_size": 32, "datatype": "float16"},
+  {"name": "126M_h100_16", "application": "models/megatron-126M.json", "system": "systems/h100_80g_nvl8.json",
+   "num_procs": 16, "max_batch_size": 32, "datatype": "float8"}
+]
+EOF
+./bin/calculon lbs /tmp/calculon_manifest.json /tmp/calculon_126M_batch.csv -m
+echo -e "\n\n"
+
+# Llm system sweep
+echo -e "### Testing llm-system-sweep"
+./bin/calculon lsw models/megatron-22B.json systems/a100_80e.json /tmp/calculon_22B_systems.csv examples/3072_t4_p64_d12_mbs4_full.json --mem1-GBps 1024,2048 --net-bandwidth 100,300 --tflops 312,624
+echo -e "\n\n"
+
 # Llm all executions
 echo -e "### Testing llm-all-executions (float8)"
 ./bin/calculon lae models/turing-530B.json 5128 2520 float8 systems/h100_80g_nvl8.json /tmp/calculon_530B_fp8_all.csv.gz
 echo -e "\n\n"
 
+echo -e "### Testing llm-all-executions (batch engine)"
+./bin/calculon lae models/megatron-126M.json 8 16 float16 systems/a100_80e.json /tmp/calculon_126M_all.csv -e batch
+echo -e "\n\n"
+
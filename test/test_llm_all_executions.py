@@ -0,0 +1,209 @@
+"""
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *  https://www.apache.org/licenses/LICENSE-2.0
+ *
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+"""
+import argparse
+import calculon
+import collections
+import gzip
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from calculon.llm import *
+from calculon.util import pick
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args(command, *args):
+  parser = argparse.ArgumentParser()
+  command.create_parser(parser.add_subparsers())
+  return parser.parse_args([command.NAME] + list(args))
+
+
+def nested_executions(app, syst, num_procs, max_batch_size, datatype,
+                      fused_activation):
+  # The executions of llm-all-executions as one nested loop
+  has_mem2 = syst.mem2.capacity > 0
+  num_nets = syst.num_networks
+  for tp in Llm.get_all_tensor_parallelisms(
+      num_procs, app.hidden, app.attn_heads):
+    for pp in Llm.get_all_pipeline_parallelisms(num_procs, tp, app.num_blocks):
+      dp = Llm.get_data_parallelism(num_procs, tp, pp)
+      for ppint in Llm.get_valid_pipeline_interleavings(app.num_blocks, pp):
+        batch_size = AllExecutions.get_batch_size(dp, max_batch_size)
+        if batch_size is None:
+          continue
+        for (activation_recompute, optimizer_sharding, tensor_par_comm_type,
+             seq_par_ag_redo, data_par_overlap, tensor_par_overlap,
+             weight_offload, activations_offload, optimizer_offload,
+             fused_act, microbatch_size, tn, pn, dn) in itertools.product(
+               ['full', 'attn_only', 'none'],
+               pick(dp>1, [True, False], [False]),
+               ['ar', 'p2p_rs_ag', 'rs_ag'], [True, False],
+               pick(dp>1, [True, False], [False]),
+               pick(tp>1, ['none', 'ring', 'pipe'], ['none']),
+               pick(has_mem2, [True, False], [False]),
+               pick(has_mem2, [True, False], [False]),
+               pick(has_mem2, [True, False], [False]), fused_activation,
+               Llm.get_valid_microbatch_sizes(
+                 app.seq_size, tp, dp, batch_size, pp),
+               pick(tp>1, range(num_nets), [0]),
+               pick(pp>1, range(num_nets), [0]),
+               pick(dp>1, range(num_nets), [0])):
+          if seq_par_ag_redo and not Llm.can_redo_ag(tensor_par_comm_type,
+                                                     activation_recompute):
+            continue
+          if activations_offload and activation_recompute == 'full':
+            continue
+          yield (num_procs, tp, pp, dp, tn, pn, dn, batch_size,
+                 microbatch_size, datatype, fused_act, 'multihead',
+                 activation_recompute, ppint, optimizer_sharding,
+                 tensor_par_comm_type, tensor_par_overlap, seq_par_ag_redo,
+                 data_par_overlap, weight_offload, activations_offload,
+                 optimizer_offload, True)
+
+
+def fail_writer(*args):
+  raise RuntimeError('writer failure')
+
+
+def fail_unit(*args):
+  raise RuntimeError('worker failure')
+
+
+def read_output(output):
+  opener = gzip.open if output.endswith('.gz') else open
+  with opener(output, 'rb') as fd:
+    return fd.read()
+
+
+class AllExecutionsTestCase(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.mkdtemp()
+    self.logger = logging.getLogger('test')
+    # Without offloading memory to keep the search small
+    syst_json = calculon.io.read_json_file(
+      os.path.join(ROOT, 'systems', 'a100_80e.json'))
+    syst_json['mem2']['GiB'] = 0
+    self.system = os.path.join(self.tmp, 'system.json')
+    calculon.io.write_json_file(syst_json, self.system)
+
+  def tearDown(self):
+    shutil.rmtree(self.tmp)
+
+  def lae_args(self, output, *args, max_batch_size=8):
+    return parse_args(
+      AllExecutions, os.path.join(ROOT, 'models', 'megatron-126M.json'), '4',
+      str(max_batch_size), 'float16', self.system, output, '-c', '1', *args)
+
+  def test_missing_output_directory(self):
+    output = os.path.join(self.tmp, 'missing', 'out.csv')
+    self.assertEqual(AllExecutions.run_command(
+      self.logger, self.lae_args(output)), -1)
+    self.assertFalse(os.path.exists(output))
+
+  def test_failing_writer(self):
+    # The workers fill the queue of the dead writer, the search must stop
+    # instead of waiting for it
+    output = os.path.join(self.tmp, 'out.csv')
+    write_results = AllExecutions.write_results
+    AllExecutions.write_results = fail_writer
+    try:
+      status = AllExecutions.run_command(self.logger, self.lae_args(output))
+    finally:
+      AllExecutions.write_results = write_results
+    self.assertEqual(status, -1)
+
+  def test_failing_worker(self):
+    # The error is raised once the writer is stopped, else the writer would
+    # wait forever for the end of the results
+    output = os.path.join(self.tmp, 'out.csv')
+    with mock.patch.object(AllExecutions, 'unit_executions', fail_unit):
+      with self.assertRaisesRegex(RuntimeError, 'worker failure'):
+        AllExecutions.run_command(self.logger, self.lae_args(output))
+    self.assertEqual(mp.active_children(), [])
+
+  def test_resume(self):
+    reference = os.path.join(self.tmp, 'reference.csv')
+    self.assertEqual(AllExecutions.run_command(
+      self.logger, self.lae_args(reference)), 0)
+    expected = read_output(reference)
+
+    write_pickle_file = calculon.io.write_pickle_file
+    def interrupt_writer(data, filename):
+      # Saves a few checkpoints, then dies after writing part of a unit
+      write_pickle_file(data, filename)
+      if len(data['done']) == 3:
+        with open(filename[:-len('.ckpt')], 'ab') as fd:
+          fd.write(b'partial,row')
+        os._exit(1)
+
+    for output in [os.path.join(self.tmp, 'out.csv'),
+                   os.path.join(self.tmp, 'out.csv.gz')]:
+      with mock.patch.object(AllExecutions, 'kCheckpointSeconds', 0), \
+           mock.patch.object(calculon.io, 'write_pickle_file',
+                             interrupt_writer):
+        self.assertEqual(AllExecutions.run_command(
+          self.logger, self.lae_args(output)), -1)
+      self.assertTrue(os.path.exists(output + '.ckpt'))
+
+      # A checkpoint of another search is rejected
+      self.assertEqual(AllExecutions.run_command(
+        self.logger, self.lae_args(output, '--resume', max_batch_size=16)),
+                       -1)
+
+      # The output is truncated to the checkpoint and appended to, a gzip
+      # output gets a new member
+      with self.assertLogs(self.logger, logging.INFO) as logs:
+        self.assertEqual(AllExecutions.run_command(
+          self.logger, self.lae_args(output, '--resume')), 0)
+      self.assertIn('INFO:test:Resuming: 3 of 539 units done', logs.output)
+      self.assertFalse(os.path.exists(output + '.ckpt'))
+      self.assertEqual(read_output(output), expected)
+
+  def test_engines_write_same_file(self):
+    outputs = []
+    for engine in ['llm', 'batch']:
+      outputs.append(os.path.join(self.tmp, f'{engine}.csv'))
+      self.assertEqual(AllExecutions.run_command(
+        self.logger, self.lae_args(outputs[-1], '-e', engine)), 0)
+    self.assertEqual(read_output(outputs[0]), read_output(outputs[1]))
+
+  def test_units_cover_executions(self):
+    app = Llm.Application(calculon.io.read_json_file(
+      os.path.join(ROOT, 'models', 'megatron-126M.json')))
+    for name in ['a100_80e.json', 'h100_80g_nvl8.json']:
+      syst = System(calculon.io.read_json_file(
+        os.path.join(ROOT, 'systems', name)))
+      fused_activation = [True, False]
+      executions = collections.Counter()
+      for unit in AllExecutions.all_units(app, 4, 8):
+        unit_executions = list(AllExecutions.unit_executions(
+          app, syst, 4, 'float16', fused_activation, unit))
+        self.assertEqual(len(unit_executions), AllExecutions.get_unit_size(
+          app, syst, fused_activation, unit))
+        executions.update(unit_executions)
+      expected = collections.Counter(nested_executions(
+        app, syst, 4, 8, 'float16', fused_activation))
+      self.assertEqual(executions, expected)
+      self.assertEqual(max(expected.values()), 1)
@@ -0,0 +1,62 @@
+"""
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *  https://www.apache.org/licenses/LICENSE-2.0
+ *
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+"""
+
+import calculon
+import logging
+import os
+import unittest
+
+from calculon.llm import *
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class LlmBatchTestCase(unittest.TestCase):
+  def test_batch_matches_model(self):
+    app = Llm.Application(calculon.io.read_json_file(
+      os.path.join(ROOT, 'models', 'megatron-126M.json')))
+    # Small memory so that many executions don't fit
+    cfg = calculon.io.read_json_file(
+      os.path.join(ROOT, 'systems', 'a100_80e.json'))
+    cfg['mem1']['GiB'] = 2
+    syst = System(cfg)
+
+    executions = list(AllExecutions.all_executions(
+      app, syst, 4, 8, 'float16', [False, True]))[::211]
+    batch_stats = LlmBatch(app, syst).run(executions)
+    self.assertEqual(len(batch_stats), len(executions))
+
+    block_cache = {}
+    good = 0
+    for execution, values in zip(executions, batch_stats):
+      model = Llm(app, logging.Logger('sub'), block_cache)
+      try:
+        exe = Llm.Execution(*execution)
+        Llm.check_mem_caps_estimate(app, syst, exe)
+        model.compile(syst, exe)
+        model.run(syst)
+      except Llm.Error:
+        self.assertIsNone(values, execution)
+        continue
+      self.assertIsNotNone(values, execution)
+      good += 1
+      for field, expected, value in zip(
+          Llm.get_stats_fields(), model.get_stats_values(), values):
+        self.assertEqual(expected, value, f'{field} for {execution}')
+    self.assertGreater(good, 0)
+    self.assertLess(good, len(executions))
@@ -0,0 +1,105 @@
+"""
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *  https://www.apache.org/licenses/LICENSE-2.0
+ *
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+"""
+import argparse
+import calculon
+import logging
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+import unittest
+
+from calculon.llm import *
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class BatchSearchTestCase(unittest.TestCase):
+  kParams = ['tp', 'pp', 'dp', 'ppint', 'batch_size', 'activation_recompute',
+             'optimizer_sharding', 'tensor_par_comm_type']
+
+  def test_search_jobs(self):
+    args = type('Args', (), {
+      'fused_activation': [True], 'mbs_break': False, 'no_tp_overlap': False,
+      'no_dp_overlap': False, 'no_prune': False})()
+    jobs = []
+    for model, system, num_procs, max_batch_size in [
+        ('megatron-126M.json', 'a100_80e.json', 8, 16),
+        ('megatron-126M.json', 'a100_80e.json', 4, 8),
+        ('megatron-126M.json', 'h100_80g_nvl8.json', 8, 16)]:
+      app = Llm.Application(calculon.io.read_json_file(
+        os.path.join(ROOT, 'models', model)))
+      syst_json = calculon.io.read_json_file(
+        os.path.join(ROOT, 'systems', system))
+      syst_json['mem2']['GiB'] = 0
+      syst = System(syst_json)
+      common = BatchSearch.get_common(args, app, syst, num_procs,
+                                      max_batch_size, 'float16')
+      tasks = OptimalExecution.get_tasks(app, syst, num_procs, max_batch_size,
+                                         [True], True, True)
+      jobs.append((common, tasks, (model, system)))
+
+    bests = BatchSearch.search_jobs(logging.getLogger(), jobs, 2)
+
+    # Each job has the same best as its own sequential search
+    for (common, tasks, _), best in zip(jobs, bests):
+      expected = []
+      OptimalExecution.init_worker(mp.Value('d', 0.0))
+      try:
+        for params, num_outer, _ in tasks:
+          search = OptimalExecution.search(
+            **dict(zip(self.kParams, params)), outer_range=(0, num_outer),
+            **common)
+          expected = OptimalExecution.update_list(expected, search[0], 1)
+      finally:
+        OptimalExecution.init_worker(None)
+      self.assertGreater(len(expected), 0)
+      self.assertEqual(best, expected)
+
+  def test_failed_job_keeps_output(self):
+    tmp = tempfile.mkdtemp()
+    try:
+      syst_json = calculon.io.read_json_file(
+        os.path.join(ROOT, 'systems', 'a100_80e.json'))
+      syst_json['mem2']['GiB'] = 0
+      good_system = os.path.join(tmp, 'good.json')
+      calculon.io.write_json_file(syst_json, good_system)
+      # Nothing fits in this memory
+      syst_json['mem1']['GiB'] = 0.001
+      bad_system = os.path.join(tmp, 'bad.json')
+      calculon.io.write_json_file(syst_json, bad_system)
+      manifest = os.path.join(tmp, 'manifest.json')
+      calculon.io.write_json_file([
+        {'name': 'good', 'application': os.path.join(
+          ROOT, 'models', 'megatron-126M.json'), 'system': good_system,
+         'num_procs': 4, 'max_batch_size': 8, 'datatype': 'float16'},
+        {'name': 'bad', 'application': os.path.join(
+          ROOT, 'models', 'megatron-126M.json'), 'system': bad_system,
+         'num_procs': 4, 'max_batch_size': 8, 'datatype': 'float16'}],
+                                  manifest)
+      output = os.path.join(tmp, 'output.json')
+
+      parser = argparse.ArgumentParser()
+      BatchSearch.create_parser(parser.add_subparsers())
+      args = parser.parse_args([BatchSearch.NAME, manifest, output, '-c', '1',
+                                '-m'])
+      self.assertEqual(BatchSearch.run_command(logging.getLogger(), args), -1)
+      self.assertEqual(list(calculon.io.read_json_file(output).keys()),
+                       ['good'])
+    finally:
+      shutil.rmtree(tmp)
@@ -0,0 +1,79 @@
+"""
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *  https://www.apache.org/licenses/LICENSE-2.0
+ *
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+"""
+import calculon
+import itertools
+import os
+import unittest
+
+from calculon.llm import Llm
+from calculon.llm.block_arrays import BlockArrays
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class LlmBlockArraysTestCase(unittest.TestCase):
+  def test_array_stats_match_generated(self):
+    app = Llm.Application(calculon.io.read_json_file(
+      os.path.join(ROOT, 'models', 'megatron-126M.json')))
+    syst = calculon.System(calculon.io.read_json_file(
+      os.path.join(ROOT, 'systems', 'a100_80e.json')))
+    base = calculon.io.read_json_file(
+      os.path.join(ROOT, 'examples', '3072_t4_p64_d12_mbs4_full.json'))
+
+    generated = []
+    arrays = []
+    for tp, training, recompute, comm, overlap, redo, fused in \
+        itertools.product(
+          [1, 2, 8], [True, False], ['full', 'attn_only', 'none'],
+          ['ar', 'p2p_rs_ag', 'rs_ag'], ['none', 'pipe', 'ring'],
+          [True, False], [True, False]):
+      if not training and recompute != 'none':
+        continue
+      if tp == 1 and overlap != 'none':
+        continue
+      if redo and (comm != 'rs_ag' or recompute == 'full'):
+        continue
+      exe_json = dict(base)
+      exe_json.update({
+        'num_procs': 8, 'tensor_par': tp, 'pipeline_par': 1,
+        'data_par': 8 // tp, 'batch_size': 8, 'microbatch_size': 1,
+        'datatype': 'float16', 'training': training,
+        'activation_recompute': recompute, 'tensor_par_comm_type': comm,
+        'tensor_par_overlap': overlap, 'seq_par_ag_redo': redo,
+        'fused_activation': fused, 'optimizer_sharding': False})
+      exe = Llm.Execution.from_json(exe_json)
+
+      model = Llm(app, None)
+      model.compile(syst, exe)
+      model._compute_block_stats()
+      generated.append(model)
+
+      model = Llm(app, None)
+      model.compile(syst, exe)
+      arrays.append(model)
+
+    # Blocks of different sizes are padded together
+    block = BlockArrays([(model._llm_block, model.exe.training)
+                         for model in arrays])
+    self.assertEqual(block['fw_flops'].shape[0], len(arrays))
+    Llm._run_blocks_stats(arrays)
+    for expected, model in zip(generated, arrays):
+      self.assertEqual(
+        [getattr(model, name) for name in Llm._kBlockStats],
+        [getattr(expected, name) for name in Llm._kBlockStats])
+    self.assertGreater(len(arrays), 50)
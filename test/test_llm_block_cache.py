@@ -0,0 +1,106 @@
+"""
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *  https://www.apache.org/licenses/LICENSE-2.0
+ *
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+"""
+import calculon
+import logging
+import os
+import unittest
+
+from calculon.llm import *
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class LlmBlockCacheTestCase(unittest.TestCase):
+  def test_cached_blocks_match_model(self):
+    app = Llm.Application(calculon.io.read_json_file(
+      os.path.join(ROOT, 'models', 'megatron-126M.json')))
+    syst = System(calculon.io.read_json_file(
+      os.path.join(ROOT, 'systems', 'a100_80e.json')))
+
+    block_cache = {}
+    checked = 0
+    executions = AllExecutions.all_executions(
+      app, syst, 4, 8, 'float16', [True])
+    for index, execution in enumerate(executions):
+      if index % 211 != 0:
+        continue
+      stats = []
+      for cache in [None, block_cache]:
+        model = Llm(app, logging.Logger('sub'), cache)
+        try:
+          model.compile(syst, Llm.Execution(*execution))
+          model.run(syst)
+          stats.append(model.get_stats_json(True))
+        except Llm.Error as ex:
+          stats.append(str(ex))
+      self.assertEqual(stats[0], stats[1])
+      checked += 1
+    self.assertGreater(checked, 0)
+    self.assertLess(len(block_cache), checked)
+
+  def test_recompiled_model_matches_model(self):
+    app = Llm.Application(calculon.io.read_json_file(
+      os.path.join(ROOT, 'models', 'megatron-126M.json')))
+    syst = System(calculon.io.read_json_file(
+      os.path.join(ROOT, 'systems', 'a100_80e.json')))
+
+    reused = Llm(app, logging.Logger('sub'))
+    checked = 0
+    executions = AllExecutions.all_executions(
+      app, syst, 4, 8, 'float16', [False])
+    for index, execution in enumerate(executions):
+      # Consecutive executions often share the block key
+      if index % 97 > 1:
+        continue
+      stats = []
+      for model in [Llm(app, logging.Logger('sub')), reused]:
+        try:
+          model.recompile(syst, Llm.Execution(*execution))
+          model.run(syst)
+          stats.append(model.get_stats_json(True))
+        except Llm.Error as ex:
+          stats.append(str(ex))
+      self.assertEqual(stats[0], stats[1])
+      checked += 1
+    self.assertGreater(checked, 0)
+
+  def test_recompiled_model_changes_system(self):
+    app = Llm.Application(calculon.io.read_json_file(
+      os.path.join(ROOT, 'models', 'megatron-126M.json')))
+    exe_json = calculon.io.read_json_file(
+      os.path.join(ROOT, 'examples', '3072_t4_p64_d12_mbs4_full.json'))
+    exe_json.update({'num_procs': 8, 'pipeline_par': 2, 'data_par': 1,
+                     'batch_size': 8, 'microbatch_size': 1,
+                     'optimizer_sharding': False})
+    exe = Llm.Execution.from_json(exe_json)
+
+    # The same execution on other systems matches a fresh compile() and run(),
+    # with and without a block cache shared by the systems
+    for cache in [None, {}]:
+      reused = Llm(app, logging.Logger('sub'), cache)
+      for name in ['a100_80g.json', 'h100_80g_nvl8.json', 'a100_80e.json',
+                   'a100_80g.json']:
+        syst = System(calculon.io.read_json_file(
+          os.path.join(ROOT, 'systems', name)))
+        fresh = Llm(app, logging.Logger('sub'))
+        fresh.compile(syst, exe)
+        fresh.run(syst)
+        reused.recompile(syst, exe)
+        reused.run(syst)
+        self.assertEqual(fresh.get_stats_json(True),
+                         reused.get_stats_json(True))
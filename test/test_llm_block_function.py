@@ -0,0 +1,116 @@
+"""
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *  https://www.apache.org/licenses/LICENSE-2.0
+ *
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+"""
+import calculon
+import itertools
+import logging
+import os
+import unittest
+
+from calculon.llm import Llm
+from calculon.llm.block_function import BlockFunction
+from calculon.llm.layers import Layer
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Layer getters inlined by the generated functions
+GETTERS = [
+  'get_fw_flops', 'get_agrad_flops', 'get_wgrad_flops', 'get_optim_step_flops',
+  'get_fw_mem_accessed', 'get_agrad_mem_accessed', 'get_wgrad_mem_accessed',
+  'get_optim_step_mem_accessed', 'get_weight', 'get_activation', 'get_output',
+  'get_weight_grad', 'get_activation_grad', 'get_optimizer']
+
+
+class LlmBlockFunctionTestCase(unittest.TestCase):
+  def test_stats_order(self):
+    self.assertEqual(Llm._kBlockStats[1:],
+                     tuple('_' + name for name in BlockFunction.kStats))
+
+  def executions(self):
+    # Executions covering the block structures of the search switches, with
+    # and without optimizer sharding and a master copy of the weights
+    app = Llm.Application(calculon.io.read_json_file(
+      os.path.join(ROOT, 'models', 'megatron-126M.json')))
+    syst_json = calculon.io.read_json_file(
+      os.path.join(ROOT, 'systems', 'a100_80e.json'))
+    # Covers the optimizer sizes without a master copy of the weights
+    for engine in ['matrix', 'vector']:
+      syst_json[engine]['float32'] = syst_json[engine]['float16']
+    syst = calculon.System(syst_json)
+    base = calculon.io.read_json_file(
+      os.path.join(ROOT, 'examples', '3072_t4_p64_d12_mbs4_full.json'))
+
+    for tp, datatype, training, recompute, comm, overlap, redo, fused, \
+        sharding in itertools.product(
+          [1, 2, 8], ['float16', 'float32'], [True, False],
+          ['full', 'attn_only', 'none'], ['ar', 'p2p_rs_ag', 'rs_ag'],
+          ['none', 'pipe', 'ring'], [True, False], [True, False],
+          [True, False]):
+      if not training and (recompute != 'none' or sharding):
+        continue
+      if tp == 1 and overlap != 'none':
+        continue
+      if redo and (comm != 'rs_ag' or recompute == 'full'):
+        continue
+      if sharding and tp == 8:
+        continue
+      exe_json = dict(base)
+      exe_json.update({
+        'num_procs': 8, 'tensor_par': tp, 'pipeline_par': 1,
+        'data_par': 8 // tp, 'batch_size': 8, 'microbatch_size': 1,
+        'datatype': datatype, 'training': training,
+        'activation_recompute': recompute, 'tensor_par_comm_type': comm,
+        'tensor_par_overlap': overlap, 'seq_par_ag_redo': redo,
+        'fused_activation': fused, 'optimizer_sharding': sharding})
+      yield app, syst, Llm.Execution.from_json(exe_json)
+
+  def test_generated_stats_match_layer_loop(self):
+    checked = 0
+    layer_types = set()
+    for app, syst, exe in self.executions():
+      loop = Llm(app, logging.Logger('sub'))
+      loop.compile(syst, exe)
+      self.assertTrue(loop._debug)
+      loop._compute_block_stats()
+
+      generated = Llm(app, None)
+      generated.compile(syst, exe)
+      self.assertFalse(generated._debug)
+      generated._compute_block_stats()
+
+      self.assertEqual(
+        [getattr(generated, name) for name in Llm._kBlockStats],
+        [getattr(loop, name) for name in Llm._kBlockStats])
+      layer_types.update(type(layer) for layer in generated._llm_block)
+      checked += 1
+    self.assertGreater(checked, 100)
+    self.assertEqual(layer_types, set(Layer.__subclasses__()))
+
+  def test_derived_getters_match_layers(self):
+    derived = 0
+    for app, syst, exe in self.executions():
+      model = Llm(app, None)
+      model.compile(syst, exe)
+      for layer in model._llm_block:
+        for name, kwargs in [(name, {}) for name in GETTERS] + [
+            ('get_weight_grad', {'sharded': False})]:
+          code = BlockFunction._getter(layer, name, **kwargs)
+          self.assertEqual(eval(code, {}, {'l': layer}),
+                           getattr(layer, name)(**kwargs),
+                           (type(layer).__name__, name, kwargs, code))
+          derived += not code.startswith(f'l.{name}(')
+    self.assertGreater(derived, 0)
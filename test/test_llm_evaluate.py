@@ -0,0 +1,124 @@
+"""
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *  https://www.apache.org/licenses/LICENSE-2.0
+ *
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+"""
+import calculon
+import itertools
+import logging
+import os
+import random
+import unittest
+
+from calculon.llm import AllExecutions, Llm
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class LlmEvaluateTestCase(unittest.TestCase):
+  def test_evaluate_matches_run(self):
+    app = Llm.Application(calculon.io.read_json_file(
+      os.path.join(ROOT, 'models', 'megatron-126M.json')))
+    syst_json = calculon.io.read_json_file(
+      os.path.join(ROOT, 'systems', 'a100_80e.json'))
+    # Small enough for some executions to run out of memory
+    syst_json['mem1']['GiB'] = 2
+    syst = calculon.System(syst_json)
+    base = calculon.io.read_json_file(
+      os.path.join(ROOT, 'examples', '3072_t4_p64_d12_mbs4_full.json'))
+
+    model = Llm(app, None, {})
+    statuses = set()
+    for tp, pp, interleaving, mbs, recompute, offload in itertools.product(
+        [1, 2, 4, 16], [1, 2, 4], [1, 2, 5], [1, 2], ['full', 'none'],
+        [True, False]):
+      if 16 % (tp * pp) != 0 or 16 // (tp * pp) * mbs > 16:
+        continue
+      if pp == 1 and interleaving != 1:
+        continue
+      exe_json = dict(base)
+      exe_json.update({
+        'num_procs': 16, 'tensor_par': tp, 'pipeline_par': pp,
+        'data_par': 16 // (tp * pp), 'batch_size': 16,
+        'microbatch_size': mbs, 'pipeline_interleaving': interleaving,
+        'activation_recompute': recompute, 'optimizer_sharding': False,
+        'weight_offload': offload, 'activations_offload': offload,
+        'optimizer_offload': offload})
+      exe = Llm.Execution.from_json(exe_json)
+      status = model.evaluate(syst, exe)
+      statuses.add(status)
+
+      ref = Llm(app, logging.Logger('sub'))
+      try:
+        ref.compile(syst, exe)
+        ref.run(syst)
+      except Llm.Error as ex:
+        self.assertNotEqual(status, Llm.kGood)
+        with self.assertRaises(Llm.Error) as ctx:
+          model._raise_status(status)
+        self.assertEqual(str(ctx.exception), str(ex))
+        continue
+      self.assertEqual(status, Llm.kGood)
+      self.assertEqual(model.get_stats_values(), ref.get_stats_values())
+    self.assertIn(Llm.kGood, statuses)
+    self.assertGreater(len(statuses), 3)
+
+  def test_incremental_evaluate_matches_fresh_model(self):
+    app = Llm.Application(calculon.io.read_json_file(
+      os.path.join(ROOT, 'models', 'megatron-126M.json')))
+    syst_json = calculon.io.read_json_file(
+      os.path.join(ROOT, 'systems', 'a100_80e.json'))
+    # Small enough for some executions to run out of memory
+    syst_json['mem1']['GiB'] = 2
+    syst = calculon.System(syst_json)
+    executions = []
+    for unit in list(AllExecutions.all_units(app, 8, 16))[::400]:
+      executions.extend(
+        Llm.Execution(*execution) for execution in
+        AllExecutions.unit_executions(app, syst, 8, 'float16', [True, False],
+                                      unit))
+
+    # Reference statistics, or error, of a cache-free compile() and run()
+    refs = {}
+    for exe in executions:
+      ref = Llm(app, logging.Logger('sub'))
+      try:
+        ref.compile(syst, exe)
+        ref.run(syst)
+        refs[exe] = ref.get_stats_values()
+      except Llm.Error as ex:
+        refs[exe] = str(ex)
+
+    shuffled = list(executions)
+    random.Random(0).shuffle(shuffled)
+
+    # Stages are reused between neighbouring executions of the search order,
+    # and between unrelated ones in a shuffled order
+    statuses = set()
+    for order in [executions, shuffled]:
+      model = Llm(app, None, {})
+      for exe in order:
+        status = model.evaluate(syst, exe)
+        statuses.add(status)
+        if isinstance(refs[exe], str):
+          self.assertNotEqual(status, Llm.kGood)
+          with self.assertRaises(Llm.Error) as ctx:
+            model._raise_status(status)
+          self.assertEqual(str(ctx.exception), refs[exe])
+        else:
+          self.assertEqual(status, Llm.kGood)
+          self.assertEqual(model.get_stats_values(), refs[exe])
+    self.assertIn(Llm.kGood, statuses)
+    self.assertIn(Llm.kBadMemTier1, statuses)
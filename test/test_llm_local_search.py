@@ -0,0 +1,69 @@
+"""
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *  https://www.apache.org/licenses/LICENSE-2.0
+ *
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+"""
+import calculon
+import os
+import random
+import unittest
+
+from calculon.llm import *
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def get_space(model, system, num_procs, max_batch_size, mem2=True):
+  app = Llm.Application(calculon.io.read_json_file(
+    os.path.join(ROOT, 'models', model)))
+  syst_json = calculon.io.read_json_file(
+    os.path.join(ROOT, 'systems', system))
+  if not mem2:
+    syst_json['mem2']['GiB'] = 0
+  syst = System(syst_json)
+  return LocalSearch.Space(app, syst, num_procs, max_batch_size, 'float16',
+                           [True, False], True, True)
+
+
+class LocalSearchTestCase(unittest.TestCase):
+  def test_neighbours(self):
+    space = get_space('gpt3-175B.json', 'a100_80g.json', 1024, 1024)
+    rng = random.Random(0)
+    exe_json = space.get_random(rng)
+    for _ in range(2000):
+      neighbour = space.get_neighbour(exe_json, rng)
+      self.assertEqual(len(neighbour), len(exe_json))
+      self.assertNotEqual(neighbour, exe_json)
+      # Neighbours stay in the space of llm-optimal-execution
+      tp = neighbour['tensor_par']
+      pp = neighbour['pipeline_par']
+      self.assertIn((tp, pp), space.parallelisms)
+      self.assertEqual(neighbour['data_par'], 1024 // (tp * pp))
+      for field in LocalSearch.Space.kFields:
+        self.assertIn(neighbour[field], space.get_choices(neighbour, field))
+      Llm.Execution.from_json(neighbour)
+      exe_json = neighbour
+
+  def test_exhaustive_gap(self):
+    space = get_space('megatron-126M.json', 'a100_80e.json', 16, 32, False)
+    best, steps, exe_count, good_exe_count = LocalSearch.search(
+      space, 3, 800, restarts=4, seed=0)
+    self.assertLessEqual(exe_count, 800)
+    self.assertLessEqual(exe_count, steps)
+    self.assertLessEqual(good_exe_count, exe_count)
+    self.assertEqual(len(best), 3)
+    self.assertEqual(best, sorted(best, key=lambda x: x[0], reverse=True))
+    exhaustive = LocalSearch.exhaustive_search(space)
+    self.assertEqual(best[0][0], exhaustive[0][0])
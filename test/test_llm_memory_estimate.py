@@ -0,0 +1,134 @@
+"""
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *  https://www.apache.org/licenses/LICENSE-2.0
+ *
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+"""
+import calculon
+import collections
+import itertools
+import logging
+import os
+import unittest
+
+from calculon.llm import Llm
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class LlmMemoryEstimateTestCase(unittest.TestCase):
+  def test_estimate_matches_model(self):
+    app = Llm.Application(calculon.io.read_json_file(
+      os.path.join(ROOT, 'models', 'megatron-126M.json')))
+    # Small memories so that many executions don't fit in either tier
+    cfg = calculon.io.read_json_file(
+      os.path.join(ROOT, 'systems', 'a100_80e.json'))
+    cfg['mem1']['GiB'] = 1
+    cfg['mem2']['GiB'] = 1
+    syst = calculon.System(cfg)
+    base = calculon.io.read_json_file(
+      os.path.join(ROOT, 'examples', '3072_t4_p64_d12_mbs4_full.json'))
+
+    block_cache = {}
+    statuses = collections.Counter()
+    for (tp, pp, recompute, sharding, comm, redo, offload, attention,
+         training, fused) in itertools.product(
+           [1, 4], [1, 2], ['full', 'attn_only', 'none'], [True, False],
+           ['ar', 'p2p_rs_ag', 'rs_ag'], [True, False], [True, False],
+           ['multihead', 'multiquery'], [True, False], [True, False]):
+      exe_json = dict(base)
+      exe_json.update({
+        'num_procs': 8, 'tensor_par': tp, 'pipeline_par': pp,
+        'data_par': 8 // (tp * pp), 'batch_size': 16, 'microbatch_size': 2,
+        'pipeline_interleaving': 1, 'activation_recompute': recompute,
+        'optimizer_sharding': sharding, 'tensor_par_comm_type': comm,
+        'tensor_par_overlap': 'pipe' if tp > 1 else 'none',
+        'seq_par_ag_redo': redo, 'data_par_overlap': False,
+        'weight_offload': offload, 'activations_offload': offload,
+        'optimizer_offload': offload and training,
+        'attention_type': attention, 'training': training,
+        'fused_activation': fused})
+      try:
+        exe = Llm.Execution.from_json(exe_json)
+      except AssertionError:
+        # Invalid combination of the execution values
+        continue
+
+      # The estimate rejects exactly the executions run() rejects on memory
+      model = Llm(app, logging.Logger('sub'), block_cache)
+      try:
+        model.compile(syst, exe)
+        model.run(syst)
+        status = 'good'
+      except Llm.Error as ex:
+        status = str(ex)
+      try:
+        Llm.check_mem_caps_estimate(app, syst, exe)
+        estimate_status = 'good'
+      except Llm.Error as ex:
+        estimate_status = str(ex)
+      self.assertEqual(estimate_status, status, exe_json)
+      if status == 'good':
+        self.assertEqual(Llm.get_mem_cap_reqs_estimate(app, syst, exe),
+                         (model.get_mem_tier1_cap_req(),
+                          model.get_mem_tier2_cap_req()))
+      statuses[status.split(' needs ')[0]] += 1
+    self.assertGreater(statuses['good'], 0)
+    self.assertGreater(statuses['Mem tier1'], 0)
+    self.assertGreater(statuses['Mem tier2'], 0)
+
+  def test_block_mem_stats_match_layers(self):
+    app = Llm.Application(calculon.io.read_json_file(
+      os.path.join(ROOT, 'models', 'megatron-126M.json')))
+    cfg = calculon.io.read_json_file(
+      os.path.join(ROOT, 'systems', 'a100_80e.json'))
+    # Covers the optimizer sizes without a master copy of the weights
+    for engine in ['matrix', 'vector']:
+      cfg[engine]['float32'] = cfg[engine]['float16']
+    syst = calculon.System(cfg)
+    base = calculon.io.read_json_file(
+      os.path.join(ROOT, 'examples', '3072_t4_p64_d12_mbs4_full.json'))
+
+    checked = 0
+    for (tp, datatype, recompute, sharding, comm, overlap, redo, attention,
+         training, fused) in itertools.product(
+           [1, 2, 8], ['float16', 'float32'], ['full', 'attn_only', 'none'],
+           [True, False], ['ar', 'p2p_rs_ag', 'rs_ag'],
+           ['none', 'pipe', 'ring'], [True, False],
+           ['multihead', 'multiquery'], [True, False], [True, False]):
+      exe_json = dict(base)
+      exe_json.update({
+        'num_procs': 8, 'tensor_par': tp, 'pipeline_par': 1,
+        'data_par': 8 // tp, 'batch_size': 8, 'microbatch_size': 1,
+        'datatype': datatype, 'activation_recompute': recompute,
+        'optimizer_sharding': sharding, 'tensor_par_comm_type': comm,
+        'tensor_par_overlap': overlap, 'seq_par_ag_redo': redo,
+        'attention_type': attention, 'training': training,
+        'fused_activation': fused})
+      try:
+        exe = Llm.Execution.from_json(exe_json)
+      except AssertionError:
+        # Invalid combination of the execution values
+        continue
+
+      model = Llm(app, logging.Logger('sub'))
+      model.compile(syst, exe)
+      model._compute_block_stats()
+      estimate, status = Llm._estimate_mem(app, syst, exe)
+      self.assertEqual(status, Llm.kGood)
+      self.assertEqual(
+        [getattr(estimate, name) for name in Llm._kBlockMemStats],
+        [getattr(model, name) for name in Llm._kBlockMemStats], exe_json)
+      checked += 1
+    self.assertGreater(checked, 500)
@@ -0,0 +1,212 @@
+"""
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *  https://www.apache.org/licenses/LICENSE-2.0
+ *
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+"""
+import argparse
+import calculon
+import logging
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from calculon.llm import *
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Interrupt(Exception):
+  pass
+
+
+class OptimalExecutionTestCase(unittest.TestCase):
+  def setUp(self):
+    self.app = Llm.Application(calculon.io.read_json_file(
+      os.path.join(ROOT, 'models', 'megatron-126M.json')))
+    # Without offloading memory to keep the search small
+    syst_json = calculon.io.read_json_file(
+      os.path.join(ROOT, 'systems', 'a100_80e.json'))
+    syst_json['mem2']['GiB'] = 0
+    self.syst = System(syst_json)
+
+  def search(self, top_n, mbs_break, prune):
+    app = self.app
+    syst = self.syst
+    num_procs = 4
+    max_batch_size = 8
+
+    OptimalExecution.init_worker(mp.Value('d', 0.0))
+    best = []
+    pruned = 0
+    try:
+      for tp in Llm.get_all_tensor_parallelisms(
+          num_procs, app.hidden, app.attn_heads):
+        for pp in Llm.get_all_pipeline_parallelisms(
+            num_procs, tp, app.num_blocks):
+          dp = Llm.get_data_parallelism(num_procs, tp, pp)
+          batch_size = OptimalExecution.get_batch_size(dp, max_batch_size)
+          for activation_recompute in ['full', 'none']:
+            cbest, _, _, _, pec, _, _ = OptimalExecution.search(
+              False, top_n, num_procs, max_batch_size, 'float16', app,
+              syst, tp, pp, dp, 1, batch_size, activation_recompute, False,
+              'rs_ag', [True], mbs_break, False, False, prune)
+            best = OptimalExecution.update_list(best, cbest, top_n)
+            pruned += pec
+    finally:
+      OptimalExecution.init_worker(None)
+    return best, pruned
+
+  def test_pruned_search_matches_exhaustive(self):
+    for top_n, mbs_break in [(1, False), (3, True)]:
+      best, pruned = self.search(top_n, mbs_break, False)
+      self.assertEqual(pruned, 0)
+      pbest, pruned = self.search(top_n, mbs_break, True)
+      self.assertGreater(pruned, 0)
+      self.assertEqual(best, pbest)
+
+  def test_split_search_matches_search(self):
+    params = (False, 3, 4, 8, 'float16', self.app, self.syst, 2, 1, 2,
+              1, 8, 'attn_only', True, 'rs_ag', [True, False], True, True,
+              True, False)
+    best, ec, gec, bec, _, _, _ = OptimalExecution.search(*params)
+    num_outer = len(OptimalExecution.get_outer_loops(
+      2, 2, 'attn_only', 'rs_ag', True, True))
+    self.assertEqual(ec, num_outer * OptimalExecution.get_inner_size(
+      self.app, self.syst, 2, 1, 2, 8, 'attn_only', [True, False]))
+
+    sbest = []
+    counts = [0, 0, 0]
+    for start in range(num_outer):
+      cbest, *ccounts, _, _, _ = OptimalExecution.search(
+        *params, (start, start + 1))
+      sbest = OptimalExecution.update_list(sbest, cbest, 3)
+      counts = [c + cc for c, cc in zip(counts, ccounts)]
+    self.assertEqual(best, sbest)
+    self.assertEqual([ec, gec, bec], counts)
+
+  def test_check_sample_rate(self):
+    logger = logging.getLogger('test')
+    with self.assertNoLogs(logger, logging.WARNING):
+      OptimalExecution.check_sample_rate(
+        logger, {'sample_rate': 100.0}, 100.0 * (1 + 1e-15))
+    with self.assertLogs(logger, logging.WARNING):
+      OptimalExecution.check_sample_rate(logger, {'sample_rate': 100.0}, 101.0)
+
+  def pareto_search(self, prune):
+    OptimalExecution.init_worker(mp.Value('d', 0.0))
+    archive = []
+    pruned = 0
+    try:
+      for tp, pp, dp in [(1, 1, 4), (2, 1, 2), (4, 1, 1), (1, 4, 1)]:
+        # In this order, some executions are dominated by ones found before
+        # them and are pruned
+        for activation_recompute in ['none', 'attn_only', 'full']:
+          cbest, _, _, _, pec, _, _ = OptimalExecution.search(
+            False, 1, 4, 8, 'float16', self.app, self.syst, tp, pp, dp, 1,
+            OptimalExecution.get_batch_size(dp, 8), activation_recompute,
+            False, 'rs_ag', [True], False, False, False, prune, pareto=True)
+          archive = OptimalExecution.update_pareto(archive, cbest)
+          pruned += pec
+    finally:
+      OptimalExecution.init_worker(None)
+    return archive, pruned
+
+  def test_pareto_search(self):
+    archive, pruned = self.pareto_search(False)
+    self.assertEqual(pruned, 0)
+    self.assertGreater(len(archive), 1)
+    for index, (sample_rate, _, costs) in enumerate(archive):
+      for other_index, (other_rate, _, other_costs) in enumerate(archive):
+        if index != other_index:
+          self.assertFalse(OptimalExecution.dominates(
+            other_rate, other_costs, sample_rate, costs))
+
+    # The costs are the ones of the full statistics
+    for sample_rate, execution, costs in archive:
+      stats = OptimalExecution.get_stats(
+        self.app, self.syst, execution, False)
+      self.assertEqual(stats['sample_rate'], sample_rate)
+      self.assertEqual(costs[0], stats['proc_mem_tier1_cap_req'])
+
+    parchive, pruned = self.pareto_search(True)
+    self.assertGreater(pruned, 0)
+    self.assertEqual(archive, parchive)
+
+  def test_pareto_rejects_mbs_break(self):
+    parser = argparse.ArgumentParser()
+    OptimalExecution.create_parser(parser.add_subparsers())
+    args = parser.parse_args([
+      OptimalExecution.NAME, os.path.join(ROOT, 'models', 'megatron-126M.json'),
+      '4', '8', 'float16', os.path.join(ROOT, 'systems', 'a100_80e.json'),
+      'unused.json', '--pareto', '-m'])
+    self.assertEqual(
+      OptimalExecution.run_command(logging.getLogger('test'), args), -1)
+
+  def test_update_pareto(self):
+    archive = OptimalExecution.update_pareto([], [
+      (1, 'a', (2, 0, 1)), (2, 'b', (3, 0, 1)), (1, 'c', (3, 0, 1)),
+      (2, 'd', (3, 0, 1)), (0.5, 'e', (1, 0, 2))])
+    self.assertEqual([exe for _, exe, _ in archive], ['b', 'a', 'e'])
+    archive = OptimalExecution.update_pareto(archive, (2, 'f', (2, 0, 0)))
+    self.assertEqual([exe for _, exe, _ in archive], ['f', 'e'])
+
+  def test_resume(self):
+    tmp = tempfile.mkdtemp()
+    logger = logging.getLogger('test')
+    try:
+      system = os.path.join(tmp, 'system.json')
+      calculon.io.write_json_file(self.syst.cfg, system)
+      def loe_args(output, *args):
+        parser = argparse.ArgumentParser()
+        OptimalExecution.create_parser(parser.add_subparsers())
+        return parser.parse_args([
+          OptimalExecution.NAME,
+          os.path.join(ROOT, 'models', 'megatron-126M.json'), '4', '8',
+          'float16', system, output, '-c', '1', '-t', '3', *args])
+
+      reference = os.path.join(tmp, 'reference.json')
+      self.assertEqual(OptimalExecution.run_command(
+        logger, loe_args(reference)), 0)
+
+      write_pickle_file = calculon.io.write_pickle_file
+      def interrupt(data, filename):
+        write_pickle_file(data, filename)
+        if len(data['done']) == 2:
+          raise Interrupt()
+
+      output = os.path.join(tmp, 'output.json')
+      with mock.patch.object(OptimalExecution, 'kCheckpointSeconds', 0), \
+           mock.patch.object(calculon.io, 'write_pickle_file', interrupt):
+        with self.assertRaises(Interrupt):
+          OptimalExecution.run_command(logger, loe_args(output))
+      self.assertFalse(os.path.exists(output))
+
+      # A checkpoint of another search is rejected
+      self.assertEqual(OptimalExecution.run_command(
+        logger, loe_args(output, '--resume', '--no-prune')), -1)
+
+      with self.assertLogs(logger, logging.INFO) as logs:
+        self.assertEqual(OptimalExecution.run_command(
+          logger, loe_args(output, '--resume')), 0)
+      self.assertTrue(any(line.startswith('INFO:test:Resuming: 2 of ')
+                          for line in logs.output))
+      self.assertFalse(os.path.exists(output + '.ckpt'))
+      self.assertEqual(calculon.io.read_json_file(output),
+                       calculon.io.read_json_file(reference))
+    finally:
+      shutil.rmtree(tmp)
@@ -0,0 +1,68 @@
+"""
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *  https://www.apache.org/licenses/LICENSE-2.0
+ *
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+"""
+import argparse
+import calculon
+import multiprocessing as mp
+import os
+import unittest
+
+from calculon.llm import *
+from calculon.util import arg_int_list
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ScalingSweepTestCase(unittest.TestCase):
+  def test_num_procs_list(self):
+    self.assertEqual(arg_int_list('512:4096'), [512, 1024, 2048, 4096])
+    self.assertEqual(arg_int_list('8,12:20:4,6'), [8, 12, 16, 20, 6])
+    with self.assertRaises(argparse.ArgumentTypeError):
+      arg_int_list('0:8')
+
+  def test_parallelisms(self):
+    for name in ['megatron-126M.json', 'gpt3-175B.json', 'turing-530B.json']:
+      app = Llm.Application(calculon.io.read_json_file(
+        os.path.join(ROOT, 'models', name)))
+      for num_procs in [1, 8, 12, 96, 3072, 5128]:
+        self.assertEqual(
+          list(ScalingSweep.get_parallelisms(app, num_procs)),
+          list(OptimalExecution.get_parallelisms(app, num_procs)))
+
+  def test_shared_block_cache(self):
+    app = Llm.Application(calculon.io.read_json_file(
+      os.path.join(ROOT, 'models', 'megatron-126M.json')))
+    syst_json = calculon.io.read_json_file(
+      os.path.join(ROOT, 'systems', 'a100_80e.json'))
+    syst_json['mem2']['GiB'] = 0
+    syst = System(syst_json)
+
+    block_cache = {}
+    for num_procs in [4, 8]:
+      for tp, pp in OptimalExecution.get_parallelisms(app, num_procs):
+        dp = Llm.get_data_parallelism(num_procs, tp, pp)
+        params = (False, 1, num_procs, 8, 'float16', app, syst, tp, pp, dp,
+                  1, OptimalExecution.get_batch_size(dp, 8), 'none', False,
+                  'rs_ag', [True], False, True, True, False)
+        OptimalExecution.init_worker(mp.Value('d', 0.0))
+        try:
+          search = OptimalExecution.search(*params)
+          shared = OptimalExecution.search(*params, block_cache=block_cache)
+        finally:
+          OptimalExecution.init_worker(None)
+        self.assertEqual(search, shared)
+    self.assertGreater(len(block_cache), 0)
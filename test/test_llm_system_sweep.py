@@ -0,0 +1,71 @@
+"""
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *  https://www.apache.org/licenses/LICENSE-2.0
+ *
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+"""
+import calculon
+import itertools
+import logging
+import os
+import unittest
+
+from calculon.llm import *
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class SystemSweepTestCase(unittest.TestCase):
+  def test_sweep_matches_model(self):
+    app = Llm.Application(calculon.io.read_json_file(
+      os.path.join(ROOT, 'models', 'megatron-126M.json')))
+    syst_json = calculon.io.read_json_file(
+      os.path.join(ROOT, 'systems', 'a100_80e.json'))
+    base = calculon.io.read_json_file(
+      os.path.join(ROOT, 'examples', '3072_t4_p64_d12_mbs4_full.json'))
+    exes = []
+    for tp, overlap, offload in [(1, 'none', False), (4, 'pipe', True),
+                                 (8, 'ring', False)]:
+      exe_json = dict(base)
+      exe_json.update({
+        'num_procs': 8, 'tensor_par': tp, 'pipeline_par': 1,
+        'data_par': 8 // tp, 'batch_size': 16, 'microbatch_size': 2,
+        'pipeline_interleaving': 1, 'optimizer_sharding': False,
+        'tensor_par_overlap': overlap, 'weight_offload': offload})
+      exes.append(Llm.Execution.from_json(exe_json))
+    grid = list(itertools.product(
+      [None, 1024], [None, 0], [100, 300], [None], [None, 624]))
+
+    rows = SystemSweep.sweep(app, syst_json, exes, grid, 0)
+    self.assertEqual(len(rows), len(grid) * len(exes))
+    fields = SystemSweep.get_fields()
+    num_stats = len(Llm.get_stats_fields())
+    bad = 0
+    for row in rows:
+      self.assertEqual(len(row), len(fields))
+      params = [pick(value == '', None, value)
+                for value in row[:len(SystemSweep.kParams)]]
+      syst = System(SystemSweep.get_variant(syst_json, 0, *params))
+      model = Llm(app, logging.Logger('sub'))
+      try:
+        model.compile(syst, exes[row[len(SystemSweep.kParams)]])
+        model.run(syst)
+      except Llm.Error:
+        self.assertNotEqual(row[-1], '')
+        bad += 1
+        continue
+      self.assertEqual(row[-1], '')
+      self.assertEqual(row[-1 - num_stats:-1], list(model.get_stats_values()))
+    self.assertGreater(bad, 0)
+    self.assertLess(bad, len(rows))
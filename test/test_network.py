@@ -0,0 +1,55 @@
+"""
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *  https://www.apache.org/licenses/LICENSE-2.0
+ *
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+"""
+import calculon
+import glob
+import os
+import unittest
+from unittest import mock
+
+from calculon.network import Network
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def uncached_time(cfg, op, op_size, comm_size):
+  # The formula of Network.time() from the configuration
+  scalar, offset = cfg['ops'][op]
+  op_size *= scalar
+  if offset is not None:
+    op_size += 1 / comm_size * op_size * offset
+  return cfg['latency'] + op_size / (
+    cfg['bandwidth'] * 1e9 * cfg['efficiency'])
+
+
+class NetworkTestCase(unittest.TestCase):
+  def test_memoized_times_match(self):
+    for path in glob.glob(os.path.join(ROOT, 'systems', '*.json')):
+      for cfg in calculon.io.read_json_file(path)['networks']:
+        queries = []
+        for op in sorted(Network.kNetOps):
+          for op_size in [0, 1, 1000, 3 * 2**30]:
+            for comm_size in ([2] if op == 'p2p' else [2, 3, 8]):
+              queries.append((op, op_size, comm_size))
+        # The memo is cleared several times, and the queries come again after
+        # each clear
+        with mock.patch.object(Network, 'kMemoSize', 5):
+          net = Network(cfg)
+          for query in queries + queries[::-1] + queries:
+            self.assertEqual(net.time(*query), uncached_time(cfg, *query),
+                             query)
+            self.assertLessEqual(len(net._times), Network.kMemoSize)
@@ -0,0 +1,98 @@
+"""
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *  https://www.apache.org/licenses/LICENSE-2.0
+ *
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+"""
+import json
+import logging
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+import unittest
+
+from calculon.progress import Progress
+
+
+def work(queue, good, bad, pruned, best):
+  reporter = Progress.Reporter(queue)
+  for _ in range(good):
+    reporter.add(good=1, best=best)
+  for _ in range(bad):
+    reporter.add(bad=1)
+  for _ in range(pruned):
+    reporter.add(pruned=1)
+  reporter.flush()
+
+
+class ProgressTestCase(unittest.TestCase):
+  def setUp(self):
+    self.tmp = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tmp)
+
+  def test_aggregates_workers(self):
+    filename = os.path.join(self.tmp, 'progress.jsonl')
+    logger = logging.getLogger('test')
+    progress = Progress(logger, 100, filename, best=1.5)
+    progress.start()
+    workers = [mp.Process(target=work, args=(progress.queue, 10, 5, 0, 2.5)),
+               mp.Process(target=work, args=(progress.queue, 20, 0, 15, 4.0))]
+    for worker in workers:
+      worker.start()
+    for worker in workers:
+      worker.join()
+    progress.skip(40)
+    with self.assertLogs(logger, logging.INFO) as logs:
+      progress.stop()
+
+    self.assertEqual(len(logs.output), 1)
+    self.assertTrue(logs.output[0].startswith(
+      'INFO:test:Progress: 50/60 (83.3%) good 30 bad 5 pruned 15 best 4.00 '))
+    self.assertIn(' (workers ', logs.output[0])
+    self.assertIn(' ETA ', logs.output[0])
+
+    # One JSON object per line, the last one has the final counts
+    with open(filename) as fd:
+      lines = fd.read().splitlines()
+    self.assertGreater(len(lines), 0)
+    records = [json.loads(line) for line in lines]
+    last = records[-1]
+    self.assertEqual(set(last.keys()), {
+      'elapsed', 'executions', 'total', 'good', 'bad', 'pruned',
+      'best_sample_rate', 'calc_rate', 'worker_calc_rates', 'eta'})
+    self.assertEqual(
+      [last[key] for key in ['executions', 'total', 'good', 'bad', 'pruned',
+                             'best_sample_rate']],
+      [50, 60, 30, 5, 15, 4.0])
+    self.assertEqual(len(last['worker_calc_rates']), 2)
+    self.assertGreater(last['calc_rate'], 0)
+
+  def test_reporter_batches_counts(self):
+    queue = mp.Queue()
+    reporter = Progress.Reporter(queue)
+    reporter.add(good=1, best=3.0)
+    reporter.add(bad=1)
+    reporter.add(good=1, best=2.0)
+    self.assertTrue(queue.empty())
+    reporter.flush()
+    self.assertEqual(queue.get(timeout=10),
+                     ('count', os.getpid(), 3, 2, 1, 0, 3.0))
+    # Nothing is sent without new executions, and the counts restart from 0
+    reporter.flush()
+    reporter.add(pruned=1)
+    reporter.flush()
+    self.assertEqual(queue.get(timeout=10),
+                     ('count', os.getpid(), 1, 0, 0, 1, 3.0))
@@ -0,0 +1,68 @@
+"""
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *  https://www.apache.org/licenses/LICENSE-2.0
+ *
+ * See the NOTICE file distributed with this work for additional information
+ * regarding copyright ownership.
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+"""
+import calculon
+import glob
+import os
+import unittest
+from unittest import mock
+
+from calculon import *
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def scan(curve, size):
+  # The efficiency of the first point the size reaches
+  for point, eff in curve:
+    if size >= point:
+      return eff
+  assert False
+
+
+class SystemEfficiencyTestCase(unittest.TestCase):
+  def test_lookups_match_curves(self):
+    for path in glob.glob(os.path.join(ROOT, 'systems', '*.json')):
+      cfg = calculon.io.read_json_file(path)
+      for memoize, memo_size in [(False, None), (True, System.kMemoSize),
+                                 (True, 5)]:
+        # A small memo is cleared several times
+        with mock.patch.object(System, 'kMemoSize', memo_size):
+          self.check_lookups(cfg, System(cfg, memoize=memoize))
+
+  def check_lookups(self, cfg, syst):
+    for mem in ['mem1', 'mem2']:
+      curve = [(mbytes * 1e6, eff)
+               for mbytes, eff in cfg[mem]['MB_efficiency']]
+      sizes = [point * scale for point, _ in curve
+               for scale in [0.5, 1, 1.5]] + [0, 1e15]
+      for size in sizes + sizes:
+        self.assertEqual(getattr(syst, f'get_{mem}_throughput')(size),
+                         cfg[mem]['GBps'] * 1e9 * scan(curve, size))
+    for engine in ['matrix', 'vector']:
+      for datatype, proc in cfg[engine].items():
+        syst.set_datatype(datatype)
+        curve = [(gflops * 1e9, eff)
+                 for gflops, eff in proc['gflops_efficiency']]
+        sizes = [point * scale for point, _ in curve
+                 for scale in [0.5, 1, 1.5]] + [0, 1e20]
+        for size in sizes + sizes:
+          self.assertEqual(
+            getattr(syst, f'get_{engine}_throughput')(size),
+            proc['tflops'] * 1e12 * scan(curve, size))
+    if syst._throughputs is not None:
+      self.assertLessEqual(len(syst._throughputs), System.kMemoSize)